@@ -9,6 +9,7 @@ from hashlib import sha1
 from datetime import datetime, timedelta
 from utilidades.common import token_required, jsend_response_maker
 import api.api_funciones as af  # Import the entire module
+from api.cache_resultados import cache, INDICADORES_GANANCIAS
 import pandas as pd
 import json
 from flask_cors import CORS
@@ -191,6 +192,13 @@ def handle_consulta_programa_up(mercado):
         if indicador is None:
             return jsend_response_maker(status="fail", message=f"Validation error: No indicador class found for mercado: {mercado}", data={}), 400
 
+        # Return the cached response if the curated data of the mercado has not changed
+        clave = cache.normalizar_clave("programasUP", mercado, fecha_inicial, fecha_final, up, sentido, group_by)
+        version = cache.version_datos([indicador.indicador_type], fecha_inicial, fecha_final)
+        respuesta = cache.get(clave, version)
+        if respuesta is not None:
+            return respuesta, 200
+
         # Get the relevant program data based on the indicator class and input parameters
         result = af.obtener_programas(indicador, fecha_inicial, fecha_final, mercado, up, sentido)
 
@@ -198,7 +206,9 @@ def handle_consulta_programa_up(mercado):
 
         # Check if result is empty
         if result is None or result.empty:
-            return jsend_response_maker(status="success", message="No data found for the given parameters", data={"mercado": mercado, "programas": []}), 200
+            respuesta = jsend_response_maker(status="success", message="No data found for the given parameters", data={"mercado": mercado, "programas": []})
+            cache.set(clave, version, respuesta)
+            return respuesta, 200
 
         # Apply grouping and filtering
         result_grouped = indicador.agrupar_consulta(result, group_by, "prog")
@@ -218,7 +228,9 @@ def handle_consulta_programa_up(mercado):
 
         print(f"JSON result: {json_result}")
 
-        return jsend_response_maker(status="success", message="Data retrieved successfully", data={"mercado": mercado, "programas": json_result}), 200
+        respuesta = jsend_response_maker(status="success", message="Data retrieved successfully", data={"mercado": mercado, "programas": json_result})
+        cache.set(clave, version, respuesta)
+        return respuesta, 200
 
     except Exception as e:
         # Log the exception for debugging
@@ -274,12 +286,21 @@ def handle_consulta_ganancias_up(mercado):
         if indicador is None:
             return jsend_response_maker(status="fail", message=f"Validation error: No indicator class found for mercado: {mercado}", data={}), 400
 
+        # Return the cached response if the curated data of the mercado (and of the precios used) has not changed
+        clave = cache.normalizar_clave("gananciasUP", mercado, fecha_inicial, fecha_final, up, sentido, group_by)
+        version = cache.version_datos([indicador.indicador_type] + INDICADORES_GANANCIAS.get(indicador.indicador_type, []), fecha_inicial, fecha_final)
+        respuesta = cache.get(clave, version)
+        if respuesta is not None:
+            return respuesta, 200
+
         # Get the relevant ganancias data based on the indicator class and input parameters
         total_ganancia, ganancia_df = af.obtener_ganancias(indicador, fecha_inicial, fecha_final, mercado, up, sentido)
 
         # Check if result is empty
         if ganancia_df is None or ganancia_df.empty:
-            return jsend_response_maker(status="success", message="No data found for the given parameters", data={"mercado": mercado, "ganancias": [], "ganancias_totales": []}), 200
+            respuesta = jsend_response_maker(status="success", message="No data found for the given parameters", data={"mercado": mercado, "ganancias": [], "ganancias_totales": []})
+            cache.set(clave, version, respuesta)
+            return respuesta, 200
 
         # Apply grouping and filtering
         print(f"Group by: {group_by}")
@@ -295,7 +316,9 @@ def handle_consulta_ganancias_up(mercado):
         #convert ganancias totales per UP to json
         ganancias_totales_json_result = total_ganancia.to_json(orient='records', date_format='iso')
 
-        return jsend_response_maker(status="success", message="Data retrieved successfully", data={"mercado": mercado, "ganancias": ganancias_df_json_result, "ganancias_totales": ganancias_totales_json_result}), 200
+        respuesta = jsend_response_maker(status="success", message="Data retrieved successfully", data={"mercado": mercado, "ganancias": ganancias_df_json_result, "ganancias_totales": ganancias_totales_json_result})
+        cache.set(clave, version, respuesta)
+        return respuesta, 200
 
     except Exception as e:
         # Log the exception for debugging
@@ -365,12 +388,21 @@ def handle_consulta_precios(mercado):
         if indicador is None:
             return jsend_response_maker(status="fail", message=f"Validation error: No indicador class found for mercado: {mercado}", data={}), 400
 
+        # Return the cached response if the curated data of the mercado has not changed
+        clave = cache.normalizar_clave("precios", mercado, fecha_inicial, fecha_final, None, sentido, group_by)
+        version = cache.version_datos([indicador.indicador_type], fecha_inicial, fecha_final)
+        respuesta = cache.get(clave, version)
+        if respuesta is not None:
+            return respuesta, 200
+
         # Get the relevant price data based on the indicador class and input parameters
         result = af.obtener_precios(indicador, fecha_inicial, fecha_final, mercado, sentido)
 
         # Check if result is empty
         if  (result is None) or (result.empty):
-            return jsend_response_maker(status="success", message="No data found for the given parameters", data={"mercado": mercado, "precios": []}), 200
+            respuesta = jsend_response_maker(status="success", message="No data found for the given parameters", data={"mercado": mercado, "precios": []})
+            cache.set(clave, version, respuesta)
+            return respuesta, 200
 
         # Apply grouping and filtering
         result_grouped = indicador.agrupar_consulta(result, group_by, "prc")
@@ -380,7 +412,9 @@ def handle_consulta_precios(mercado):
         # Convert DataFrame to JSON format for the response
         json_result = filtered_result.to_json(orient='records', date_format='iso')
 
-        return jsend_response_maker(status="success", message="Data retrieved successfully", data={"mercado": mercado, "precios": json_result}), 200
+        respuesta = jsend_response_maker(status="success", message="Data retrieved successfully", data={"mercado": mercado, "precios": json_result})
+        cache.set(clave, version, respuesta)
+        return respuesta, 200
 
     except Exception as e:
         # Log the exception for debugging
@@ -405,6 +439,15 @@ def test():
     out = "API funcionando!"  
     return jsonify(out)
 
+# Metricas de la cache de resultados
+#----------------------------------------------------------------------
+@general_bp.route('/cache/stats', methods=['GET']) #url = /cache/stats
+def get_cache_stats():
+    """
+    Endpoint to retrieve the hit/miss metrics of the result cache of the /up/programas, /up/ganancias and /precios endpoints.
+    """
+    return jsend_response_maker(status="success", message="Cache stats retrieved successfully", data={"cache": cache.stats()}), 200
+
 
 """
 #
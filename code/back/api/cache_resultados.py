@@ -0,0 +1,178 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Optional, List, Union
+from negocio.funciones_consultas import Indicador
+
+#indicadores cuyos ficheros se leen ademas del propio al calcular ganancias (ver indicador_config['prc_indicador'] y PVP.get_ganancias)
+INDICADORES_GANANCIAS = {
+    "pbf": ["diario"],
+    "pvp": ["pbf", "restricciones", "diario"],
+}
+
+
+class CacheResultados:
+    """
+    LRU cache with TTL of the responses of the /up/programas, /up/ganancias and /precios endpoints.
+
+    The key is the normalised request and every entry stores the version of the curated data it was computed from
+    (modification time of the parquet files/datasets of the market for the years of the request). When the daemon writes
+    new data for that market and year the version changes and the entry is discarded on the next lookup.
+    """
+
+    def __init__(self, max_entradas: int = 256, ttl: int = 3600):
+        """
+        Args:
+            max_entradas (int): The maximum number of responses kept, the least recently used is evicted. Defaults to 256.
+            ttl (int): The seconds a response is kept even if the data does not change. Defaults to 3600.
+        """
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._entradas = OrderedDict() #clave -> (version, instante, respuesta)
+        self._lock = threading.Lock()
+        self._metricas = {"hits": 0, "misses": 0, "expiradas": 0, "invalidadas": 0, "descartadas": 0}
+
+    @staticmethod
+    def normalizar_lista(valor: Optional[Union[str, List[str]]]) -> Optional[tuple]:
+        """
+        Normalise a list parameter of the request (i.e. up or sentido), which can be a list or a comma separated string.
+
+        Args:
+            valor (str | List[str]): The value of the parameter. i.e. "Subir, Bajar" or ["Bajar", "Subir"]
+        Returns:
+            tuple: The sorted values without spaces. i.e. ("Bajar", "Subir"), or None if no value is given.
+        """
+        if valor is None:
+            return None
+        if isinstance(valor, str):
+            valor = valor.split(",")
+        return tuple(sorted(str(v).strip() for v in valor if str(v).strip()))
+
+    @staticmethod
+    def normalizar_clave(consulta: str, mercado: str, fecha_inicial: str, fecha_final: str, up: Optional[Union[str, List[str]]] = None,
+                         sentido: Optional[Union[str, List[str]]] = None, agrupar: Optional[str] = None) -> tuple:
+        """
+        Build the cache key of a request.
+
+        Args:
+            consulta (str): The endpoint. i.e. "programasUP", "gananciasUP", "precios"
+            mercado (str): The mercado of the request.
+            fecha_inicial (str): The start date of the request.
+            fecha_final (str): The end date of the request.
+            up (str | List[str]): Optional. The UP(s) of the request.
+            sentido (str | List[str]): Optional. The sentido of the request.
+            agrupar (str): Optional. The grouping of the request.
+        Returns:
+            tuple: The key. i.e. ("gananciasUP", "rr", "2024-01-01", "2024-01-31", ("ABA1",), ("Bajar", "Subir"), "dia")
+        """
+        return (
+            consulta,
+            mercado.lower().replace(" ", ""),
+            str(fecha_inicial)[:10],
+            str(fecha_final)[:10],
+            CacheResultados.normalizar_lista(up),
+            CacheResultados.normalizar_lista(sentido),
+            agrupar.lower().strip() if agrupar else None,
+        )
+
+    @staticmethod
+    def version_datos(indicadores_type: List[str], fecha_inicial: str, fecha_final: str) -> tuple:
+        """
+        Version of the curated data read by a request: the modification time of every parquet file or partitioned dataset
+        of the indicadores for the years of the request. Datasets are written with a rename inside their folder
+        (parquet_dataset.write_parquet), so the folder mtime changes whenever a fragment is added or rewritten.
+
+        Args:
+            indicadores_type (List[str]): The indicador types read by the request. i.e. ["pbf", "diario"]
+            fecha_inicial (str): The start date of the request.
+            fecha_final (str): The end date of the request.
+        Returns:
+            tuple: The (path, mtime) of every file or dataset, mtime is None if it does not exist.
+        """
+        version = []
+        years_lst = Indicador.years_between(str(fecha_inicial)[:10], str(fecha_final)[:10])
+        for indicador_type in indicadores_type:
+            indicador = Indicador.__new__(Indicador) #solo se usa get_path, sin el print del constructor
+            indicador.indicador_type = indicador_type
+            for year in years_lst:
+                for path in sorted(indicador.get_path(year).values()):
+                    ruta = os.path.dirname(path) if "*" in os.path.basename(path) else path #dataset particionado: "...\\PROGRAMAS\\*.parquet"
+                    try:
+                        version.append((path, os.stat(ruta).st_mtime_ns))
+                    except OSError:
+                        version.append((path, None))
+        return tuple(version)
+
+    def get(self, clave: tuple, version: tuple) -> Optional[dict]:
+        """
+        Get the cached response of a request if it is still valid.
+
+        Args:
+            clave (tuple): The key of the request (see normalizar_clave).
+            version (tuple): The current version of the data of the request (see version_datos).
+        Returns:
+            dict: The cached response, or None if there is no valid entry.
+        """
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self._metricas["misses"] += 1
+                return None
+
+            version_entrada, instante, respuesta = entrada
+            if time.monotonic() - instante > self.ttl:
+                del self._entradas[clave]
+                self._metricas["expiradas"] += 1
+                self._metricas["misses"] += 1
+                return None
+            if version_entrada != version: #el daemon ha escrito datos nuevos del mercado/año
+                del self._entradas[clave]
+                self._metricas["invalidadas"] += 1
+                self._metricas["misses"] += 1
+                return None
+
+            self._entradas.move_to_end(clave)
+            self._metricas["hits"] += 1
+            return respuesta
+
+    def set(self, clave: tuple, version: tuple, respuesta: dict) -> None:
+        """
+        Store the response of a request, evicting the least recently used entries above max_entradas.
+
+        Args:
+            clave (tuple): The key of the request (see normalizar_clave).
+            version (tuple): The version of the data the response was computed from (see version_datos).
+            respuesta (dict): The response.
+        """
+        with self._lock:
+            self._entradas[clave] = (version, time.monotonic(), respuesta)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+                self._metricas["descartadas"] += 1
+
+    def limpiar(self) -> None:
+        """
+        Remove every entry (the metrics are kept).
+        """
+        with self._lock:
+            self._entradas.clear()
+
+    def stats(self) -> dict:
+        """
+        Hit/miss metrics of the cache.
+
+        Returns:
+            dict: The counters, the number of entries and the hit ratio.
+        """
+        with self._lock:
+            metricas = dict(self._metricas)
+            metricas["entradas"] = len(self._entradas)
+        consultas = metricas["hits"] + metricas["misses"]
+        metricas["ratio_hits"] = round(metricas["hits"] / consultas, 3) if consultas else 0.0
+        return metricas
+
+
+#cache compartida por los endpoints de la API
+cache = CacheResultados()
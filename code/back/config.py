@@ -18,7 +18,8 @@ logging = {
 }   
 
 processed_files_log = {
-    'filename':  "processed_files.json", #ruta para el archivo JSON de archivos procesados
+    'filename':  "processed_files.json", #ruta para el archivo JSON de archivos procesados (solo se lee para migrarlo al catalogo)
+    'catalogo': "processed_files.sqlite", #catalogo SQLite de ficheros procesados (negocio.catalogo_procesados)
     'filedir': carpeta_logs,
     'structure': {
         'i90': {},
@@ -31,6 +32,22 @@ processed_files_log = {
 }
 
 
+descargas_precios = {
+    'concurrente': True, #descargar mercados y fechas en paralelo
+    'directo': False, #escribir los precios directamente en curated (archivando el raw en .csv.gz) en vez de los CSV raw que procesa curated_process
+    'max_workers': 8, #descargas simultaneas en total
+    'max_descargas_host': { #descargas simultaneas por servidor
+        'api.esios.ree.es': 4,
+        'www.omie.es': 4,
+    }
+}
+
+procesado_curated = {
+    'max_workers': 4, #destinos curated (dataset de precios de un mercado y año, carpeta i90 de un año) procesados en paralelo
+    'n_procesos_i90': max(1, (os.cpu_count() or 1) - 1), #procesos que parsean las hojas de cada libro i90 (i90ZIP n_procesos), dejando un nucleo libre
+}
+
+
 #RR
 raw_rr = carpeta_raw + "\\OMIE\\Rr"
 curated_rr = carpeta_curated + "\\OMIE\\Rr"
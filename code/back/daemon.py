@@ -9,6 +9,7 @@ import os
 import json
 import config 
 import negocio.funciones_daemon as funciones_daemon
+from utilidades import parquet_dataset
 from typing import List, Dict
 import pretty_errors
 from apscheduler.schedulers.blocking import BlockingScheduler
@@ -52,50 +53,61 @@ def setup_logging(config: Dict[str, str]) -> None:
 
     logging.info("Logging initialized")
 
-def setup_processed_files_json(config: dict) -> None:
-    """Initialize the processed raw files JSON.
+def setup_catalogo_procesados(config: dict) -> None:
+    """Initialize the catalogue of processed raw files.
 
-    This function creates a JSON file to track processed raw files for each
-    indicator specified in the config. If the file already exists, it's left
-    untouched. If not, it creates a new file with an empty structure.
+    This function creates the SQLite catalogue that tracks the processed raw
+    files (negocio.catalogo_procesados). If a processed_files.json from previous
+    versions of the daemon exists, its files are imported into the catalogue
+    and the JSON is renamed to processed_files.json.migrado so it is only
+    imported once.
 
     Args:
         config (dict): A dictionary containing the configuration, including
-                       the 'processed_files' key with the filename and the
-                       list of indicators to track.
+                       the 'filedir', 'filename' (JSON) and 'catalogo' (SQLite) keys.
     """
+    catalogo = funciones_daemon.load_catalogo_procesados()
+
     # Get the path for the processed files JSON from the config
     processed_files_json_path = config['filedir'] + "\\" + config['filename'] #i.e. carpeta_daemon_logs + "\\processed_files.json" in config.py
 
-    # Get the structure for the processed files JSON from the config
-    structure = config['structure'] #i.e. { 'i90': {},  'diario': {}, 'intradiario': {}, 'rr': {}, 'afrr': {}, 'mfrr': {} }  in config.py
+    if os.path.exists(processed_files_json_path):
+        n_ficheros = catalogo.migrar_json(processed_files_json_path)
+        os.replace(processed_files_json_path, processed_files_json_path + ".migrado")
 
-    # Ensure the directory exists, only useful for when daemon log is not initialized first. 
-    os.makedirs(os.path.dirname(processed_files_json_path), exist_ok=True)
+        # Log the migration of the tracking file
+        logging.info(f"Migrated {n_ficheros} processed raw files from {processed_files_json_path} to {catalogo.path}")
 
-    # Check if the processed files JSON already exists
-    if os.path.exists(processed_files_json_path):
-        pass
-    else:
-        # If it doesn't exist, create it with the initial structure
-        with open(processed_files_json_path, 'w') as f:
-            json.dump(structure, f, indent=2)
-        
-        # Log that we've initialized the tracking file
-        logging.info(f"Initialized processed raw files tracking at {processed_files_json_path}")
+def setup_curated_datasets(carpeta_curated: str) -> None:
+    """Migrate the yearly curated parquet files to partitioned datasets.
+
+    The curated data is written and queried as one parquet fragment per day
+    (i.e. PROGRAMAS\\2024-06-14.parquet). The yearly files of previous
+    versions of the daemon (i.e. 2024\\PROGRAMAS.parquet, precios_rr.parquet)
+    are split into those datasets and renamed to .parquet.migrado, so they
+    are only migrated once (see parquet_dataset.migrate_monolithic_files).
+
+    Args:
+        carpeta_curated (str): The root of the curated data (carpeta_curated in config.py).
+    """
+    n_ficheros = parquet_dataset.migrate_monolithic_files(carpeta_curated)
+
+    # Log the migration of the yearly files
+    if n_ficheros:
+        logging.info(f"Migrated {n_ficheros} yearly parquet files under {carpeta_curated} to datasets")
 
 def raw_process():
     print("Proceso RAW....")
     n = 5
     today =  datetime.now().date()
-    funciones_daemon.descargador_precios(config.carpeta_raw, (today - timedelta(days=0)).strftime("%Y-%m-%d"), n, None)
+    funciones_daemon.descargador_precios(config.carpeta_raw, (today - timedelta(days=0)).strftime("%Y-%m-%d"), n, None, **config.descargas_precios)
     funciones_daemon.descargador_ultimo_i90(config.fichero_config, config.carpeta_raw, (today - timedelta(days=90)).strftime("%Y-%m-%d"), n, None)
 
 def curated_process():
     print("Proceso CURATED....")
     n = 5
     today =  datetime.now().date()    
-    funciones_daemon.process_raw_files(config.fichero_config, config.carpeta_raw_dir_lst, (today - timedelta(days=0)).strftime("%Y-%m-%d"), n, None)
+    funciones_daemon.process_raw_files(config.fichero_config, config.carpeta_raw_dir_lst, (today - timedelta(days=0)).strftime("%Y-%m-%d"), n, None, **config.procesado_curated)
 
 def run():
     sched = BlockingScheduler()
@@ -113,6 +125,8 @@ def run():
 if __name__ == "__main__":   
     
     setup_logging(config.logging)
+    setup_catalogo_procesados(config.processed_files_log)
+    setup_curated_datasets(config.carpeta_curated)
     run()
     #curated_process()
     #raw_process()
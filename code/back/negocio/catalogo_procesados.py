@@ -0,0 +1,215 @@
+import os
+import json
+import sqlite3
+import threading
+import contextlib
+from datetime import datetime
+from typing import Optional, List, Dict
+import utilidades.descargas as descargas
+
+
+TAMANO_LOTE = 500 #ficheros registrados en cada transaccion
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS ficheros_procesados (
+    filename TEXT PRIMARY KEY,
+    indicador TEXT,
+    year TEXT,
+    size INTEGER,
+    sha256 TEXT,
+    processed_at TEXT,
+    rows INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_ficheros_indicador_year ON ficheros_procesados (indicador, year);
+"""
+
+_COLUMNAS = ["filename", "indicador", "year", "size", "sha256", "processed_at", "rows"]
+
+
+class CatalogoProcesados:
+    """
+    SQLite catalogue of the raw files processed to curated, replacing processed_files.json.
+
+    Every file is a row keyed by its name (one indexed lookup instead of a search in the JSON lists) with its indicador,
+    year, size, content hash, processing time and row count. The records are written in batched transactions, so a crash
+    does not leave the catalogue half written, and the connection can be shared by the threads of the daemon.
+    """
+
+    def __init__(self, path: str, tamano_lote: int = TAMANO_LOTE):
+        """
+        Args:
+            path (str): The path of the SQLite file (created if it does not exist). i.e. carpeta_logs + "\\processed_files.sqlite"
+            tamano_lote (int): The records kept in memory before they are written in one transaction. Defaults to TAMANO_LOTE.
+        """
+        self.path = path
+        self.tamano_lote = tamano_lote
+        self._pendientes = {} #filename -> registro aun no escrito
+        self._lock = threading.RLock()
+
+        carpeta = os.path.dirname(path)
+        if carpeta:
+            os.makedirs(carpeta, exist_ok=True)
+        self._conexion = sqlite3.connect(path, check_same_thread=False) #acceso serializado con self._lock
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.executescript(_ESQUEMA)
+        self._conexion.commit()
+
+    def get(self, filename: str) -> Optional[dict]:
+        """
+        Get the record of a processed file.
+
+        Args:
+            filename (str): The name of the raw file. i.e. "2024-10-15_precios_rr.csv", "I90DIA_20240613.zip"
+        Returns:
+            dict: The record (see _COLUMNAS), or None if the file has not been processed.
+        """
+        filename = os.path.basename(filename)
+        with self._lock:
+            registro = self._pendientes.get(filename)
+            if registro is not None:
+                return dict(registro)
+            fila = self._conexion.execute(f"SELECT {', '.join(_COLUMNAS)} FROM ficheros_procesados WHERE filename = ?", (filename,)).fetchone()
+        return dict(zip(_COLUMNAS, fila)) if fila else None
+
+    def is_processed(self, filename: str, sha256: Optional[str] = None) -> bool:
+        """
+        Check if a file has been processed. If sha256 is given, the file must also have the same content it had when it was
+        processed (files migrated from the JSON have no hash and are only checked by name).
+
+        Args:
+            filename (str): The name of the raw file.
+            sha256 (str): Optional. The current hash of the file (see descargas.sha256_file).
+        Returns:
+            bool: True if the file has been processed (with that content), False otherwise.
+        """
+        registro = self.get(filename)
+        if registro is None:
+            return False
+        return sha256 is None or registro["sha256"] is None or registro["sha256"] == sha256
+
+    def registrar(self, filename: str, indicador: str, year, size: Optional[int] = None, sha256: Optional[str] = None,
+                  rows: Optional[int] = None, processed_at: Optional[str] = None) -> None:
+        """
+        Record a processed file (replacing its previous record). The record is written with the next batch, see guardar.
+
+        Args:
+            filename (str): The name of the raw file.
+            indicador (str): The indicador of the file. i.e. "i90", "diario", "rr"
+            year (str | int): The year of the file.
+            size (int): Optional. The size of the file in bytes.
+            sha256 (str): Optional. The hash of the content of the file.
+            rows (int): Optional. The rows written to curated.
+            processed_at (str): Optional. The processing time in ISO format. Defaults to now.
+        """
+        registro = {
+            "filename": os.path.basename(filename),
+            "indicador": indicador,
+            "year": str(year) if year is not None else None,
+            "size": size,
+            "sha256": sha256,
+            "processed_at": processed_at or datetime.now().isoformat(timespec="seconds"),
+            "rows": rows,
+        }
+        with self._lock:
+            self._pendientes[registro["filename"]] = registro
+            if len(self._pendientes) >= self.tamano_lote:
+                self.guardar()
+
+    def registrar_fichero(self, filepath: str, indicador: str, year, rows: Optional[int] = None, sha256: Optional[str] = None) -> None:
+        """
+        Record a processed raw file with its current size and content hash. See registrar.
+
+        Args:
+            filepath (str): The path of the raw file.
+            indicador (str): The indicador of the file.
+            year (str | int): The year of the file.
+            rows (int): Optional. The rows written to curated.
+            sha256 (str): Optional. The hash of the file if it is already known (i.e. the content that was processed). Defaults to the current hash.
+        """
+        self.registrar(os.path.basename(filepath), indicador, year, size=os.path.getsize(filepath), sha256=sha256 or descargas.sha256_file(filepath), rows=rows)
+
+    def guardar(self) -> int:
+        """
+        Write the pending records in a single transaction.
+
+        Returns:
+            int: The number of records written.
+        """
+        with self._lock:
+            if not self._pendientes:
+                return 0
+            registros = [tuple(registro[columna] for columna in _COLUMNAS) for registro in self._pendientes.values()]
+            with self._conexion: #commit, o rollback si falla (los registros siguen pendientes)
+                self._conexion.executemany(f"INSERT OR REPLACE INTO ficheros_procesados ({', '.join(_COLUMNAS)}) VALUES ({', '.join('?' * len(_COLUMNAS))})", registros)
+            self._pendientes.clear()
+            return len(registros)
+
+    @contextlib.contextmanager
+    def lote(self):
+        """
+        Group the records of a block of code (i.e. a run of process_raw_files) and write them when it ends.
+
+        Yields:
+            CatalogoProcesados: The catalogue.
+        """
+        try:
+            yield self
+        finally:
+            self.guardar()
+
+    def ficheros(self, indicador: Optional[str] = None, year=None) -> List[str]:
+        """
+        The processed files, optionally of an indicador and year.
+
+        Args:
+            indicador (str): Optional. The indicador. i.e. "diario"
+            year (str | int): Optional. The year.
+        Returns:
+            List[str]: The sorted names of the files.
+        """
+        self.guardar()
+        condiciones, params = [], []
+        if indicador is not None:
+            condiciones.append("indicador = ?")
+            params.append(indicador)
+        if year is not None:
+            condiciones.append("year = ?")
+            params.append(str(year))
+        where = f" WHERE {' AND '.join(condiciones)}" if condiciones else ""
+        with self._lock:
+            filas = self._conexion.execute(f"SELECT filename FROM ficheros_procesados{where} ORDER BY filename", params).fetchall()
+        return [fila[0] for fila in filas]
+
+    def migrar_json(self, json_path: str) -> int:
+        """
+        Import the files of a processed_files.json ({indicador: {year: [filename, ...]}}) in a single transaction. The files
+        of the JSON have no size, hash or row count. Files already in the catalogue are kept.
+
+        Args:
+            json_path (str): The path of the processed_files.json file.
+        Returns:
+            int: The number of files imported.
+        """
+        with open(json_path, "r") as f:
+            processed_files = json.load(f)
+
+        registros = [
+            (os.path.basename(filename), indicador, str(year), None, None, None, None)
+            for indicador, years in processed_files.items()
+            for year, filenames in (years or {}).items()
+            for filename in filenames
+        ]
+        self.guardar()
+        with self._lock:
+            with self._conexion:
+                antes = self._conexion.total_changes
+                self._conexion.executemany(f"INSERT OR IGNORE INTO ficheros_procesados ({', '.join(_COLUMNAS)}) VALUES ({', '.join('?' * len(_COLUMNAS))})", registros)
+                return self._conexion.total_changes - antes
+
+    def cerrar(self) -> None:
+        """
+        Write the pending records and close the connection.
+        """
+        with self._lock:
+            self.guardar()
+            self._conexion.close()
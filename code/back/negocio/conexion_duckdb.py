@@ -0,0 +1,110 @@
+import threading
+import queue
+import contextlib
+import duckdb
+import pandas as pd
+from typing import Optional
+
+
+class PoolDuckDB:
+    """
+    Thread-safe pool of cursors over a single in-memory DuckDB connection shared by the query layer.
+
+    Every cursor of the pool works on the same database, so the parquet metadata cache (footers and
+    row group statistics of the curated files) is shared by every API request instead of being read
+    again by each query.
+    """
+
+    def __init__(self, max_cursores: int = 8):
+        """
+        Args:
+            max_cursores (int): The maximum number of cursors used at the same time. Defaults to 8.
+        """
+        self.max_cursores = max_cursores
+        self._conexion = duckdb.connect(database=":memory:")
+        self._conexion.execute("SET parquet_metadata_cache = true")
+        self._cursores = queue.LifoQueue() #cursores libres (se reutiliza el ultimo devuelto)
+        self._semaforo = threading.BoundedSemaphore(max_cursores)
+        self._lock = threading.Lock()
+        self.cerrado = False
+
+    @contextlib.contextmanager
+    def cursor(self):
+        """
+        Borrow a cursor of the pool. Blocks if max_cursores cursors are already in use.
+
+        Yields:
+            duckdb.DuckDBPyConnection: A cursor of the shared connection.
+        """
+        self._semaforo.acquire()
+        try:
+            try:
+                cur = self._cursores.get_nowait()
+            except queue.Empty:
+                with self._lock: #crear cursores sobre la conexion compartida no es thread-safe
+                    cur = self._conexion.cursor()
+            try:
+                yield cur
+            finally:
+                self._cursores.put(cur)
+        finally:
+            self._semaforo.release()
+
+    def consultar(self, query: str, params: Optional[dict] = None) -> pd.DataFrame:
+        """
+        Run a parameterised query and return the result as a dataframe.
+
+        Args:
+            query (str): The SQL query with named parameters. i.e. "SELECT * FROM read_parquet($path) WHERE UPROG = $uprog_0"
+            params (dict): Optional. The values of the parameters. i.e. {"path": "...\\PROGRAMAS\\*.parquet", "uprog_0": "ABA1"}
+
+        Returns:
+            pd.DataFrame: The result of the query.
+        """
+        with self.cursor() as cur:
+            return cur.execute(query, params or {}).df()
+
+    def cerrar(self) -> None:
+        """
+        Close every cursor and the shared connection.
+        """
+        self.cerrado = True
+        while not self._cursores.empty():
+            self._cursores.get_nowait().close()
+        self._conexion.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> PoolDuckDB:
+    """
+    Get the DuckDB pool of the process (created on first use, and again if it has been closed).
+
+    Returns:
+        PoolDuckDB: The shared pool.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.cerrado:
+            _pool = PoolDuckDB()
+        return _pool
+
+
+def cerrar_pool() -> None:
+    """
+    Close the DuckDB pool of the process (i.e. when the API shuts down). The next query creates a new one.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.cerrar()
+            _pool = None
+
+
+def consultar(query: str, params: Optional[dict] = None) -> pd.DataFrame:
+    """
+    Run a parameterised query on the shared pool. See PoolDuckDB.consultar.
+    """
+    return get_pool().consultar(query, params)
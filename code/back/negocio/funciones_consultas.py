@@ -1,14 +1,22 @@
 import pandas as pd 
-import duckdb 
+import numpy as np
 from typing import List, Optional, Union
 from datetime import datetime, timedelta
 import os
+import glob
 import config_consultas as configc
+import utilidades.parquet_dataset as parquet_dataset
+import conexion_duckdb
 from bisect import bisect_left
 import pretty_errors
 import re
 
 class Indicador:
+    #modo medicion: si es True, get_programas_precios informa de los row groups que lee cada consulta (parquet_dataset.count_row_groups)
+    medir_row_groups = False
+    #si es True, get_ganancias calcula las ganancias con una consulta DuckDB (get_ganancias_sql), si no con pd.merge (get_ganancias_pandas)
+    ganancias_sql = True
+
     def __init__(self, indicador_type: str):
         self.indicador_type = indicador_type
         print("Indicador initialized with indicador type: ", self.indicador_type)
@@ -172,7 +180,61 @@ class Indicador:
         
         return paths_dct_copy
 
-    def create_program_uprog_filter(self, lista_programas: Optional[List[str]] = None, lista_uprog: Optional[List[str]] = None, table: Optional[str] = None) -> tuple[str, str]:
+    def get_paths_years(self, path_str: str, years_lst: List[str]) -> dict:
+        """
+        This function gets the existing path (file or glob) of every year of a query.
+        Args:
+            path_str (str): The key of the path in the paths dictionary. i.e. "path_prog", "path_prc".
+            years_lst (List[str]): The years of the query. i.e. ["2023", "2024"]
+        Returns:
+            dict: The path of every year with data. i.e. {"2023": "...\\2023\\PROG_RR\\*.parquet"}
+        """
+        paths_years = {}
+        for year in years_lst:
+            paths = self.get_path(year) #i.e. 2023, "i90" -> {"path_prog": "C:\\Users\\joaquin.costa\\Escritorio\\UP Tacker\\data\\curated\\ESIOS\\i90\\2023\\PROG_RR.parquet", "path_prc": "C:\\Users\\joaquin.costa\\Escritorio\\UP Tacker\\data\\curated\\ESIOS\\RR\\2023\\precios_rr.paquet"
+            path_prog_prc = paths.get(path_str) #i.e. "path_prog" = "C:\\Users\\joaquin.costa\\Escritorio\\UP Tacker\\data\\curated\\ESIOS\\i90\\2023\\PROG_RR.parquet"
+            path_existente = self.get_existing_path(path_prog_prc) if path_prog_prc else None
+            if path_existente:
+                paths_years[year] = path_existente
+            else:
+                print(f"Error: Path doesn't exist: {path_prog_prc}")
+        return paths_years
+
+    @staticmethod
+    def get_existing_path(path: str) -> Optional[str]:
+        """
+        This function gets the path with data of a configured path: a glob over a partitioned dataset (i.e. "...\\PROG_RR\\*.parquet")
+        or a single parquet file. If it has no data, the other layout of the same table is tried, so the yearly files not yet
+        migrated to datasets (parquet_dataset.migrate_monolithic_files) and the migrated ones of the paths still configured as a file are read.
+        Args:
+            path (str): The configured path. i.e. "...\\2023\\PROG_RR\\*.parquet"
+        Returns:
+            Optional[str]: The path with data, or None. i.e. "...\\2023\\PROG_RR.parquet" if the year has not been migrated yet
+        """
+        if "*" in os.path.basename(path):
+            path_alternativo = os.path.dirname(path) + ".parquet" #i.e. "...\\2023\\PROG_RR.parquet"
+        else:
+            path_alternativo = parquet_dataset.dataset_glob(parquet_dataset.dataset_path_from_parquet(path)) #i.e. "...\\2023\\precios_gestion_desvios\\*.parquet"
+        for candidato in [path, path_alternativo]:
+            if len(glob.glob(candidato)) > 0:
+                return candidato
+        return None
+
+    @staticmethod
+    def bind_list(nombre: str, valores: List) -> tuple[str, dict]:
+        """
+        This function creates the named parameters of a SQL IN clause, so the values are bound and never pasted into the query.
+        Args:
+            nombre (str): The prefix of the parameter names. i.e. "uprog"
+            valores (List): The values of the IN clause. i.e. ["ABA1", "ABA2"]
+        Returns:
+            tuple[str, dict]: The placeholders and the parameters. i.e. ("$uprog_0, $uprog_1", {"uprog_0": "ABA1", "uprog_1": "ABA2"})
+        """
+        params = {f"{nombre}_{i}": valor for i, valor in enumerate(valores)}
+        placeholders = ", ".join(f"${param}" for param in params)
+        return placeholders, params
+
+    def create_program_uprog_filter(self, lista_programas: Optional[List[str]] = None, lista_uprog: Optional[List[str]] = None, table: Optional[str] = None) -> tuple[str, str, dict]:
         """
         This function gets the filter condition for the given lista_programas and lista_uprog.
         Args: 
@@ -180,110 +242,68 @@ class Indicador:
             lista_uprog (List[str]): The lista_uprog to get the filter condition for.
 
         Returns: 
-            str: Two strings with the filter conditions for the given lista_programas and lista_uprog. i.e. "prog.PROGRAMA IN ('PBF', 'PVP', 'PHF1')" or "prog.UPROG IN ('ABA1', 'ABA2', 'ACE3')"
+            tuple[str, str, dict]: The filter conditions for the given lista_programas and lista_uprog and their bind parameters. 
+            i.e. "prog.PROGRAMA IN ($programa_0, $programa_1)", "prog.UPROG IN ($uprog_0)", {"programa_0": "PBF", "programa_1": "PVP", "uprog_0": "ABA1"}
         """
         # Initialize default filter conditions
         uprog_filter_condition = "1=1"
         programas_filter_condition = "1=1"
+        params = {}
+        prefix = f"{table}." if table else ""
 
         # Create filter condition for UPROG if lista_uprog is provided
         if lista_uprog: 
-            # Join the UPROG values with commas and wrap each in quotes
-            lista_uprog_str = ", ".join(f"'{uprog}'" for uprog in lista_uprog)
-            # Create the SQL IN clause for UPROG
-            if table:
-                uprog_filter_condition = f"{table}.UPROG IN ({lista_uprog_str})"
-            else:
-                uprog_filter_condition = f"UPROG IN ({lista_uprog_str})"
+            placeholders, uprog_params = Indicador.bind_list("uprog", lista_uprog)
+            uprog_filter_condition = f"{prefix}UPROG IN ({placeholders})"
+            params.update(uprog_params)
         
         # Create filter condition for PROGRAMA if lista_programas is provided
         if lista_programas: 
-            # Join the PROGRAMA values with commas and wrap each in quotes
-            lista_programas_str = ", ".join(f"'{programa}'" for programa in lista_programas)
-            # Create the SQL IN clause for PROGRAMA
-            if table:
-                programas_filter_condition = f"{table}.PROGRAMA IN ({lista_programas_str})"
-            else:
-                programas_filter_condition = f"PROGRAMA IN ({lista_programas_str})"
+            placeholders, programas_params = Indicador.bind_list("programa", lista_programas)
+            programas_filter_condition = f"{prefix}PROGRAMA IN ({placeholders})"
+            params.update(programas_params)
 
         # Return both filter conditions
-        return programas_filter_condition, uprog_filter_condition
+        return programas_filter_condition, uprog_filter_condition, params
 
-    def create_date_filter(self, year:str, years_lst: List[str], start_date:str, end_date:str, table: Optional[str] = None) -> str:
+    def create_date_filter(self, start_date:str, end_date:str, table: Optional[str] = None) -> tuple[str, dict]:
         """
-        This function creates the date filter for a given year that will be used in the SQL query.
+        This function creates the date filter that will be used in the SQL query (a single predicate for every year queried).
+        FECHA is stored as DATE in the curated files, so it is compared directly (no cast) and DuckDB can use the parquet statistics.
         Args: 
-            year (str): The year that will be used in the date filter.
-            years_lst (List[str]): The total number of years that will be used in the query (useful to check for first, last and middle years).
             start_date (str): The start_date to create the date filter for.
             end_date (str): The end_date to create the date filter for.
+            table (str, optional): The table name to prefix the FECHA column. Defaults to None.
         Returns: 
-            str: A string with the date filter for the given year.
+            tuple[str, dict]: The date filter and its bind parameters. i.e. "prog.FECHA BETWEEN $fecha_inicio AND $fecha_fin", {"fecha_inicio": "2024-01-01", "fecha_fin": "2024-01-31"}
         """
-        if table:
-            if len(years_lst) == 1: #for single year queries
-                    # If only one year, use the exact date range
-                    date_filter = f"TRY_CAST({table}.FECHA AS DATE) BETWEEN '{start_date}' AND '{end_date}'"
-                    
-            else: #for multi-year queries
-                if year == years_lst[0]:  # First year
-                    date_filter = f"TRY_CAST({table}.FECHA AS DATE) >= '{start_date}'"
-                elif year == years_lst[-1]:  # Last year
-                    date_filter = f"TRY_CAST({table}.FECHA AS DATE) <= '{end_date}'"
-                else:  # Middle years
-                    date_filter = f"TRY_CAST({table}.FECHA AS DATE) BETWEEN '{year}-01-01' AND '{year}-12-31'"
-        else:
-            if len(years_lst) == 1: #for single year queries
-                    # If only one year, use the exact date range
-                    date_filter = f"TRY_CAST(FECHA AS DATE) BETWEEN '{start_date}' AND '{end_date}'"  
-            else: #for multi-year queries
-                if year == years_lst[0]:  # First year
-                    date_filter = f"TRY_CAST(FECHA AS DATE) >= '{start_date}'"
-                elif year == years_lst[-1]:  # Last year
-                    date_filter = f"TRY_CAST(FECHA AS DATE) <= '{end_date}'"
-                else:  # Middle years
-                    date_filter = f"TRY_CAST(FECHA AS DATE) BETWEEN '{year}-01-01' AND '{year}-12-31'"
-
-        return date_filter
+        prefix = f"{table}." if table else ""
+        date_filter = f"{prefix}FECHA BETWEEN CAST($fecha_inicio AS DATE) AND CAST($fecha_fin AS DATE)"
+        return date_filter, {"fecha_inicio": str(start_date)[:10], "fecha_fin": str(end_date)[:10]}
      
-    def create_sesion_filter(self, sesion: List[int], table: Optional[str] = None) -> str:
+    def create_sesion_filter(self, sesion: List[int], table: Optional[str] = None) -> tuple[str, dict]:
         """
         This function creates the sesion filter for a given sesion.
         Args: 
             sesion (List[int]): The sesion to create the filter for. Has to be list of integers, i.e. [1, 2, 3] or "All" to select all sesions.
             table (str, optional): The table name to prefix the SESION column for the SQL query. Defaults to None.
         Returns: 
-            str: A string with the sesion filter for the given sesion. ex: "prog.SESION IN (1, 2, 3)"
+            tuple[str, dict]: The sesion filter for the given sesion and its bind parameters. ex: "prc.SESION IN ($sesion_0, $sesion_1)", {"sesion_0": 1, "sesion_1": 2}
         """
-        if table:
-            if sesion is None:
-                return "1=1"
-            else:
-                try:    
-                    if sesion == "All" or len(sesion) == 0 or sesion == list(range(1,8)):
-                        return "1=1"
-                    else:
-                        sesion_str = ", ".join(f"{s}" for s in sesion) #i.e. sesion = [1, 2, 3] -> sesion_str = "'1', '2', '3'"
-                        return f"{table}.SESION IN ({sesion_str})"
-                except ValueError as e:
-                    print(f"Error: {e}")
-                    return "1=1"
-        
-        else:
-            if sesion is None:
-                return "1=1"
-            else:
-                try:    
-                    if sesion == "All" or len(sesion) == 0:
-                        return "1=1"
-                    else:
-                        sesion_str = ", ".join(f"{s}" for s in sesion) #i.e. sesion = [1, 2, 3] -> sesion_str = "'1', '2', '3'"
-                        return f"SESION IN ({sesion_str})"
-                except ValueError as e:
-                    print(f"Error: {e}")
-                    return "1=1"
+        if sesion is None:
+            return "1=1", {}
+
+        try:    
+            if sesion == "All" or len(sesion) == 0 or sesion == list(range(1,8)):
+                return "1=1", {}
+            placeholders, params = Indicador.bind_list("sesion", [int(s) for s in sesion])
+            prefix = f"{table}." if table else ""
+            return f"{prefix}SESION IN ({placeholders})", params
+        except ValueError as e:
+            print(f"Error: {e}")
+            return "1=1", {}
    
-    def create_sentido_filter(self, sentido: List[str], table: str = None) -> str:
+    def create_sentido_filter(self, sentido: List[str], table: str = None) -> tuple[str, dict]:
         """
         Creates the sentido filter for a given direction (Subir/Bajar).
         
@@ -292,8 +312,8 @@ class Indicador:
             table (str, optional): The table name to prefix the SENTIDO column. Defaults to None.
         
         Returns:
-            str: A string with the sentido filter for the given sentido. 
-                Ex: "prog.SENTIDO IN ('Subir')" or "1=1" if table is not provided.
+            tuple[str, dict]: The sentido filter for the given sentido and its bind parameters. 
+                Ex: "prog.SENTIDO IN ($sentido_0)", {"sentido_0": "Subir"} or "1=1", {} if no filter is needed.
         
         Raises:
             ValueError: If an invalid direction is provided.
@@ -302,7 +322,7 @@ class Indicador:
         
         if not sentido:
             print(f"No direction filter provided for {table}")
-            return "1=1"
+            return "1=1", {}
         try:
             invalid_sentidos = set(sentido) - valid_sentidos 
             if invalid_sentidos:
@@ -310,28 +330,28 @@ class Indicador:
             
         except Exception as e:
             print(f"Error: {e}")
-            return "1=1"
+            return "1=1", {}
         
         if set(sentido) == valid_sentidos:
             print(f"All directions selected, no filter needed")
-            return "1=1"
+            return "1=1", {}
         
-        sentido_str = ", ".join(f"'{d}'" for d in sentido)
+        placeholders, params = Indicador.bind_list("sentido", sentido)
         if table:
-            sentido_filter = f"{table}.SENTIDO IN ({sentido_str})"
+            sentido_filter = f"{table}.SENTIDO IN ({placeholders})"
             print(f"Direction filter for {table}: {sentido_filter}")
         else:
-            sentido_filter = f"SENTIDO IN ({sentido_str})"
+            sentido_filter = f"SENTIDO IN ({placeholders})"
             print(f"Direction filter: {sentido_filter}")
         
-        return sentido_filter
+        return sentido_filter, params
 
-    def check_uprog(self, lista_uprog: List[str], path_prog: str) -> List[str]:
+    def check_uprog(self, lista_uprog: List[str], path_prog: Union[str, List[str]]) -> List[str]:
         """
         This function checks if the lista_uprog is valid and returns the lista_uprog with the UPROG values that are found in the dataset.
         Args:   
             lista_uprog (List[str]): The lista_uprog to check.
-            path_prog (str): The path to the programa_{program_type}.parquet file.
+            path_prog (str | List[str]): The path to the programa_{program_type}.parquet file, or a list of paths/globs (i.e. one per year).
         Returns: 
             List[str]: A lista_uprog with the UPROG values that are found in the dataset.
         """
@@ -345,14 +365,17 @@ class Indicador:
 
         if len(lista_uprog) > 0: #if i am filtering by lista_uprog
 
-            # Load the unique UPROG values directly from the SQL query and sort them alphabetically
-            unique_uprog_values = duckdb.sql(f"SELECT DISTINCT UPROG FROM '{path_prog}' ORDER BY UPROG").df()['UPROG'].tolist()
+            # Sorted unique UPROG values of every file/dataset, cached in memory per version of the data (see parquet_dataset.up_set)
+            paths = [path_prog] if isinstance(path_prog, str) else path_prog
+            unique_uprog_values = np.unique(np.concatenate([parquet_dataset.up_set(path) for path in paths]))
 
-            # Use binary search to filter lista_uprog based on unique UPROG values
-            filtered_lista_uprog = [uprog for uprog in lista_uprog if Indicador.binary_search(unique_uprog_values, uprog) == True]
+            # Vectorised membership test of the whole lista_uprog (keeps the order of lista_uprog)
+            encontradas = np.isin(np.asarray(lista_uprog, dtype=str), unique_uprog_values)
+            filtered_lista_uprog = [uprog for uprog, encontrada in zip(lista_uprog, encontradas) if encontrada]
 
             print(f"{len(filtered_lista_uprog)} out of {len(lista_uprog_original)} UPROG values found in the dataset")
-            print(f"UPROG values found in the dataset: {filtered_lista_uprog}")
+            if len(filtered_lista_uprog) < len(lista_uprog_original):
+                print(f"UPROG values NOT found in the dataset: {[uprog for uprog, encontrada in zip(lista_uprog, encontradas) if not encontrada]}")
             
             return filtered_lista_uprog, lista_uprog_original
 
@@ -375,86 +398,281 @@ class Indicador:
         """
 
         years_lst = Indicador.years_between(start_date, end_date)
-        master_df = pd.DataFrame()
 
         #check if program type is prc (precios) or prog (programas) and return the corresponding table and path_str
         table_str, path_str = Indicador.check_consulta_type(consulta_type) 
 
-        for year in years_lst:
-            try:
-                paths = self.get_path(year) #i.e. 2023, "i90" -> {"path_prog": "C:\\Users\\joaquin.costa\\Escritorio\\UP Tacker\\data\\curated\\ESIOS\\i90\\2023\\PROG_RR.parquet", "path_prc": "C:\\Users\\joaquin.costa\\Escritorio\\UP Tacker\\data\\curated\\ESIOS\\RR\\2023\\precios_rr.paquet"
-                path_prog_prc = paths.get(path_str) #i.e. "path_prog" = "C:\\Users\\joaquin.costa\\Escritorio\\UP Tacker\\data\\curated\\ESIOS\\i90\\2023\\PROG_RR.parquet"
-                check_path = os.path.exists(path_prog_prc)
-
-                if not check_path:
-                    raise FileNotFoundError(f"Path doesn't exist: {path_prog_prc}")
-                
-                ########################################
-                ### START OF FILTER GENERATION BLOCK ###
-                date_filter = self.create_date_filter(year, years_lst, start_date, end_date, table_str)
-                
-                if consulta_type == "prog": #filters valid only for PROG indicadores
-                    sesion_filter = "1=1"
-                    #check if the lista_uprog is valid (using binary search) and returns the lista_uprog with the UPROG values that are found in the dataset
-                    filtered_lista_uprog, lista_uprog_original = self.check_uprog(lista_uprog, path_prog_prc) 
-
-                    if len(filtered_lista_uprog) == 0 and len(lista_uprog_original) > 0: #this would mean that there were not matches for the lista_uprog in the dataset, hence that year can be skipped
-                        print(f"No matches for lista_uprog in the dataset for year {year}. Skipping year.")
-                        continue #moving on to next iteration of loop (i.e. next year)
-
-                    #Applying data set filters
-                    if self.indicador_type in ["pbf", "pvp", "phf"]:
-                        programas_filter_condition, uprog_filter_condition = self.create_program_uprog_filter(programas_i90, filtered_lista_uprog, table_str)
-                    else:
-                        #passing None will return a 1=1 filter condition for programas_filter_condition, which is essentially no filter
-                        programas_filter_condition, uprog_filter_condition = self.create_program_uprog_filter(None, filtered_lista_uprog, "prog")
-                
-                else: #filters valid only for PRC indicadores
-                    programas_filter_condition, uprog_filter_condition = "1=1", "1=1" #both filters are set to 1=1 for prc tables, which is essentially no filter
-
-                    if self.indicador_type == "intradiario": #sesion filter is valid only for intradiario indicador
-                        sesion_filter = self.create_sesion_filter(sesion, table_str)
-                    else:
-                        sesion_filter = "1=1"
-
-                if self.indicador_type in ["rr", "afrr", "mfrr", "restricciones", "desvios"]: 
-                    sentido_filter = self.create_sentido_filter(sentido, table_str) #table str defaults to None if not provided
-                else: 
-                    sentido_filter = "1=1"
-                ### END OF FILTER GENERATION BLOCK ###
-                ######################################
-
-                query = f"""
-                SELECT * FROM '{path_prog_prc}' as {table_str}
-                WHERE {programas_filter_condition}
-                AND {uprog_filter_condition}
-                AND {sentido_filter}
-                AND {date_filter}
-                AND {sesion_filter}
-                """
-                print(f"Retrieving program {self.indicador_type.upper()} for {year}")
-                print(f"query: {query}")
+        #ficheros (o globs de datasets particionados) de todos los años de la consulta, se leen en una sola consulta
+        paths_prog_prc = self.get_paths_years(path_str, years_lst)
 
-                df = duckdb.sql(query).df()
-                if df.empty:
-                    if consulta_type == "prog":
-                        print(f"No programa  found for the UP {lista_uprog} between {start_date} and {end_date} for the given indicador {self.indicador_type} with parameters sentido: {sentido}")
-                    else:
-                        print(f"No precios data found for the given indicador {self.indicador_type} with parameters start_date: {start_date}, end_date: {end_date}, sentido: {sentido}")
-                    return df
+        if not paths_prog_prc:
+            return pd.DataFrame()
 
-            except Exception as e:
-                print(f"Error: {e}")
+        try:
+            ########################################
+            ### START OF FILTER GENERATION BLOCK ###
+            date_filter, params = self.create_date_filter(start_date, end_date, table_str)
+            params["paths"] = list(paths_prog_prc.values())
+            
+            if consulta_type == "prog": #filters valid only for PROG indicadores
+                sesion_filter, sesion_params = "1=1", {}
+                #check if the lista_uprog is valid (using binary search) and returns the lista_uprog with the UPROG values that are found in the dataset
+                filtered_lista_uprog, lista_uprog_original = self.check_uprog(lista_uprog, params["paths"]) 
+
+                if len(filtered_lista_uprog) == 0 and len(lista_uprog_original) > 0: #this would mean that there were not matches for the lista_uprog in the dataset
+                    print(f"No matches for lista_uprog in the dataset for years {years_lst}.")
+                    return pd.DataFrame()
+
+                #Applying data set filters
+                if self.indicador_type in ["pbf", "pvp", "phf"]:
+                    programas_filter_condition, uprog_filter_condition, uprog_params = self.create_program_uprog_filter(programas_i90, filtered_lista_uprog, table_str)
+                else:
+                    #passing None will return a 1=1 filter condition for programas_filter_condition, which is essentially no filter
+                    programas_filter_condition, uprog_filter_condition, uprog_params = self.create_program_uprog_filter(None, filtered_lista_uprog, "prog")
+            
+            else: #filters valid only for PRC indicadores
+                programas_filter_condition, uprog_filter_condition, uprog_params = "1=1", "1=1", {} #both filters are set to 1=1 for prc tables, which is essentially no filter
 
-            else:
-                master_df = pd.concat([master_df, df], ignore_index=True)
+                if self.indicador_type == "intradiario": #sesion filter is valid only for intradiario indicador
+                    sesion_filter, sesion_params = self.create_sesion_filter(sesion, table_str)
+                else:
+                    sesion_filter, sesion_params = "1=1", {}
+
+            if self.indicador_type in ["rr", "afrr", "mfrr", "restricciones", "desvios"]: 
+                sentido_filter, sentido_params = self.create_sentido_filter(sentido, table_str) #table str defaults to None if not provided
+            else: 
+                sentido_filter, sentido_params = "1=1", {}
+
+            #los valores de los filtros van como parametros de la consulta (no se pegan en el SQL)
+            params.update(uprog_params)
+            params.update(sentido_params)
+            params.update(sesion_params)
+            ### END OF FILTER GENERATION BLOCK ###
+            ######################################
+
+            #una sola consulta sobre los ficheros de todos los años (union_by_name por si algun año tiene columnas distintas)
+            query = f"""
+            SELECT * FROM read_parquet($paths, union_by_name = true) as {table_str}
+            WHERE {programas_filter_condition}
+            AND {uprog_filter_condition}
+            AND {sentido_filter}
+            AND {date_filter}
+            AND {sesion_filter}
+            """
+            print(f"Retrieving program {self.indicador_type.upper()} for {list(paths_prog_prc.keys())}")
+            print(f"query: {query}")
+            print(f"params: {params}")
+
+            if Indicador.medir_row_groups:
+                for year, path_prog_prc in paths_prog_prc.items():
+                    self.medir_consulta(path_prog_prc, year, start_date, end_date, filtered_lista_uprog if consulta_type == "prog" else None, programas_i90 if consulta_type == "prog" and self.indicador_type in ["pbf", "pvp", "phf"] else None)
+
+            df = parquet_dataset.restore_float32(conexion_duckdb.consultar(query, params)) #ENERGIA se guarda como float32
+            if df.empty:
+                if consulta_type == "prog":
+                    print(f"No programa  found for the UP {lista_uprog} between {start_date} and {end_date} for the given indicador {self.indicador_type} with parameters sentido: {sentido}")
+                else:
+                    print(f"No precios data found for the given indicador {self.indicador_type} with parameters start_date: {start_date}, end_date: {end_date}, sentido: {sentido}")
+            return df
 
-        return master_df
+        except Exception as e:
+            print(f"Error: {e}")
+            return pd.DataFrame()
         
-    def get_ganancias(self, config: dict, start_date: str, end_date: str, lista_uprog: List[str], sentido: Optional[List[str]] = None) -> pd.DataFrame:
+    def medir_consulta(self, path_prog_prc: str, year: int, start_date: str, end_date: str, lista_uprog: Optional[List[str]], programas_i90: Optional[List[str]]) -> dict:
+        """
+        Measurement mode of get_programas_precios: reports how many row groups of the curated files the query of a year reads,
+        based on the min/max statistics of UPROG, PROGRAMA and FECHA.
+
+        Args:
+            path_prog_prc (str): The parquet file or glob queried.
+            year (int): The year of the query.
+            start_date (str): The start_date of the query.
+            end_date (str): The end_date of the query.
+            lista_uprog (Optional[List[str]]): The UPROG filter of the query, if any.
+            programas_i90 (Optional[List[str]]): The PROGRAMA filter of the query, if any.
+        Returns:
+            dict: The number of files, total row groups and row groups read.
+        """
+        filtros = {
+            "FECHA": (max(start_date, f"{year}-01-01"), min(end_date, f"{year}-12-31")),
+            "UPROG": lista_uprog,
+            "PROGRAMA": programas_i90,
+        }
+        resultado = parquet_dataset.count_row_groups(path_prog_prc, filtros)
+        print(f"Row groups read for {self.indicador_type.upper()} {year}: {resultado['row_groups_read']} out of {resultado['row_groups']} ({resultado['files']} files)")
+        return resultado
+
+    def get_lista_up(self, start_date: str, end_date: str, programas_i90: Optional[List[str]] = None) -> List[str]:
+        """
+        Get the list of UPs with programas between two dates, answered from the UP index (first/last FECHA of every UP) that the
+        daemon keeps next to every curated dataset (see parquet_dataset.update_up_index). If a year has no index yet, it is
+        built in memory from the UPROG, PROGRAMA and FECHA columns only.
+        Args:
+            start_date (str): Start date for the query
+            end_date (str): End date for the query
+            programas_i90 (Optional[List[str]]): Optional. Only the UPs of these programas. i.e. ["PBF"]
+        Returns:
+            List[str]: A sorted list of unique UPs for the given indicador.
+        """
+        years_lst = Indicador.years_between(start_date, end_date)
+        ups = set()
+        for year, path_prog in self.get_paths_years("path_prog", years_lst).items():
+            lista_up = parquet_dataset.up_list(path_prog, start_date, end_date, programas_i90)
+            if lista_up is None:
+                print(f"No UP index found for {path_prog}, building it from the data")
+                indice = parquet_dataset.build_up_index(path_prog, write=False) #el indice solo lo escribe el daemon
+                lista_up = parquet_dataset.up_list_from_index(indice, start_date, end_date, programas_i90)
+            ups.update(lista_up)
+        return sorted(ups)
+
+    def get_ganancias(self, config: dict, start_date: str, end_date: str, lista_uprog: List[str], sentido: Optional[List[str]] = None, detalle: bool = True) -> pd.DataFrame:
         """
         Generic function to calculate gains for different indicators.
         
+        Args:
+            start_date (str): Start date for the query
+            end_date (str): End date for the query
+            lista_uprog (List[str]): List of UPROGs to filter
+            sentido (Optional[List[str]]): Direction filter, if applicable
+            config (dict): Configuration dictionary for the indicator
+            detalle (bool): Optional. If False only the total gains per UPROG are computed (the detailed DataFrame is empty). Defaults to True.
+        Returns:
+            tuple[pd.DataFrame, pd.DataFrame]: Total gains per UPROG and detailed DataFrame
+        """
+        if Indicador.ganancias_sql:
+            return self.get_ganancias_sql(config, start_date, end_date, lista_uprog, sentido, detalle)
+        return self.get_ganancias_pandas(config, start_date, end_date, lista_uprog, sentido)
+
+    def get_ganancias_sql(self, config: dict, start_date: str, end_date: str, lista_uprog: List[str], sentido: Optional[List[str]] = None, detalle: bool = True) -> pd.DataFrame:
+        """
+        Calculates the gains in DuckDB: the join of programas and precios, the HORA//4 alignment, the REDESPACHO filters and the
+        sum per UPROG are a single query over the parquet files of every year, so only the result is loaded in pandas.
+        Same result as get_ganancias_pandas, including the columns of the detailed DataFrame (i.e. SENTIDO_x/SENTIDO_y).
+
+        Args:
+            config (dict): Configuration dictionary for the indicator (uses the *_sql keys, the merge columns and prc_indicador)
+            start_date (str): Start date for the query
+            end_date (str): End date for the query
+            lista_uprog (List[str]): List of UPROGs to filter
+            sentido (Optional[List[str]]): Direction filter, if applicable
+            detalle (bool): Optional. If False only the total gains per UPROG are queried. Defaults to True.
+        Returns:
+            tuple[pd.DataFrame, pd.DataFrame]: Total gains per UPROG and detailed DataFrame
+        """
+        if not config:
+            raise ValueError(f"Invalid indicador: {self.indicador_type}")
+
+        years_lst = Indicador.years_between(start_date, end_date)
+        indicador_prc = config['prc_indicador']() if config.get('prc_indicador') else self #i.e. PBF usa los precios del mercado diario
+        paths_prog = self.get_paths_years("path_prog", years_lst)
+        paths_prc = indicador_prc.get_paths_years("path_prc", years_lst)
+
+        if not paths_prog or not paths_prc:
+            print(f"No ganancias data found for {self.indicador_type} from {start_date} to {end_date}")
+            return pd.DataFrame(), pd.DataFrame()
+
+        try:
+            #filtros de programas (prog) y precios (prc), los valores van como parametros de la consulta
+            date_filter_prog, params = self.create_date_filter(start_date, end_date, "prog")
+            date_filter_prc, _ = self.create_date_filter(start_date, end_date, "prc")
+            programas_filter, uprog_filter, uprog_params = self.create_program_uprog_filter(config.get('programas_i90'), lista_uprog, "prog")
+            if self.indicador_type in ["rr", "afrr", "mfrr", "restricciones", "desvios"]:
+                sentido_filter_prog, sentido_params = self.create_sentido_filter(sentido, "prog")
+                sentido_filter_prc, _ = self.create_sentido_filter(sentido, "prc") #mismos parametros que prog
+            else:
+                sentido_filter_prog, sentido_filter_prc, sentido_params = "1=1", "1=1", {}
+            params.update(uprog_params)
+            params.update(sentido_params)
+            params["paths_prog"] = list(paths_prog.values())
+            params["paths_prc"] = list(paths_prc.values())
+
+            #mismo nivel de granularidad: en afrr y desvios HORA esta en 1-96 (cuartohoraria) y PERIODO en 1-24 (horaria)
+            hora = "prog.HORA // 4" if self.indicador_type in ["desvios", "afrr"] else "prog.HORA"
+
+            join_condition = " AND ".join(
+                f"CAST(prog.{col_prog} AS DATE) = CAST(prc.{col_prc} AS DATE)" if col_prog == "FECHA" else f"prog.{col_prog} = prc.{col_prc}"
+                for col_prog, col_prc in zip(config['merge_prog_cols'], config['merge_prc_cols'])
+            )
+            #mismo redondeo que pandas/numpy (round half to even de x*10^n) para obtener las mismas ganancias que get_ganancias_pandas
+            energia = "ROUND_EVEN(CAST(prog.ENERGIA AS DOUBLE) * 1000, 0) / 1000" #ENERGIA se guarda como float32 (ver parquet_dataset.restore_float32)
+            ganancia = f"ROUND_EVEN(({energia}) * prc.PRECIO * 100, 0) / 100"
+
+            with_query = f"""
+            WITH prog AS (
+                SELECT * REPLACE ({hora} AS HORA) FROM read_parquet($paths_prog, union_by_name = true) as prog
+                WHERE {programas_filter}
+                AND {uprog_filter}
+                AND {sentido_filter_prog}
+                AND {date_filter_prog}
+                AND {config.get('filter_sql') or '1=1'}
+            ),
+            prc AS (
+                SELECT * FROM read_parquet($paths_prc, union_by_name = true) as prc
+                WHERE {sentido_filter_prc}
+                AND {date_filter_prc}
+            )
+            """
+            from_query = f"""
+            FROM prog JOIN prc ON {join_condition}
+            WHERE {config.get('additional_filter_sql') or '1=1'}
+            """
+            print(f"Retrieving ganancias {self.indicador_type.upper()} for {list(paths_prog.keys())}")
+            print(f"query: {with_query}{from_query}")
+            print(f"params: {params}")
+
+            if detalle:
+                #mismas columnas que pd.merge: las columnas de merge con el mismo nombre en prog y prc una sola vez,
+                #el resto de columnas comunes (i.e. SENTIDO, DST) con los sufijos _x (prog) e _y (prc)
+                columnas_prog = conexion_duckdb.consultar("DESCRIBE SELECT * FROM read_parquet($paths, union_by_name = true)", {"paths": params["paths_prog"]})["column_name"].tolist()
+                columnas_prc = conexion_duckdb.consultar("DESCRIBE SELECT * FROM read_parquet($paths, union_by_name = true)", {"paths": params["paths_prc"]})["column_name"].tolist()
+                claves_comunes = {col_prog for col_prog, col_prc in zip(config['merge_prog_cols'], config['merge_prc_cols']) if col_prog == col_prc}
+                comunes = (set(columnas_prog) & set(columnas_prc)) - claves_comunes
+                columnas = [f'prog."{col}" AS "{col}_x"' if col in comunes else f'prog."{col}"' for col in columnas_prog]
+                columnas += [f'prc."{col}" AS "{col}_y"' if col in comunes else f'prc."{col}"' for col in columnas_prc if col not in claves_comunes]
+
+                query = f"""{with_query}
+                SELECT {", ".join(columnas)}, {ganancia} AS GANANCIA
+                {from_query}
+                """
+                ganancia_df = parquet_dataset.restore_float32(conexion_duckdb.consultar(query, params))
+                if ganancia_df.empty:
+                    print(f"No data found after applying filters for {self.indicador_type}")
+                    return ganancia_df, ganancia_df
+                #mismos tipos que get_ganancias_pandas
+                ganancia_df['FECHA'] = pd.to_datetime(ganancia_df['FECHA'])
+                for col in ['HORA', 'PERIODO']:
+                    if col in ganancia_df.columns:
+                        ganancia_df[col] = ganancia_df[col].astype("int64")
+
+                #el detalle ya esta en memoria, la suma por UP se hace sobre el
+                total_ganancia = ganancia_df.groupby('UPROG', observed=True)['GANANCIA'].sum().reset_index()
+            else:
+                query = f"""{with_query}
+                SELECT prog.UPROG, SUM({ganancia}) AS GANANCIA
+                {from_query}
+                GROUP BY prog.UPROG
+                ORDER BY prog.UPROG
+                """
+                total_ganancia = conexion_duckdb.consultar(query, params)
+                ganancia_df = pd.DataFrame()
+                if total_ganancia.empty:
+                    print(f"No data found after applying filters for {self.indicador_type}")
+                    return total_ganancia, ganancia_df
+
+            total_ganancia['GANANCIA'] = total_ganancia['GANANCIA'].round(2)
+            print(f"total_ganancia: {total_ganancia}")
+            return total_ganancia, ganancia_df
+
+        except Exception as e:
+            print(f"Error: {e}")
+            return pd.DataFrame(), pd.DataFrame()
+
+    def get_ganancias_pandas(self, config: dict, start_date: str, end_date: str, lista_uprog: List[str], sentido: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Generic function to calculate gains for different indicators, merging the programas and precios dataframes in pandas.
+        Used when Indicador.ganancias_sql is False.
+        
         Args:
             start_date (str): Start date for the query
             end_date (str): End date for the query
@@ -603,7 +821,7 @@ class Indicador:
             return 'first'
 
         # Create aggregation dictionary
-        excluded_columns = ['FECHA', 'HORA', 'SENTIDO']
+        excluded_columns = ['FECHA', 'HORA', 'SENTIDO', 'DST']
         agg_dict = {}
         for column in df.columns:
             if column not in excluded_columns:
@@ -647,8 +865,13 @@ class PBF(Indicador):
             'prc_func': lambda start_date, end_date: Diario().get_precios(start_date, end_date),
             'merge_prog_cols': ['FECHA', 'HORA'],
             'merge_prc_cols': ['FECHA', 'PERIODO'],
-            'filter_func': lambda df: df[~df['HORA'].isin(['3a', '3b'])],
-            'additional_filter': None
+            'filter_func': lambda df: df[df['DST'] == 0], #excluir las horas 3a y 3b del dia de 25 horas
+            'additional_filter': None,
+            #equivalentes SQL usados por get_ganancias_sql
+            'prc_indicador': lambda: Diario(),
+            'programas_i90': ["PBF"],
+            'filter_sql': "prog.DST = 0",
+            'additional_filter_sql': None
         }
 
     def get_programas(self, start_date: str, end_date: str, lista_uprog: List[str]) -> pd.DataFrame:
@@ -674,8 +897,7 @@ class PBF(Indicador):
         Returns:
             List[str]: A list of unique UPs for the given indicador.
         """
-        df = self.get_programas(start_date, end_date, None)
-        return df["UPROG"].unique().tolist()
+        return super().get_lista_up(start_date, end_date, ["PBF"])
 
 class PVP(Indicador):
     def __init__(self):
@@ -721,8 +943,7 @@ class PVP(Indicador):
         return super().filtrar_columnas(df, consulta_type, self.indicador_type)
     
     def get_lista_up(self, start_date: str, end_date: str) -> List[str]:
-        df = self.get_programas(start_date, end_date, None)
-        return df["UPROG"].unique().tolist()
+        return super().get_lista_up(start_date, end_date, ["PVP"])
 
 class PHF(Indicador):
     def __init__(self):
@@ -749,8 +970,7 @@ class PHF(Indicador):
 
     def get_lista_up(self, start_date: str, end_date: str) -> List[str]:
         # Since PHF requires programas_i90, we'll use all PHF programs
-        df = self.get_programas(start_date, end_date, None, ["PHF1", "PHF2", "PHF3", "PHF4", "PHF5", "PHF6", "PHF7"])
-        return df["UPROG"].unique().tolist()
+        return super().get_lista_up(start_date, end_date, ["PHF1", "PHF2", "PHF3", "PHF4", "PHF5", "PHF6", "PHF7"])
 
 class P48(Indicador):
     def __init__(self):
@@ -770,8 +990,7 @@ class P48(Indicador):
         return super().filtrar_columnas(df, consulta_type, self.indicador_type)
     
     def get_lista_up(self, start_date: str, end_date: str) -> List[str]:
-        df = self.get_programas(start_date, end_date, None)
-        return df["UPROG"].unique().tolist()
+        return super().get_lista_up(start_date, end_date)
 
 class RR(Indicador):
     def __init__(self):
@@ -784,7 +1003,10 @@ class RR(Indicador):
             'merge_prog_cols': ['FECHA', 'HORA'],
             'merge_prc_cols': ['FECHA', 'PERIODO'],
             'filter_func': None,
-            'additional_filter': lambda df: df[df['REDESPACHO'] == 'RR']
+            'additional_filter': lambda df: df[df['REDESPACHO'] == 'RR'],
+            #equivalentes SQL usados por get_ganancias_sql
+            'filter_sql': None,
+            'additional_filter_sql': "REDESPACHO = 'RR'"
         }
 
     def get_programas(self, start_date: str, end_date: str, lista_uprog: List[str], sentido: Optional[List[str]] = None) -> pd.DataFrame:
@@ -901,8 +1123,7 @@ class RR(Indicador):
         return super().filtrar_columnas(df, consulta_type, self.indicador_type)
     
     def get_lista_up(self, start_date: str, end_date: str) -> List[str]:
-        df = self.get_programas(start_date, end_date, None)
-        return df["UPROG"].unique().tolist()
+        return super().get_lista_up(start_date, end_date)
 
 class Secundaria(Indicador):
     def __init__(self):
@@ -915,7 +1136,10 @@ class Secundaria(Indicador):
             'merge_prog_cols': ['FECHA', 'HORA'],
             'merge_prc_cols': ['FECHA', 'PERIODO'],
             'filter_func': None,
-            'additional_filter': None
+            'additional_filter': None,
+            #equivalentes SQL usados por get_ganancias_sql
+            'filter_sql': None,
+            'additional_filter_sql': None
         }
 
     def get_programas(self, start_date: str, end_date: str, lista_uprog: List[str], sentido: List[str]) -> pd.DataFrame:
@@ -963,8 +1187,7 @@ class Secundaria(Indicador):
         return df 
 
     def get_lista_up(self, start_date: str, end_date: str) -> List[str]:
-        df = self.get_programas(start_date, end_date, None, ["Subir", "Bajar"])
-        return df["UPROG"].unique().tolist()
+        return super().get_lista_up(start_date, end_date)
 
 class Terciaria(Indicador):
     def __init__(self):
@@ -977,8 +1200,11 @@ class Terciaria(Indicador):
             'merge_prog_cols': ['FECHA', 'HORA', 'SENTIDO'],
             'merge_prc_cols': ['FECHA', 'PERIODO', 'SENTIDO'],
             'filter_func': None,
-            'additional_filter': lambda df: df[df['REDESPACHO'].isin(['TER', 'TERPRO', 'TERMER', "TERDIR"])] #filter for activacion directa, programada, y mecanismo excepcional de terciaria
+            'additional_filter': lambda df: df[df['REDESPACHO'].isin(['TER', 'TERPRO', 'TERMER', "TERDIR"])], #filter for activacion directa, programada, y mecanismo excepcional de terciaria
             #TER y TERPRO son la asignacion de terciaria, mientras que TERMER es la asignacion por mecanismo excepcional de terciaria. 
+            #equivalentes SQL usados por get_ganancias_sql
+            'filter_sql': None,
+            'additional_filter_sql': "REDESPACHO IN ('TER', 'TERPRO', 'TERMER', 'TERDIR')"
         }
 
     def get_programas(self, start_date: str, end_date: str, lista_uprog: List[str], sentido: List[str]) -> pd.DataFrame:
@@ -1002,8 +1228,7 @@ class Terciaria(Indicador):
         return df 
 
     def get_lista_up(self, start_date: str, end_date: str) -> List[str]:
-        df = self.get_programas(start_date, end_date, None, ["Subir", "Bajar"])
-        return df["UPROG"].unique().tolist()
+        return super().get_lista_up(start_date, end_date)
 
 class Restricciones(Indicador):
     def __init__(self):
@@ -1013,10 +1238,14 @@ class Restricciones(Indicador):
         self.indicador_config = {
             'prog_func': lambda start_date, end_date, lista_uprog, sentido: self.get_programas(start_date, end_date, lista_uprog, sentido),
             'prc_func': lambda start_date, end_date, sentido: self.get_precios(start_date, end_date, sentido),
-            'merge_prog_cols': ['FECHA', 'HORA', 'SENTIDO', 'UPROG'],
-            'merge_prc_cols': ['FECHA', 'HORA', 'SENTIDO', 'UPROG'],
+            #DST separa las horas 3a y 3b del dia de 25 horas (programas y precios de restricciones son del i90, los dos tienen HORA y DST)
+            'merge_prog_cols': ['FECHA', 'HORA', 'DST', 'SENTIDO', 'UPROG'],
+            'merge_prc_cols': ['FECHA', 'HORA', 'DST', 'SENTIDO', 'UPROG'],
             'filter_func': None,
-            'additional_filter': None
+            'additional_filter': None,
+            #equivalentes SQL usados por get_ganancias_sql
+            'filter_sql': None,
+            'additional_filter_sql': None
         }
 
     def get_programas(self, start_date: str, end_date: str, lista_uprog: List[str], sentido: List[str]) -> pd.DataFrame:
@@ -1039,8 +1268,7 @@ class Restricciones(Indicador):
         return df 
 
     def get_lista_up(self, start_date: str, end_date: str) -> List[str]:
-        df = self.get_programas(start_date, end_date, None, ["Subir", "Bajar"])
-        return df["UPROG"].unique().tolist()
+        return super().get_lista_up(start_date, end_date)
 
 class Desvios(Indicador):
     def __init__(self):
@@ -1052,8 +1280,11 @@ class Desvios(Indicador):
             'prc_func': lambda start_date, end_date, sentido: self.get_precios(start_date, end_date, sentido),
             'merge_prog_cols': ['FECHA', 'HORA', 'SENTIDO'],
             'merge_prc_cols': ['FECHA', 'PERIODO', 'SENTIDO'],
-            'filter_func': lambda df: df[~df['HORA'].isin(['3a', '3b'])],
-            'additional_filter': lambda df: df[df['REDESPACHO'] == 'DESV']
+            'filter_func': lambda df: df[df['DST'] == 0], #excluir las horas 3a y 3b del dia de 25 horas
+            'additional_filter': lambda df: df[df['REDESPACHO'] == 'DESV'],
+            #equivalentes SQL usados por get_ganancias_sql
+            'filter_sql': "prog.DST = 0",
+            'additional_filter_sql': "REDESPACHO = 'DESV'"
         }
 
 
@@ -1088,8 +1319,7 @@ class Desvios(Indicador):
         return df 
 
     def get_lista_up(self, start_date: str, end_date: str) -> List[str]:
-        df = self.get_programas(start_date, end_date, None, ["Subir", "Bajar"])
-        return df["UPROG"].unique().tolist()
+        return super().get_lista_up(start_date, end_date)
 
 class Diario(Indicador):
     def __init__(self):
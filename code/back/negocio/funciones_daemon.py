@@ -1,6 +1,9 @@
 from utilidades.i90zip import i90ZIP
 from utilidades.esios import ESIOS
 from utilidades.omie import OMIE
+import utilidades.parquet_dataset as parquet_dataset
+import utilidades.descargas as descargas
+from negocio.catalogo_procesados import CatalogoProcesados
 import datetime
 import pandas as pd
 from datetime import datetime
@@ -10,8 +13,13 @@ import time
 import logging
 import os
 import re
-from typing import List, Dict
+import gzip
+from typing import List, Dict, Tuple, Iterable
 from zipfile import BadZipFile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+import threading
+import contextlib
 import pretty_errors
 import config
 import json
@@ -87,73 +95,319 @@ def descargador_ultimo_i90(fichero_config, carpeta_raw:str , start_date:str, n:i
     #    logging.error(f"An unexpected error occurred: {str(e)}") 
     #    logging.exception("Full traceback:")
 
-def download_prices(market_key: str, download_function: callable, base_path: str, dl_dates_dct: Dict[str, List[str]]) -> None:
-    """Download prices for a given market.
+#mercados de precios: funcion de descarga (metodo de ESIOS/OMIE) y nombre del fichero raw de cada mercado
+PRICE_MARKETS = {
+    "diario": ("download_precio_diario", "precios_diario"),
+    "intradiario": ("download_precio_intradiario", "precios_intradiario"),
+    "rr": ("download_precios_balance_rr", "precios_rr"),
+    "afrr": ("download_precios_secundaria", "precios_secundaria"),
+    "mfrr": ("download_precios_terciaria_media_ponderada", "precios_terciaria"),
+}
+
+#peticiones simultaneas como maximo a cada servidor en el modo concurrente
+MAX_DESCARGAS_HOST = {
+    "api.esios.ree.es": 4,
+    "www.omie.es": 4,
+}
+MAX_DESCARGAS_HOST_DEFECTO = 2 #para servidores que no estan en MAX_DESCARGAS_HOST
+
+#mercados de ESIOS: el endpoint /indicators/{id} admite cualquier start_date/end_date, se descarga una ventana de dias por peticion
+RANGE_MARKETS = ["rr", "afrr", "mfrr"]
+MAX_DIAS_VENTANA = 31 #dias como maximo por peticion a ESIOS
+
+def raw_price_file_path(base_path: str, market_key: str, date: str) -> str:
+    """Get the path of the raw CSV of the prices of a market for a date, creating its folder if needed.
+
+    Args:
+        base_path (str): The base directory path for saving files.
+        market_key (str): The key representing the market type (e.g., "diario").
+        date (str): The date in "YYYY-MM-DD" format.
+
+    Returns:
+        str: The path of the file. i.e. "base_path/OMIE/Rr/2024/2024-10-15_precios_rr.csv"
+    """
+    if market_key not in PRICE_MARKETS:
+        raise ValueError("Unsupported market key")
+
+    year = datetime.strptime(date, "%Y-%m-%d").strftime("%Y") #extracting year ie.2022
+    folder_path = os.path.join(base_path, "OMIE", market_key.capitalize(), year) #market key folders  have to be capitalized
+
+    #create folder if it doesnt exist
+    create_new_folder(folder_path)
+
+    return os.path.join(folder_path, f'{date}_{PRICE_MARKETS[market_key][1]}.csv')
+
+def curated_price_dataset_path(carpeta_curated: str, market_key: str, year: str) -> str:
+    """Get the curated dataset of the prices of a market for a year.
+
+    Args:
+        carpeta_curated (str): The curated data folder. i.e. config.carpeta_curated
+        market_key (str): The key representing the market type (e.g., "diario").
+        year (str): The year. i.e. "2024"
+
+    Returns:
+        str: The path of the dataset. i.e. "carpeta_curated/OMIE/Rr/2024/precios_rr"
+    """
+    return os.path.join(carpeta_curated, "OMIE", market_key.capitalize(), str(year), PRICE_MARKETS[market_key][1])
+
+def ventanas_descarga(market_key: str, dates: List[str], max_dias: int = MAX_DIAS_VENTANA) -> List[List[str]]:
+    """Group the dates to download of a market into the windows requested at once.
+
+    The markets of RANGE_MARKETS are grouped in runs of consecutive days of at most max_dias days,
+    the rest of markets (OMIE publishes one file per day) are downloaded date by date.
+
+    Args:
+        market_key (str): The key representing the market type (e.g., "rr").
+        dates (List[str]): The dates to download in "YYYY-MM-DD" format.
+        max_dias (int): The maximum days of a window. Defaults to MAX_DIAS_VENTANA.
+
+    Returns:
+        List[List[str]]: The dates of each window, sorted. i.e. [["2024-10-01", "2024-10-02"], ["2024-10-05"]]
+    """
+    dates = sorted(set(dates))
+    if market_key not in RANGE_MARKETS:
+        return [[date] for date in dates]
+
+    ventanas = []
+    for date in dates:
+        ultima = ventanas[-1][-1] if ventanas else None
+        consecutiva = ultima is not None and datetime.strptime(date, "%Y-%m-%d") - datetime.strptime(ultima, "%Y-%m-%d") == timedelta(days=1)
+        if consecutiva and len(ventanas[-1]) < max_dias:
+            ventanas[-1].append(date)
+        else:
+            ventanas.append([date])
+    return ventanas
+
+def save_prices_csv(prices: pd.DataFrame, file_path: str) -> bool:
+    """Save the downloaded prices of a date to its raw CSV, only if the content has changed.
+
+    An unchanged file keeps its modification time, so re-running the download does not make
+    the curated process read it again (see descargas.write_if_changed).
+
+    Args:
+        prices (pd.DataFrame): The prices of the date.
+        file_path (str): The path of the raw CSV.
+
+    Returns:
+        bool: True if the file was written, False if it already had the same content.
+    """
+    escrito = descargas.write_if_changed(file_path, prices.to_csv(index = False).encode("utf-8"))
+    if escrito:
+        print(f"File saved to '{file_path}'")
+    else:
+        print(f"File '{file_path}' has not changed")
+    return escrito
+
+def save_prices_curated(prices: pd.DataFrame, market_key: str, base_path: str, date: str, carpeta_curated: str,
+                        catalogo: CatalogoProcesados = None) -> int:
+    """Write the downloaded prices of a date straight to the curated dataset, archiving the raw payload compressed.
+
+    The prices are archived in "base_path/OMIE/<Market>/<year>/<date>_precios_<market>.csv.gz" (the raw CSV compressed,
+    rewritten only if the content changes) and written to the curated dataset of the market and year without the
+    round-trip through the raw CSV and process_raw_files. The archive is recorded in the catalogue of processed files
+    with its hash, so unchanged prices are not written again and process_raw_files skips it.
+
+    Args:
+        prices (pd.DataFrame): The prices of the date.
+        market_key (str): The key representing the market type (e.g., "diario").
+        base_path (str): The base directory path for the raw archive.
+        date (str): The date of the prices in "YYYY-MM-DD" format.
+        carpeta_curated (str): The curated data folder. i.e. config.carpeta_curated
+        catalogo (CatalogoProcesados): Optional. The catalogue of processed files. Without it the prices are always written.
+
+    Returns:
+        int: The number of rows written to curated (0 if the prices have not changed).
+    """
+    archive_path = raw_price_file_path(base_path, market_key, date) + ".gz"
+    data = gzip.compress(prices.to_csv(index = False).encode("utf-8"), mtime=0) #sin fecha en la cabecera gzip: mismos precios, mismos bytes
+    descargas.write_if_changed(archive_path, data)
+
+    sha256 = descargas.sha256_bytes(data)
+    if catalogo is not None and catalogo.is_processed(os.path.basename(archive_path), sha256):
+        print(f"Prices of {market_key} for {date} have not changed")
+        return 0
+
+    year = date[:4]
+    dataset_path = curated_price_dataset_path(carpeta_curated, market_key, year)
+    n_rows = parquet_dataset.write_fragments(prices, dataset_path, parquet_dataset.PRICE_DEDUP_KEY)
+    print(f"Written {n_rows} rows of {market_key} prices for {date} to '{dataset_path}'")
+
+    if catalogo is not None:
+        catalogo.registrar_fichero(archive_path, market_key, year, rows=n_rows, sha256=sha256)
+    return n_rows
+
+def save_prices(prices: pd.DataFrame, market_key: str, base_path: str, date: str, carpeta_curated: str = None,
+                catalogo: CatalogoProcesados = None) -> None:
+    """Save the downloaded prices of a date to the raw CSV or, if carpeta_curated is given, straight to curated (see save_prices_curated).
+
+    Args:
+        prices (pd.DataFrame): The prices of the date.
+        market_key (str): The key representing the market type (e.g., "diario").
+        base_path (str): The base directory path for saving files.
+        date (str): The date of the prices in "YYYY-MM-DD" format.
+        carpeta_curated (str): Optional. The curated data folder of the direct mode.
+        catalogo (CatalogoProcesados): Optional. The catalogue of processed files of the direct mode.
+    """
+    if carpeta_curated is None:
+        save_prices_csv(prices, raw_price_file_path(base_path, market_key, date))
+    else:
+        save_prices_curated(prices, market_key, base_path, date, carpeta_curated, catalogo)
+
+def download_prices_date(market_key: str, download_function: callable, base_path: str, date: str, carpeta_curated: str = None,
+                         catalogo: CatalogoProcesados = None) -> bool:
+    """Download the prices of a market for a single date and save them to the raw folder.
 
-    This function downloads market prices for specific dates, saves them to
-    corresponding directories based on the market type, and updates the list
-    of dates to be downloaded. It constructs directory paths based on the
-    market type and year, ensuring the directory exists before saving files.
-    Errors are logged if any operation fails.
+    The file is saved to "base_path/OMIE/<Market>/<year>/<date>_precios_<market>.csv". Errors are
+    logged and not raised so that one failed date does not stop the rest of the downloads.
 
     Args:
         market_key (str): The key representing the market type (e.g., "diario").
         download_function (callable): Function used to download prices for the specified market.
         base_path (str): The base directory path for saving files.
-        dl_dates (dict): Dictionary containing dates to be downloaded for each market.
+        date (str): The date to download in "YYYY-MM-DD" format.
+        carpeta_curated (str): Optional. If given, the prices are written straight to curated (see save_prices_curated).
+        catalogo (CatalogoProcesados): Optional. The catalogue of processed files of the direct mode.
 
+    Returns:
+        bool: True if the file was saved, False otherwise.
     """
+    try:
+        # Download prices using the specified function
+        prices = download_function(date, date)
 
-    for date in dl_dates_dct[market_key]: #dl_dates_dct.get(market_key, []):
-        try:
+        if prices.empty: #check if prices is a DF or if its empty
+            logging.error(f"No data available for {market_key} for {date}.")
+            return False
 
-            # Extract year from the start date
+        save_prices(prices, market_key, base_path, date, carpeta_curated, catalogo)
+        return True
 
-            date_obj = datetime.strptime(date, "%Y-%m-%d")#convert date string to date object
-            year = date_obj.strftime("%Y") #extracting year ie.2022
-            month = date_obj.strftime("%m") #extracting month as two digit number ie. 04
+    except Exception as e:
+        logging.error(f"Failed to download prices for {market_key} for {date}: {str(e)}")
+        logging.exception("Full traceback:")
+        return False
 
+def download_prices_window(market_key: str, download_function: callable, base_path: str, dates: List[str], carpeta_curated: str = None,
+                           catalogo: CatalogoProcesados = None) -> int:
+    """Download the prices of a market for a window of consecutive dates with a single call and save one raw CSV per date.
 
-            # Define the folder path and file name based on the market key
-            folder_path = os.path.join(base_path, "OMIE", market_key.capitalize(), year) #market key folders  have to be capitalized
-            if market_key == "diario":
-                file_name = f'{date}_precios_diario.csv'
-            elif market_key == "intradiario":
-                file_name = f'{date}_precios_intradiario.csv'
-            elif market_key == "rr":
-                file_name = f'{date}_precios_rr.csv'
-            elif market_key == "afrr":
-                file_name = f'{date}_precios_secundaria.csv'
-            elif market_key == "mfrr":
-                file_name = f'{date}_precios_terciaria.csv'
-            else:
-                raise ValueError("Unsupported market key")
+    The download function is called once with the first and last date of the window and the result is split
+    by FECHA into the same files download_prices_date would save (rows of dates outside the window are discarded).
+    A window of a single date is downloaded with download_prices_date.
 
-            #create folder if it doesnt exist
-            create_new_folder(folder_path)
+    Args:
+        market_key (str): The key representing the market type (e.g., "rr").
+        download_function (callable): Function used to download prices for the specified market.
+        base_path (str): The base directory path for saving files.
+        dates (List[str]): The sorted consecutive dates of the window in "YYYY-MM-DD" format (see ventanas_descarga).
+        carpeta_curated (str): Optional. If given, the prices are written straight to curated (see save_prices_curated).
+        catalogo (CatalogoProcesados): Optional. The catalogue of processed files of the direct mode.
 
-            # Define the full file path with the file name
-            file_path = os.path.join(folder_path, file_name)
+    Returns:
+        int: The number of files saved.
+    """
+    if len(dates) == 1:
+        return int(download_prices_date(market_key, download_function, base_path, dates[0], carpeta_curated, catalogo))
 
-            # Download prices using the specified function
-            prices = download_function(date, date)
+    try:
+        prices = download_function(dates[0], dates[-1])
+        prices_fecha = dict(tuple(prices.groupby("FECHA", sort=False))) if not prices.empty else {}
 
-            if prices.empty: #check if prices is a DF or if its empty
+        n_files = 0
+        for date in dates:
+            prices_date = prices_fecha.get(date)
+            if prices_date is None or prices_date.empty:
                 logging.error(f"No data available for {market_key} for {date}.")
+                continue
 
-            else:
-                prices.to_csv(file_path, index = False)
-                print(f"File saved to '{file_path}'")
+            save_prices(prices_date, market_key, base_path, date, carpeta_curated, catalogo)
+            n_files += 1
 
-                #remove date from dowload queue 
-                #dl_dates_dct[market_key].remove(date)
-                print(f"Removed {date} from {market_key} scheduled downloads.")
+        return n_files
 
-        except Exception as e:
-            logging.error(f"Failed to download prices for {market_key} for {date}: {str(e)}")
-            logging.exception("Full traceback:")
+    except Exception as e:
+        logging.error(f"Failed to download prices for {market_key} from {dates[0]} to {dates[-1]}: {str(e)}")
+        logging.exception("Full traceback:")
+        return 0
+
+def download_prices(market_key: str, download_function: callable, base_path: str, dl_dates_dct: Dict[str, List[str]], carpeta_curated: str = None,
+                    catalogo: CatalogoProcesados = None) -> None:
+    """Download prices for a given market.
+
+    This function downloads market prices for specific dates and saves them to corresponding directories
+    based on the market type. ESIOS markets are requested by windows of consecutive dates (see ventanas_descarga
+    and download_prices_window), OMIE markets one date after the other (see download_prices_date).
 
-def descargador_precios(carpeta_raw:str , start_date:str, n:int, list_date:List[str] ) -> None:
+    Args:
+        market_key (str): The key representing the market type (e.g., "diario").
+        download_function (callable): Function used to download prices for the specified market.
+        base_path (str): The base directory path for saving files.
+        dl_dates (dict): Dictionary containing dates to be downloaded for each market.
+        carpeta_curated (str): Optional. If given, the prices are written straight to the curated datasets, archiving the raw
+                               payload as .csv.gz instead of the raw CSV (see save_prices_curated).
+        catalogo (CatalogoProcesados): Optional. The catalogue of processed files of the direct mode.
+
+    """
+
+    for dates in ventanas_descarga(market_key, dl_dates_dct[market_key]): #dl_dates_dct.get(market_key, []):
+        download_prices_window(market_key, download_function, base_path, dates, carpeta_curated, catalogo)
+
+def host_descarga(download_function: callable) -> str:
+    """Get the server a download function requests its data from.
+
+    Args:
+        download_function (callable): A download method of ESIOS or OMIE. i.e. esios.download_precios_secundaria
+
+    Returns:
+        str: The host of the url_base of the instance. i.e. "api.esios.ree.es"
+    """
+    return urlparse(download_function.__self__.url_base).netloc
+
+def download_prices_concurrente(market_functions: Dict[str, callable], base_path: str, dl_dates_dct: Dict[str, List[str]],
+                                max_workers: int = 8, max_descargas_host: Dict[str, int] = None, carpeta_curated: str = None,
+                                catalogo: CatalogoProcesados = None) -> Dict[str, int]:
+    """Download the prices of several markets and dates in parallel.
+
+    Every (market, window of dates) is a task of a thread pool (see ventanas_descarga). The tasks of the same server share a semaphore,
+    so there are never more than max_descargas_host[host] requests to api.esios.ree.es or omie.es at the
+    same time (a task makes its requests one after the other, i.e. the sessions of the intradiario).
+
+    Args:
+        market_functions (dict): The download function of each market. i.e. {"rr": esios.download_precios_balance_rr}
+        base_path (str): The base directory path for saving files.
+        dl_dates_dct (dict): Dictionary containing dates to be downloaded for each market.
+        max_workers (int): The number of downloads running at the same time. Defaults to 8.
+        max_descargas_host (dict): Optional. The maximum simultaneous downloads per host. Defaults to MAX_DESCARGAS_HOST.
+        carpeta_curated (str): Optional. If given, the prices are written straight to curated (see save_prices_curated).
+        catalogo (CatalogoProcesados): Optional. The catalogue of processed files of the direct mode.
+
+    Returns:
+        dict: The number of files saved for each market.
+    """
+    max_descargas_host = MAX_DESCARGAS_HOST if max_descargas_host is None else max_descargas_host
+
+    semaforos = {}
+    for download_function in market_functions.values():
+        host = host_descarga(download_function)
+        if host not in semaforos:
+            semaforos[host] = threading.BoundedSemaphore(max_descargas_host.get(host, MAX_DESCARGAS_HOST_DEFECTO))
+
+    def descargar(market_key: str, dates: List[str]) -> int:
+        download_function = market_functions[market_key]
+        with semaforos[host_descarga(download_function)]:
+            return download_prices_window(market_key, download_function, base_path, dates, carpeta_curated, catalogo)
+
+    descargados = {market_key: 0 for market_key in market_functions}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futuros = {executor.submit(descargar, market_key, dates): market_key
+                   for market_key in market_functions for dates in ventanas_descarga(market_key, dl_dates_dct.get(market_key, []))}
+        for futuro in as_completed(futuros):
+            descargados[futuros[futuro]] += futuro.result()
+
+    return descargados
+
+def descargador_precios(carpeta_raw:str , start_date:str, n:int, list_date:List[str], concurrente: bool = False,
+                        max_workers: int = 8, max_descargas_host: Dict[str, int] = None, directo: bool = False, carpeta_curated: str = None) -> None:
     """Download ESIOS & OMIE prices.
 
     This function sets the start and end dates for downloading prices, appends
@@ -165,6 +419,12 @@ def descargador_precios(carpeta_raw:str , start_date:str, n:int, list_date:List[
     Args:
         carpeta_raw (str): The base directory where raw data should be saved.
         dl_dates (dict): Dictionary containing dct of dates for each market type.
+        concurrente (bool): If True, markets and dates are downloaded in parallel (see download_prices_concurrente).
+        max_workers (int): The number of downloads running at the same time in the concurrent mode. Defaults to 8.
+        max_descargas_host (dict): Optional. The maximum simultaneous downloads per host in the concurrent mode.
+        directo (bool): If True, the prices are written straight to the curated datasets and archived as .csv.gz in carpeta_raw,
+                        instead of the raw CSVs converted later by process_raw_files (see save_prices_curated).
+        carpeta_curated (str): Optional. The curated data folder of the direct mode. Defaults to config.carpeta_curated.
 
     """
 
@@ -187,26 +447,73 @@ def descargador_precios(carpeta_raw:str , start_date:str, n:int, list_date:List[
         esios = ESIOS() # Start ESIOS class
         omie = OMIE() #start OMIE class 
 
-        # Use the download_prices function for each market type
-        logging.info("Retrieving DIARIO prices")
-        download_prices("diario", omie.download_precio_diario, carpeta_raw, dl_dates_dct)
-
-        logging.info("Retrieving INTRADIARIO prices")
-        download_prices("intradiario", omie.download_precio_intradiario, carpeta_raw,dl_dates_dct)
+        market_functions = {}
+        for market_key in market_key_lst:
+            download_function_name = PRICE_MARKETS[market_key][0]
+            market_functions[market_key] = getattr(omie if market_key in ["diario", "intradiario"] else esios, download_function_name)
 
-        logging.info("Retrieving RR prices")
-        download_prices("rr", esios.download_precios_balance_rr, carpeta_raw, dl_dates_dct)
+        catalogo = None
+        if directo:
+            carpeta_curated = carpeta_curated or config.carpeta_curated
+            catalogo = load_catalogo_procesados()
+        else:
+            carpeta_curated = None
 
-        logging.info("Retrieving AFRR prices")
-        download_prices("afrr", esios.download_precios_secundaria, carpeta_raw, dl_dates_dct)
+        with catalogo.lote() if catalogo is not None else contextlib.nullcontext(): #los ficheros archivados se registran en una transaccion al final
+            if concurrente:
+                logging.info(f"Retrieving prices of {market_key_lst} with {max_workers} workers")
+                start = time.perf_counter()
+                descargados = download_prices_concurrente(market_functions, carpeta_raw, dl_dates_dct, max_workers, max_descargas_host, carpeta_curated, catalogo)
+                logging.info(f"Retrieved prices in {time.perf_counter() - start:.1f}s, files saved: {descargados}")
+                return
 
-        logging.info("Retrieving MFRR prices")
-        download_prices("mfrr", esios.download_precios_terciaria_media_ponderada, carpeta_raw, dl_dates_dct)
+            # Use the download_prices function for each market type
+            for market_key in market_key_lst:
+                logging.info(f"Retrieving {market_key.upper()} prices")
+                download_prices(market_key, market_functions[market_key], carpeta_raw, dl_dates_dct, carpeta_curated, catalogo)
 
     except Exception as e:
         logging.error(f"An unexpected error occurred: {str(e)}") 
         logging.exception("Full traceback:")
 
+def ingest_omie_bulk(origen: str, carpeta_curated: str) -> Dict[str, int]:
+    """Ingest a backfill of OMIE price files straight into the curated datasets.
+
+    The TXT files of a folder, or of a zip archive (monthly/annual archives with the daily files, nested zips included),
+    are parsed in a single pass (OMIE.parse_directorio / OMIE.parse_zip) and written with one fragment per date to the
+    same datasets as process_raw_files, i.e. "carpeta_curated/OMIE/Diario/2023/precios_diario/2023-01-01.parquet",
+    without the per-day raw CSV files.
+
+    Args:
+        origen (str): The folder with the TXT files or the path of the zip archive.
+        carpeta_curated (str): The curated data folder. i.e. config.carpeta_curated
+
+    Returns:
+        dict: The number of rows written for each market. i.e. {"diario": 8760, "intradiario": 61320}
+    """
+    omie = OMIE()
+    start = time.perf_counter()
+    if os.path.isdir(origen):
+        precios = omie.parse_directorio(origen)
+    else:
+        precios = omie.parse_zip(origen)
+
+    n_rows = {}
+    for market_key, df in precios.items():
+        n_rows[market_key] = 0
+        if df.empty:
+            logging.warning(f"No {market_key} price files found in {origen}")
+            continue
+
+        years = df["FECHA"].str.slice(0, 4)
+        for year, df_year in df.groupby(years, sort=True):
+            dataset_path = curated_price_dataset_path(carpeta_curated, market_key, year)
+            n_rows[market_key] += parquet_dataset.write_fragments(df_year, dataset_path, parquet_dataset.PRICE_DEDUP_KEY)
+            logging.info(f"Written {len(df_year)} rows of {market_key} prices to parquet dataset: {dataset_path}")
+
+    logging.info(f"Ingested OMIE prices from {origen} in {time.perf_counter() - start:.1f}s: {n_rows}")
+    return n_rows
+
 def create_new_folder (new_folder_path:str) -> None :
     """
     Create a new folder at the specified path if it doesn't already exist.
@@ -216,8 +523,8 @@ def create_new_folder (new_folder_path:str) -> None :
     """
     try:
         if not os.path.exists(new_folder_path):
-            # Attempt to create the new directory
-            os.makedirs(new_folder_path)
+            # Attempt to create the new directory (exist_ok: another download thread may create it at the same time)
+            os.makedirs(new_folder_path, exist_ok=True)
             print(f"Created new folder: {new_folder_path}")
         
         else:
@@ -232,53 +539,38 @@ def create_new_folder (new_folder_path:str) -> None :
         # Catch any other exceptions that were not anticipated
         logging.error(f"An unexpected error occurred: {e}")
 
-def save_csv_to_parquet(parquet_filepath: str, raw_csv_filepath: str) -> bool:
+def save_csv_to_parquet(dataset_path: str, raw_csv_filepath: str) -> bool:
     """
-    Save a CSV file to a Parquet file.
+    Save a CSV file to a date-partitioned Parquet dataset.
+
+    Each date in the CSV is written to its own small fragment inside the dataset directory
+    (i.e. "...\\2024\\precios_rr\\2024-10-15.parquet"), deduplicated on PRICE_DEDUP_KEY,
+    so the cost of the ingest is proportional to the new data only. The data is cast to the curated
+    schema on write (FECHA as DATE, PERIODO/HORA as int16, text columns as categoricals).
 
     Args:
-        parquet_filepath (str): The path where the Parquet file should be saved.
+        dataset_path (str): The path of the dataset directory where the fragments should be saved.
         raw_csv_filepath (str): The path of the raw CSV file that will be saved to parquet.
     """
-    try:
-        # Check if the parquet file already exists
-        if os.path.exists(parquet_filepath):
-            # If it exists, read it to append more data
-            master_df = pd.read_parquet(parquet_filepath)
-            logging.info(f"Existing parquet file '{parquet_filepath}' loaded.")
-
-        else: #if the parquet file does not exist
-            #start with an empty DataFrame
-            master_df = pd.DataFrame()
-            logging.info("Parquet file does not exist, starting with an empty DataFrame.")
-        
-        try:
-            # Read the CSV file into a DataFrame
-            df = pd.read_csv(raw_csv_filepath)
+    filename = os.path.basename(raw_csv_filepath) #getting filename
 
-            # Append the CSV DataFrame to the master DataFrame
-            master_df = pd.concat([master_df, df], ignore_index=True)
-            master_df = master_df.drop_duplicates()
+    try:
+        # Read the CSV file into a DataFrame
+        df = pd.read_csv(raw_csv_filepath)
 
-            filename = os.path.basename(raw_csv_filepath) #getting filename
-            logging.info(f"Processed CSV file: {filename}")
+        # Write one fragment per date, only the fragments of the dates in the CSV are touched
+        n_rows = parquet_dataset.write_fragments(df, dataset_path, parquet_dataset.PRICE_DEDUP_KEY)
+        logging.info(f"Processed CSV file: {filename}")
+        logging.info(f"Successfully written {n_rows} rows to parquet dataset: {dataset_path}")
+        return True
 
-            # Write the combined DataFrame back to the Parquet file
-            master_df.to_parquet(parquet_filepath, engine='pyarrow')
-            logging.info(f"Successfully updated parquet file: {parquet_filepath}")
-            return True
+    except pd.errors.EmptyDataError:
+        logging.warning(f"Skipping empty CSV file: {filename}")
+        return False
 
-        except pd.errors.EmptyDataError:
-            logging.warning(f"Skipping empty CSV file: {filename}")
-            return False
-        
-        except OSError as e:
-            logging.error(f"OS error when writing Parquet file {parquet_filepath}: {str(e)}")
-            return False
-        
-        except pd.errors.ParserError as e:
-            logging.error(f"Error parsing CSV file {raw_csv_filepath}: {str(e)}")
-            return False
+    except pd.errors.ParserError as e:
+        logging.error(f"Error parsing CSV file {raw_csv_filepath}: {str(e)}")
+        return False
 
     except FileNotFoundError:
         logging.error(f"File {filename} not found: {raw_csv_filepath}")
@@ -288,11 +580,15 @@ def save_csv_to_parquet(parquet_filepath: str, raw_csv_filepath: str) -> bool:
         logging.error(f"Permission denied when accessing file: {raw_csv_filepath}")
         return False
 
+    except OSError as e:
+        logging.error(f"OS error when writing Parquet dataset {dataset_path}: {str(e)}")
+        return False
+
     except Exception as e:
         logging.error(f"An unexpected error occurred during while saving csv to parquet: {str(e)}")
         return False
 
-def save_zip_to_parquet(year_path_curated:str, year_path_raw: str, filename: str)-> bool:
+def save_zip_to_parquet(year_path_curated:str, year_path_raw: str, filename: str, n_procesos: int = 1)-> bool:
     """
     Save a zip file to a Parquet file.
 
@@ -300,6 +596,7 @@ def save_zip_to_parquet(year_path_curated:str, year_path_raw: str, filename: str
         year_path_curated (str): The path where the Parquet file should be saved.
         year_path_raw (str): The path of the raw zip file that will be saved to parquet.
         filename (str): The name of the zip file.
+        n_procesos (int): Optional. The worker processes that parse the sheets of the workbook (i90ZIP n_procesos). Defaults to 1.
     """
     #fichero_config = r"C:\Users\joaquin.costa\Escritorio\UP Tacker\main\config.yml"
 
@@ -308,7 +605,7 @@ def save_zip_to_parquet(year_path_curated:str, year_path_raw: str, filename: str
             raise ValueError("Filename cannot be empty or None")
 
         try:
-            obj = i90ZIP(config.fichero_config, year_path_raw)
+            obj = i90ZIP(config.fichero_config, year_path_raw, n_procesos=n_procesos)
             #obj = i90ZIP(fichero_config, year_path_raw) #para pruebas en local
 
         except Exception as e:
@@ -318,7 +615,7 @@ def save_zip_to_parquet(year_path_curated:str, year_path_raw: str, filename: str
         else:
             print("Succesfully created i90 object")
             try:
-                files = [filename]  # put filename in a list
+                files = [os.path.basename(filename)]  # put filename in a list (the zip is read from year_path_raw and the temporary files are written to year_path_curated)
                 obj.generar_ficheros(files, year_path_curated, year_path_raw, lista_uprog=None)
                 logging.info(f"Successfully processed zip file: {filename}")
                 return True
@@ -342,35 +639,23 @@ def save_zip_to_parquet(year_path_curated:str, year_path_raw: str, filename: str
         logging.error(f"Unexpected error occurred during while saving zip to parquet: {str(e)}")
         return False
     
-def load_json_processed_files()-> dict:
+_catalogo_procesados = None #catalogo compartido por los procesos del daemon
+_catalogo_lock = threading.Lock()
+
+def load_catalogo_procesados() -> CatalogoProcesados:
     """
-    Load the processed files JSON.
+    Load the catalogue of processed files (created on first use, see daemon.setup_catalogo_procesados for the migration of processed_files.json).
 
     Returns:
-        dict: The processed files JSON.
+        CatalogoProcesados: The catalogue of the daemon.
     """
-
-    try:
-        processed_files_json_path = config.processed_files_log['filedir'] + "\\" + config.processed_files_log['filename']  # getting the processed files json path from config.py
-        #processed_files_json_path = "C:\\Users\\joaquin.costa\\Escritorio\\UP Tacker\\daemon logs\\processed_files.json" #pruebas en local
-
-        if os.path.exists(processed_files_json_path): #check if processed files json exists
-            with open(processed_files_json_path, 'r') as f: #open processed files json
-                logging.info(f"Processed files log found at {processed_files_json_path}")
-                processed_files_json = json.load(f)#load processed files json
-                return processed_files_json
-        else:
-            raise FileNotFoundError(f"Processed files log not found at {processed_files_json_path}")
-        
-    except FileNotFoundError as e:
-        logging.error(f"Failed to load JSON: {str(e)}")
-        return {}
-    except json.JSONDecodeError as e:
-        logging.error(f"Error decoding JSON: {str(e)}")
-        return {}
-    except Exception as e:
-        logging.error(f"Unexpected error: {str(e)}")
-        return {}
+    global _catalogo_procesados
+    with _catalogo_lock:
+        if _catalogo_procesados is None:
+            catalogo_path = config.processed_files_log['filedir'] + "\\" + config.processed_files_log['catalogo'] # getting the catalogue path from config.py
+            _catalogo_procesados = CatalogoProcesados(catalogo_path)
+            logging.info(f"Processed files catalogue loaded from {catalogo_path}")
+    return _catalogo_procesados
 
 def extract_year_from_filename(filename: str) -> str:
     """
@@ -441,101 +726,195 @@ def extract_indicator_from_filename(filename: str) -> str:
         logging.error(f"Error extracting indicator from filename '{filename}': {str(e)}")
         return None
 
-def check_is_processed(filename: str, json_processed_files: dict) -> bool:
+def check_is_processed(filename: str, catalogo: CatalogoProcesados, sha256: str = None) -> bool:
     """
     Check if a file has been processed.
 
     Args:
-        file (str): The filename to check.
-        processed_files_json (dict): The JSON containing information about processed files.
+        filename (str): The filename to check.
+        catalogo (CatalogoProcesados): The catalogue of processed files.
+        sha256 (str): Optional. The current hash of the file, a file whose content changed since it was processed needs to be processed again.
 
     Returns:
         bool: True if the file has been processed, False otherwise.
     """
-    # Extract year and indicator from the filename
-    year = extract_year_from_filename(filename)
-    indicador = extract_indicator_from_filename(filename)
-
-    if (year or indicador) is None:
-        return False
-    else:
-        files_for_year = json_processed_files.get(indicador, {}).get(year)
-        print(f"files_for_year: {files_for_year}")
-    
-    if files_for_year is None:
-        #print(f"No files found for {year} under {indicador} that have been processed")
-        return False
-    elif not files_for_year:
-        #print(f"List is empty for {year} under {indicador} that have been processed")
-        return False
-    else:
-        # Check if the file is in the list of processed files for its year and indicator
-        is_processed = filename in files_for_year
+    is_processed = catalogo.is_processed(filename, sha256)
 
     if is_processed:
-        print(f"File {filename} ALREADY processed")
         logging.info(f"File {filename} ALREADY processed")
     else:
-        print(f"File {filename} still NEEDS to be processed")
         logging.info(f"File {filename} still NEEDS to be processed")
 
-    # Explicitly return the boolean result
     return is_processed
 
-def update_json_processed_files(json_processed_files: dict, filename: str, year: int, indicador: str) -> bool:
+def update_processed_files(catalogo: CatalogoProcesados, filepath: str, year: int = None, indicador: str = None, rows: int = None, sha256: str = None) -> bool:
     """
-    Update the processed files JSON with a new processed file. Writes the new processed file to the "processed files" JSON file.
+    Record a processed file in the catalogue with its size and content hash. The record is written with the next batch of
+    the catalogue (CatalogoProcesados.guardar).
 
     Args:
-        json_processed_files (dict): The current state of processed files.
-        filename (str): The name of the processed file.
-        year (int): The year to update in the processed files.
-        indicador (str): The category/indicator to update (e.g., 'i90', 'diario').
+        catalogo (CatalogoProcesados): The catalogue of processed files.
+        filepath (str): The path of the processed raw file.
+        year (int): Optional. The year of the file, extracted from the filename if not given.
+        indicador (str): Optional. The category/indicator of the file (e.g., 'i90', 'diario'), extracted from the filename if not given.
+        rows (int): Optional. The rows written to curated.
+        sha256 (str): Optional. The hash of the content that was processed, computed from the file if not given.
 
     Returns:
-        None
+        bool: True if the file was recorded, False otherwise.
     """
-    try:
-        json_filepath = config.processed_files_log['filedir'] + "\\" + config.processed_files_log['filename']
-        
-        # Read existing JSON file if it exists
-        if os.path.exists(json_filepath):
-            with open(json_filepath, 'r') as f:
-                existing_data = json.load(f)
-                #no need to specify else since the json filepath will always be created to start daemon
-
-        # Update the data
-        if year and indicador: #handle in case year or indicador are None
-            if year not in existing_data[indicador]:
-                existing_data[indicador][year] = []
-            if filename not in existing_data[indicador][year]:
-                existing_data[indicador][year].append(filename)
-        else:
-            logging.warning(f"Year or indicador are None: {year}, {indicador}")
-            return False
-
-        # Write the updated data back to the file
-        with open(json_filepath, 'w') as f:
-            json.dump(existing_data, f, indent=2)
+    filename = os.path.basename(filepath)
+    year = year or extract_year_from_filename(filename)
+    indicador = indicador or extract_indicator_from_filename(filename)
+    if not (year and indicador): #handle in case year or indicador are None
+        logging.warning(f"Year or indicador are None: {year}, {indicador}")
+        return False
 
-        logging.info(f"Updated processed files log with {filename} for {indicador} in {year}.")
+    try:
+        catalogo.registrar_fichero(filepath, indicador, year, rows=rows, sha256=sha256)
+        logging.info(f"Recorded {filename} for {indicador} in {year} in the processed files catalogue.")
         return True
 
     except Exception as e:
-        logging.error(f"Error updating processed files log: {str(e)}")
+        logging.error(f"Error updating processed files catalogue: {str(e)}")
         return False
 
-def process_raw_files(fichero_config, carpeta_raw_dir_lst:List[str] , start_date:str, n:int, list_date:List[str]) -> None: 
+PATRON_FECHA_RAW = re.compile(r"(\d{4})-?(\d{2})-?(\d{2})") #2024-10-15_precios_rr.csv, I90DIA_20241015.zip
+EXTENSIONES_RAW = (".csv", ".csv.gz", ".zip") #ficheros que se procesan (no _descargas.json, .part, .tmp ni los _temp.parquet de los i90)
+
+def indexar_ficheros_raw(carpeta_raw_dir_lst: List[str], years: Iterable) -> Dict[Tuple[str, str], List[str]]:
+    """
+    Index the raw files of some years in a single listing of each folder.
+
+    Args:
+        carpeta_raw_dir_lst (List[str]): The raw folders of the indicadores. i.e. [raw_i90, raw_diario, ...] in config.py
+        years (Iterable): The years to index. i.e. {"2024"}
+
+    Returns:
+        Dict[Tuple[str, str], List[str]]: The sorted paths of the files of each (indicador, date).
+                                          i.e. {("rr", "2024-10-15"): ["...\\raw\\OMIE\\Rr\\2024\\2024-10-15_precios_rr.csv"]}
+    """
+    indice = {}
+    for carpeta_raw in carpeta_raw_dir_lst:
+        for year in sorted({str(year) for year in years}):
+            year_path_raw = os.path.join(carpeta_raw, year)
+            if not os.path.isdir(year_path_raw):
+                continue
+
+            with os.scandir(year_path_raw) as entries:
+                for entry in entries:
+                    if not entry.name.endswith(EXTENSIONES_RAW) or not entry.is_file():
+                        continue
+                    match = PATRON_FECHA_RAW.search(entry.name)
+                    indicador = extract_indicator_from_filename(entry.name)
+                    if match is None or indicador is None:
+                        continue
+                    indice.setdefault((indicador, "-".join(match.groups())), []).append(entry.path)
+
+    for files in indice.values():
+        files.sort()
+    return indice
+
+def destino_curated(raw_filepath: str) -> str:
+    """
+    Get the curated target written by the conversion of a raw file. Files with the same target must be converted one after another.
+
+    Args:
+        raw_filepath (str): The path of the raw file.
+
+    Returns:
+        str: The price dataset of a CSV (i.e. "...\\curated\\OMIE\\Rr\\2024\\precios_rr") or the curated year folder of an i90 zip
+             (i.e. "...\\curated\\ESIOS\\i90\\2024", every zip of the year is merged into the same PROGRAMAS, P48... files).
+    """
+    year_path_curated = os.path.dirname(raw_filepath).replace("raw", "curated")
+    if raw_filepath.endswith((".csv", ".csv.gz")):
+        price_filename = re.sub(r"\d{4}-\d{2}-\d{2}_(.*?)\.csv(\.gz)?$", r"\1", os.path.basename(raw_filepath)) #remove date from filename ex: 2023-01-01_precios_secundaria.csv -> precios_secundaria
+        return os.path.join(year_path_curated, price_filename) #ex: ...\\2023\\precios_secundaria (one fragment per day inside)
+    return year_path_curated
+
+def process_raw_file(file: str, indicador: str, catalogo: CatalogoProcesados, n_procesos_i90: int = 1) -> str:
+    """
+    Convert a raw file to its curated target, unless it is already in the catalogue with the same content.
+
+    Args:
+        file (str): The path of the raw file. i.e. "...\\raw\\OMIE\\Rr\\2024\\2024-10-15_precios_rr.csv"
+        indicador (str): The indicador of the file. i.e. "rr"
+        catalogo (CatalogoProcesados): The catalogue of processed files.
+        n_procesos_i90 (int): Optional. The worker processes that parse an i90 zip (see save_zip_to_parquet). Defaults to 1.
+
+    Returns:
+        str: "procesados", "omitidos" (already curated) or "errores".
+    """
+    print(file)
+    year_path_raw = os.path.dirname(file)
+
+    conversion_function = save_csv_to_parquet if file.endswith((".csv", ".csv.gz")) else save_zip_to_parquet if file.endswith(".zip") else None
+    if conversion_function is None or not os.path.exists(file):
+        return "errores"
+
+    sha256 = descargas.sha256_file(file)
+    if check_is_processed(os.path.basename(file), catalogo, sha256): #mismo nombre y contenido que la ultima vez
+        return "omitidos"
+
+    year_path_curated = year_path_raw.replace("raw", "curated")
+    create_new_folder(year_path_curated)
+
+    if file.endswith((".csv", ".csv.gz")): #read_csv descomprime los .csv.gz del modo directo
+        dataset_path = destino_curated(file)
+        print(f"Parquet dataset: {dataset_path}")
+        conversion_successful = conversion_function(dataset_path, file)
+    else:  
+        conversion_successful = conversion_function(year_path_curated, year_path_raw, os.path.basename(file), n_procesos_i90)
+
+    if conversion_successful:
+        update_processed_files(catalogo, file, os.path.basename(year_path_raw), indicador, sha256=sha256)
+        return "procesados"
+    return "errores"
+
+def process_raw_files_destino(ficheros: List[Tuple[str, str]], catalogo: CatalogoProcesados, n_procesos_i90: int = 1) -> Tuple[Dict[str, int], float]:
+    """
+    Convert, one after another, the raw files of a curated target (see destino_curated).
+
+    Args:
+        ficheros (List[Tuple[str, str]]): The (path, indicador) of the raw files, in processing order.
+        catalogo (CatalogoProcesados): The catalogue of processed files.
+        n_procesos_i90 (int): Optional. The worker processes that parse an i90 zip. Defaults to 1.
+
+    Returns:
+        Tuple[Dict[str, int], float]: The number of files processed, skipped and failed, and the seconds it took.
+    """
+    start = time.perf_counter()
+    resumen = {"procesados": 0, "omitidos": 0, "errores": 0}
+    for file, indicador in ficheros:
+        resumen[process_raw_file(file, indicador, catalogo, n_procesos_i90)] += 1
+    return resumen, time.perf_counter() - start
+
+def process_raw_files(fichero_config, carpeta_raw_dir_lst:List[str] , start_date:str, n:int, list_date:List[str],
+                      catalogo: CatalogoProcesados = None, max_workers: int = 1, n_procesos_i90: int = 1) -> Dict[str, int]: 
     """
     Process raw files for a given indicator.
 
+    Files already in the catalogue of processed files with the same content (name and hash) are skipped, so re-runs and
+    backfills only convert the new or changed raw files.
+
+    The files are grouped by curated target (the price dataset of an indicador and year, or the i90 folder of a year, see
+    destino_curated). Targets are independent and, with max_workers > 1, are processed in parallel by a thread pool, while
+    the files of a target are converted one after another so two threads never write the same curated file.
+
     Args:
         indicator_dir_raw (str): The path to the raw files for a given indicator.
                                  Example: "C:/Users/username/project/data/raw/ESIOS/i90"
+        catalogo (CatalogoProcesados): Optional. The catalogue of processed files. Defaults to load_catalogo_procesados().
+        max_workers (int): Optional. The curated targets processed at the same time. Defaults to 1 (sequential).
+        n_procesos_i90 (int): Optional. The worker processes that parse the sheets of each i90 workbook (i90ZIP n_procesos). Defaults to 1 (sequential).
 
     Returns:
-        None
+        Dict[str, int]: The number of files processed, skipped (already curated) and failed. i.e. {"procesados": 6, "omitidos": 54, "errores": 0}
     """    
+    catalogo = catalogo or load_catalogo_procesados()
+    resumen = {"procesados": 0, "omitidos": 0, "errores": 0}
+    start = time.perf_counter()
+
     # Fechas que vamos a procesar
     if list_date == None:
         list_date = []
@@ -547,41 +926,43 @@ def process_raw_files(fichero_config, carpeta_raw_dir_lst:List[str] , start_date
             current_date = datetime.strptime(start_date, "%Y-%m-%d") - timedelta(days=i) - timedelta(days=90)
             list_date.append(current_date.strftime("%Y-%m-%d"))  
 
-    # Buscamos los ficheros de esas fechas
-    for date in list_date:        
-        year = datetime.strptime(date, "%Y-%m-%d").year
-        for carpeta_raw in carpeta_raw_dir_lst:
-            year_path_raw = os.path.join(carpeta_raw, str(year))    
-
-            patron1 = datetime.strptime(date, "%Y-%m-%d").strftime("%Y%m%d")
-            patron2 = datetime.strptime(date, "%Y-%m-%d").strftime("%Y-%m-%d")
-
-            archivos = glob.glob(year_path_raw + "/*")
-            archivos_filtrados = [archivo for archivo in archivos if any(glob.fnmatch.fnmatch(archivo, f"*{patron}*") for patron in [patron1, patron2])]
-
-            for file in archivos_filtrados:                
-                print(file)
-
-                conversion_function = save_csv_to_parquet if file.endswith(".csv") else save_zip_to_parquet if file.endswith(".zip") else None
-                full_filepath_raw = os.path.join(year_path_raw, file)
-
-                if os.path.exists(full_filepath_raw):
-
-                    year_path_curated = year_path_raw.replace("raw", "curated")
-                    create_new_folder(year_path_curated)
-
-                    if file.endswith(".csv"):
-                        price_filename = re.sub(r"\d{4}-\d{2}-\d{2}_(.*?)\.csv$", r"\1", file) #remove date from filename ex: 2023-01-01_precios_secundaria.csv -> precios_secundaria
-                        parquet_filename = price_filename + ".parquet" #ex: precios_secundaria.parquet
-                        
-                        parquet_filepath = os.path.join(year_path_curated, os.path.basename(parquet_filename))
-                        print(f"Parquet filepath: {parquet_filepath}")
-
-                        conversion_successful = conversion_function(parquet_filepath, full_filepath_raw)                        
-                    else:  
-                        conversion_successful = conversion_function(year_path_curated, year_path_raw, file)
-                        pass
-                        
-
-            
+    # Buscamos los ficheros de esas fechas, con un solo listado de cada carpeta raw y año
+    list_date = list(dict.fromkeys(list_date))
+    indice = indexar_ficheros_raw(carpeta_raw_dir_lst, {date[:4] for date in list_date})
+    indicadores = list(dict.fromkeys(indicador for indicador, _ in indice)) #en el orden de carpeta_raw_dir_lst
 
+    # Agrupamos los ficheros por destino curated, en el orden de list_date dentro de cada destino
+    destinos = {}
+    for date in list_date:        
+        for indicador in indicadores:
+            for file in indice.get((indicador, date), []):                
+                destinos.setdefault(destino_curated(file), []).append((file, indicador))
+
+    tiempos = {}
+    with catalogo.lote(): #los ficheros procesados se registran en una transaccion al final
+        if max_workers > 1 and len(destinos) > 1:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {executor.submit(process_raw_files_destino, ficheros, catalogo, n_procesos_i90): destino for destino, ficheros in destinos.items()}
+                for future in as_completed(futures):
+                    destino = futures[future]
+                    try:
+                        resumen_destino, tiempos[destino] = future.result()
+                    except Exception as e:
+                        logging.error(f"Error processing raw files of {destino}: {str(e)}")
+                        resumen["errores"] += len(destinos[destino])
+                        continue
+                    for clave, valor in resumen_destino.items():
+                        resumen[clave] += valor
+        else:
+            for destino, ficheros in destinos.items():
+                resumen_destino, tiempos[destino] = process_raw_files_destino(ficheros, catalogo, n_procesos_i90)
+                for clave, valor in resumen_destino.items():
+                    resumen[clave] += valor
+
+    for destino, segundos in sorted(tiempos.items(), key=lambda item: item[1], reverse=True):
+        logging.info(f"Curated target {destino}: {len(destinos[destino])} files in {segundos:.1f}s")
+    logging.info(f"Curated processing: {resumen['procesados']} files processed, {resumen['omitidos']} skipped (already curated), {resumen['errores']} failed, "
+                 f"{len(destinos)} targets in {time.perf_counter() - start:.1f}s with {max_workers} workers")
+    print(f"Ficheros procesados: {resumen['procesados']}, omitidos (ya procesados): {resumen['omitidos']}, errores: {resumen['errores']}, "
+          f"destinos: {len(destinos)}, tiempo: {time.perf_counter() - start:.1f}s")
+    return resumen
@@ -0,0 +1,285 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import contextlib
+import io
+import copy
+import zipfile
+import duckdb
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+
+# Add code/back to the system path so the benchmarks can be run from any folder
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from utilidades.i90zip import i90ZIP
+from utilidades.esios import ESIOS
+from utilidades import parquet_dataset
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "negocio"))
+import conexion_duckdb
+from funciones_consultas import Indicador, PBF, Diario
+
+fichero_config = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "utilidades", "config.yml")
+
+
+def programas_sinteticos(fecha: str, n_uprog: int) -> pd.DataFrame:
+    """
+    Synthetic I90 program sheet for one day with the same columns as the _temp.parquet files.
+    """
+    horas = list(map(str, range(1, 25)))
+    uprog = [f"UP{i:04d}" for i in range(n_uprog)]
+    return pd.DataFrame({
+        "HORA": np.repeat(horas, n_uprog),
+        "FECHA": fecha,
+        "UPROG": np.tile(uprog, len(horas)),
+        "TIPO_OFERTA": "1",
+        "ENERGIA": np.random.default_rng(0).random(len(horas) * n_uprog) * 100,
+    })
+
+
+def benchmark_unir_datos(n_dias: int = 60, n_uprog: int = 1000, cada: int = 10) -> None:
+    """
+    Daily ingest time of i90ZIP.unir_datos as the year grows, full rewrite vs incremental mode.
+
+    Simulates the daemon processing one I90 file per day: the 9 PROG_* sheets of the day are written
+    as _temp.parquet files and consolidated into PROGRAMAS. In full rewrite mode the time grows with
+    the size of PROGRAMAS.parquet, in incremental mode it should stay flat.
+    """
+    fecha_inicial = datetime(2024, 1, 1)
+    programas = ["PROG_PBF", "PROG_PVP", "PROG_PHF1", "PROG_PHF2", "PROG_PHF3", "PROG_PHF4", "PROG_PHF5", "PROG_PHF6", "PROG_PHF7"]
+
+    for incremental in [False, True]:
+        carpeta_salida = tempfile.mkdtemp()
+        obj = i90ZIP(fichero_config, carpeta_salida, incremental=incremental)
+        print(f"\nunir_datos incremental={incremental} ({n_uprog} UPs x 24 horas x {len(programas)} programas por dia)")
+
+        try:
+            for dia in range(n_dias):
+                fecha = (fecha_inicial + timedelta(days=dia)).strftime("%Y-%m-%d")
+                filename = f"I90DIA_{fecha.replace('-', '')}.zip"
+                df = programas_sinteticos(fecha, n_uprog)
+                for programa in programas:
+                    df.to_parquet(os.path.join(carpeta_salida, f"{filename}_{programa}_temp.parquet"), index=False)
+
+                with contextlib.redirect_stdout(io.StringIO()): #silenciar los prints de unir_datos
+                    inicio = time.perf_counter()
+                    obj.unir_datos([filename], carpeta_salida)
+                    segundos = time.perf_counter() - inicio
+
+                if dia == 0 or (dia + 1) % cada == 0:
+                    print(f"  dia {dia + 1:>4}: {segundos:.3f} s")
+
+                obj.borrar_ficheros_temporales(carpeta_salida)
+        finally:
+            shutil.rmtree(carpeta_salida, ignore_errors=True)
+
+
+def benchmark_lector_i90(ruta_zip: str, repeticiones: int = 3) -> None:
+    """
+    Time to read every sheet of a real I90DIA_*.zip with leer_fichero_zip, pandas.ExcelFile path vs fast xlrd reader.
+
+    Only the reading and reshaping to long format is timed (no parquet writes). Both paths must return the same
+    number of non empty values per sheet.
+    """
+    with zipfile.ZipFile(ruta_zip, "r") as f:
+        ficheros = [(file, f.read(file)) for file in f.namelist()]
+
+    valores = {}
+    for lector_rapido in [False, True]:
+        obj = i90ZIP(fichero_config, os.path.dirname(ruta_zip), lector_rapido=lector_rapido)
+        tiempos = []
+        for _ in range(repeticiones):
+            hojas = copy.deepcopy(obj.HOJAS)
+            inicio = time.perf_counter()
+            for file, data in ficheros:
+                hojas = obj.leer_fichero_zip(hojas, file, data)
+            tiempos.append(time.perf_counter() - inicio)
+
+        valores[lector_rapido] = [sum(int(df.iloc[:, -1].notna().sum()) for df in hoja["DATA"]) for hoja in hojas]
+        print(f"leer_fichero_zip lector_rapido={lector_rapido}: mejor {min(tiempos):.3f} s, media {sum(tiempos) / len(tiempos):.3f} s ({sum(valores[lector_rapido])} valores)")
+
+    if valores[False] != valores[True]:
+        print("ATENCION: los dos lectores devuelven distinto numero de valores por hoja")
+
+
+def benchmark_row_groups(n_dias: int = 30, n_uprog: int = 1000) -> None:
+    """
+    Row groups read and DuckDB time of typical /up/programas queries on a PROGRAMAS dataset, in concat order vs
+    clustered by (UPROG, FECHA, HORA) as written by parquet_dataset.write_fragments.
+    """
+    fecha_inicial = datetime(2024, 1, 1)
+    programas = ["PBF", "PVP", "PHF1", "PHF2", "PHF3", "PHF4", "PHF5", "PHF6", "PHF7"]
+    consultas = {
+        "1 UP, 1 mes, PBF": {"UPROG": ["UP0042"], "PROGRAMA": ["PBF"], "FECHA": ("2024-01-01", "2024-01-31")},
+        "10 UPs, 1 semana": {"UPROG": [f"UP{i:04d}" for i in range(500, 510)], "FECHA": ("2024-01-08", "2024-01-14")},
+        "todas las UPs, 1 dia": {"FECHA": ("2024-01-15", "2024-01-15")},
+    }
+
+    carpeta = tempfile.mkdtemp()
+    try:
+        rutas = {"concat": os.path.join(carpeta, "concat"), "cluster": os.path.join(carpeta, "cluster")}
+        os.makedirs(rutas["concat"])
+        for dia in range(n_dias):
+            fecha = (fecha_inicial + timedelta(days=dia)).strftime("%Y-%m-%d")
+            df = pd.concat([programas_sinteticos(fecha, n_uprog).assign(PROGRAMA=programa) for programa in programas], ignore_index=True)
+            df = parquet_dataset.apply_curated_schema(df)
+            #orden de concatenacion de unir_datos (programa, hora, UP) con el mismo tamaño de row group
+            df.to_parquet(parquet_dataset.fragment_path(rutas["concat"], fecha), index=False, row_group_size=parquet_dataset.ROW_GROUP_SIZE)
+            parquet_dataset.write_fragments(df, rutas["cluster"])
+
+        for nombre, filtros in consultas.items():
+            condiciones = []
+            for col, filtro in filtros.items():
+                if isinstance(filtro, tuple):
+                    condiciones.append(f"{col} BETWEEN '{filtro[0]}' AND '{filtro[1]}'")
+                else:
+                    condiciones.append(f"{col} IN ({', '.join(repr(valor) for valor in filtro)})")
+
+            print(f"\n{nombre}")
+            for layout, ruta in rutas.items():
+                path_glob = parquet_dataset.dataset_glob(ruta)
+                resultado = parquet_dataset.count_row_groups(path_glob, filtros)
+                inicio = time.perf_counter()
+                n_filas = len(duckdb.sql(f"SELECT * FROM '{path_glob}' WHERE {' AND '.join(condiciones)}").df())
+                segundos = time.perf_counter() - inicio
+                print(f"  {layout:>7}: {resultado['row_groups_read']:>4} de {resultado['row_groups']} row groups, {n_filas} filas, {segundos:.3f} s")
+    finally:
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+
+def benchmark_consulta_multianual(n_uprog: int = 100, repeticiones: int = 5) -> None:
+    """
+    Time of a PBF /up/programas query over 1, 3 and 5 years: check_uprog, one DuckDB query and one pd.concat per year
+    (the former loop of get_programas_precios) vs the single read_parquet([...]) query of Indicador.get_programas_precios.
+    """
+    carpeta = tempfile.mkdtemp()
+    years = ["2020", "2021", "2022", "2023", "2024"]
+    try:
+        for year in years:
+            fechas = pd.date_range(f"{year}-01-01", f"{year}-12-31").strftime("%Y-%m-%d")
+            df = pd.concat([programas_sinteticos(fecha, n_uprog) for fecha in fechas], ignore_index=True).assign(PROGRAMA="PBF")
+            parquet_dataset.write_fragments(df, os.path.join(carpeta, year, "PROGRAMAS"))
+
+        pbf = PBF()
+        pbf.get_path = lambda year: {"path_prog": parquet_dataset.dataset_glob(os.path.join(carpeta, str(year), "PROGRAMAS"))}
+        lista_uprog = ["UP0001", "UP0002"]
+
+        def bucle_por_year(start_date, end_date):
+            master_df = pd.DataFrame()
+            years_lst = pbf.years_between(start_date, end_date)
+            for year in years_lst:
+                fecha_inicio = start_date if year == years_lst[0] else f"{year}-01-01"
+                fecha_fin = end_date if year == years_lst[-1] else f"{year}-12-31"
+                pbf.check_uprog(lista_uprog, pbf.get_path(year)["path_prog"]) #como el bucle original, comprobacion de UPs por año
+                df = conexion_duckdb.consultar(
+                    "SELECT * FROM read_parquet($path) WHERE PROGRAMA = 'PBF' AND UPROG IN ($u0, $u1) AND FECHA BETWEEN CAST($ini AS DATE) AND CAST($fin AS DATE)",
+                    {"path": pbf.get_path(year)["path_prog"], "u0": lista_uprog[0], "u1": lista_uprog[1], "ini": fecha_inicio, "fin": fecha_fin})
+                master_df = pd.concat([master_df, df], ignore_index=True)
+            return master_df
+
+        def consulta_unica(start_date, end_date):
+            return pbf.get_programas(start_date, end_date, lista_uprog)
+
+        for n_years in [1, 3, 5]:
+            start_date, end_date = f"{years[-n_years]}-01-01", "2024-12-31"
+            print(f"\n{n_years} año(s): {start_date} a {end_date}")
+            for nombre, funcion in [("bucle por año", bucle_por_year), ("consulta unica", consulta_unica)]:
+                tiempos = []
+                for _ in range(repeticiones):
+                    with contextlib.redirect_stdout(io.StringIO()): #silenciar los prints de la capa de consultas
+                        inicio = time.perf_counter()
+                        n_filas = len(funcion(start_date, end_date))
+                        tiempos.append(time.perf_counter() - inicio)
+                print(f"  {nombre:>14}: mejor {min(tiempos):.3f} s, media {sum(tiempos) / len(tiempos):.3f} s ({n_filas} filas)")
+    finally:
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+
+def benchmark_ganancias(n_uprog: int = 200, repeticiones: int = 3) -> None:
+    """
+    Time and peak rows loaded in pandas of PBF ganancias for all the UPs over one year: pd.merge of the programas and precios
+    dataframes (get_ganancias_pandas) vs the DuckDB query of get_ganancias_sql, with and without the detailed result.
+    """
+    carpeta = tempfile.mkdtemp()
+    year = "2024"
+    try:
+        fechas = pd.date_range(f"{year}-01-01", f"{year}-12-31").strftime("%Y-%m-%d")
+        df = pd.concat([programas_sinteticos(fecha, n_uprog) for fecha in fechas], ignore_index=True).assign(PROGRAMA="PBF")
+        parquet_dataset.write_fragments(df, os.path.join(carpeta, year, "PROGRAMAS"))
+        precios = pd.DataFrame({"FECHA": np.repeat(fechas, 24), "PERIODO": np.tile(np.arange(1, 25), len(fechas)), "PRECIO": 50.0})
+        parquet_dataset.write_fragments(precios, os.path.join(carpeta, year, "precios_diario"))
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            pbf, diario = PBF(), Diario()
+        pbf.get_path = lambda year: {"path_prog": parquet_dataset.dataset_glob(os.path.join(carpeta, str(year), "PROGRAMAS"))}
+        diario.get_path = lambda year: {"path_prc": parquet_dataset.dataset_glob(os.path.join(carpeta, str(year), "precios_diario"))}
+        pbf.indicador_config["prc_func"] = lambda start_date, end_date: diario.get_precios(start_date, end_date)
+        pbf.indicador_config["prc_indicador"] = lambda: diario
+
+        modos = {
+            "pandas merge": lambda: pbf.get_ganancias_pandas(pbf.indicador_config, f"{year}-01-01", f"{year}-12-31", []),
+            "duckdb + detalle": lambda: pbf.get_ganancias_sql(pbf.indicador_config, f"{year}-01-01", f"{year}-12-31", [], detalle=True),
+            "duckdb solo total": lambda: pbf.get_ganancias_sql(pbf.indicador_config, f"{year}-01-01", f"{year}-12-31", [], detalle=False),
+        }
+        print(f"\nganancias PBF {year}, {n_uprog} UPs")
+        for nombre, funcion in modos.items():
+            tiempos = []
+            for _ in range(repeticiones):
+                with contextlib.redirect_stdout(io.StringIO()): #silenciar los prints de la capa de consultas
+                    inicio = time.perf_counter()
+                    total, detalle = funcion()
+                    tiempos.append(time.perf_counter() - inicio)
+            print(f"  {nombre:>17}: mejor {min(tiempos):.3f} s, media {sum(tiempos) / len(tiempos):.3f} s ({len(total)} UPs, {len(detalle)} filas de detalle, total {total['GANANCIA'].sum():.2f})")
+    finally:
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+
+def benchmark_esios_json(year: int = 2024, repeticiones: int = 3) -> None:
+    """
+    Time of the conversion of one year of a quarter-hourly ESIOS indicator (RR, 1782) to the FECHA/PERIODO/PRECIO
+    dataframe: loop over the records with strptime + pytz + strftime + hora_a_periodo vs the column-wise
+    to_datetime(utc=True) + tz_convert + vectorised periods of ESIOS.valores_a_dataframe.
+    """
+    fechas_utc = pd.date_range(pd.Timestamp(f"{year}-01-01", tz="Europe/Madrid"), pd.Timestamp(f"{year + 1}-01-01", tz="Europe/Madrid"),
+                               freq="15min", inclusive="left").tz_convert("UTC")
+    datos = {"indicator": {"values": [{"value": round(50 + i % 96 * 0.5, 2), "datetime_utc": fecha.strftime("%Y-%m-%dT%H:%M:%SZ"), "geo_id": 3}
+                                      for i, fecha in enumerate(fechas_utc)]}}
+    esios = ESIOS()
+    fecha_inicio_qh = "2020-01-01"
+
+    def bucle():
+        registros = []
+        for d in datos['indicator']['values']:
+            if d['geo_id'] == 3:
+                fecha_local = esios.utc_to_local(datetime.strptime(d['datetime_utc'], "%Y-%m-%dT%H:%M:%SZ"))
+                registros.append({'FECHA': fecha_local.strftime("%Y-%m-%d"),
+                                  'PERIODO': esios.hora_a_periodo(fecha_inicio_qh, fecha_local.strftime("%Y-%m-%d"), fecha_local.strftime("%H:%M")),
+                                  'PRECIO': d['value']})
+        return pd.DataFrame(registros)
+
+    def vectorizado():
+        valores = esios.valores_a_dataframe(datos, geo_id=3)
+        return pd.DataFrame({'FECHA': valores['FECHA'], 'PERIODO': esios.periodos(valores, esios.es_cuartohorario(valores, fecha_inicio_qh)),
+                             'PRECIO': valores['value']})
+
+    print(f"\nESIOS JSON -> DataFrame, {len(fechas_utc)} valores cuartohorarios ({year})")
+    resultados = {}
+    for nombre, funcion in {"bucle por registro": bucle, "vectorizado": vectorizado}.items():
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            resultados[nombre] = funcion()
+            tiempos.append(time.perf_counter() - inicio)
+        print(f"  {nombre:>18}: mejor {min(tiempos):.3f} s, media {sum(tiempos) / len(tiempos):.3f} s")
+    print(f"  mismo resultado: {resultados['bucle por registro'].to_csv(index=False) == resultados['vectorizado'].to_csv(index=False)}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1: #python benchmarks.py ruta/I90DIA_20240614.zip
+        benchmark_lector_i90(sys.argv[1])
+    else:
+        benchmark_unir_datos()
@@ -0,0 +1,64 @@
+import os
+import sys
+import time
+import tempfile
+import unittest
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "negocio"))
+import config_consultas as configc
+from api.cache_resultados import CacheResultados
+from utilidades import parquet_dataset
+
+
+class TestCacheResultados(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.paths_originales = configc.test_local_paths.get("diario")
+        configc.test_local_paths["diario"] = {"path_prc": os.path.join(self.tmp.name, "year", "precios_diario", "*.parquet")}
+
+    def tearDown(self):
+        configc.test_local_paths["diario"] = self.paths_originales
+        self.tmp.cleanup()
+
+    def escribir_precios(self, fecha: str, precio: float) -> None:
+        df = pd.DataFrame({"FECHA": [fecha], "PERIODO": [1], "PRECIO": [precio]})
+        parquet_dataset.write_fragments(df, os.path.join(self.tmp.name, fecha[:4], "precios_diario"), parquet_dataset.PRICE_DEDUP_KEY)
+
+    def test_clave_normalizada(self):
+        clave_1 = CacheResultados.normalizar_clave("gananciasUP", "RR ", "2024-01-01", "2024-01-31", ["ABA1"], "Subir, Bajar", "Dia")
+        clave_2 = CacheResultados.normalizar_clave("gananciasUP", "rr", "2024-01-01", "2024-01-31", "ABA1", ["Bajar", "Subir"], "dia")
+        self.assertEqual(clave_1, clave_2)
+
+    def test_hit_e_invalidacion_por_datos_nuevos(self):
+        cache = CacheResultados()
+        self.escribir_precios("2024-01-01", 10.0)
+        clave = CacheResultados.normalizar_clave("precios", "diario", "2024-01-01", "2024-01-31")
+        version = CacheResultados.version_datos(["diario"], "2024-01-01", "2024-01-31")
+        self.assertIsNone(cache.get(clave, version))
+        cache.set(clave, version, {"status": "success"})
+        self.assertEqual(cache.get(clave, CacheResultados.version_datos(["diario"], "2024-01-01", "2024-01-31")), {"status": "success"})
+
+        time.sleep(0.01)
+        self.escribir_precios("2024-01-02", 11.0) #el daemon escribe un dia nuevo del mismo año
+        self.assertIsNone(cache.get(clave, CacheResultados.version_datos(["diario"], "2024-01-01", "2024-01-31")))
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["invalidadas"], 1)
+
+    def test_lru_y_ttl(self):
+        cache = CacheResultados(max_entradas=2, ttl=60)
+        for i in range(3):
+            cache.set(("clave", i), (), i)
+        self.assertIsNone(cache.get(("clave", 0), ()))
+        self.assertEqual(cache.get(("clave", 2), ()), 2)
+        self.assertEqual(cache.stats()["descartadas"], 1)
+
+        cache.ttl = 0
+        time.sleep(0.01)
+        self.assertIsNone(cache.get(("clave", 2), ()))
+        self.assertEqual(cache.stats()["expiradas"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,199 @@
+import os
+import json
+import tempfile
+import threading
+import unittest
+from unittest import mock
+import pandas as pd
+from negocio.catalogo_procesados import CatalogoProcesados
+from negocio import funciones_daemon
+from utilidades import parquet_dataset
+from utilidades.i90zip import i90ZIP
+
+
+class TestCatalogoProcesados(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.catalogo_path = os.path.join(self.tmp.name, "logs", "processed_files.sqlite")
+        self.catalogo = CatalogoProcesados(self.catalogo_path, tamano_lote=3)
+
+    def tearDown(self):
+        self.catalogo.cerrar()
+        self.tmp.cleanup()
+
+    def fichero_raw(self, filename, contenido):
+        path = os.path.join(self.tmp.name, filename)
+        with open(path, "w") as f:
+            f.write(contenido)
+        return path
+
+    def test_registrar_fichero(self):
+        path = self.fichero_raw("2024-10-15_precios_rr.csv", "FECHA;PERIODO;PRECIO\n2024-10-15;1;10.0\n")
+        self.catalogo.registrar_fichero(path, "rr", 2024, rows=1)
+
+        registro = self.catalogo.get("2024-10-15_precios_rr.csv")
+        self.assertEqual((registro["indicador"], registro["year"], registro["rows"]), ("rr", "2024", 1))
+        self.assertEqual(registro["size"], os.path.getsize(path))
+        self.assertTrue(self.catalogo.is_processed("2024-10-15_precios_rr.csv", registro["sha256"]))
+        self.assertFalse(self.catalogo.is_processed("2024-10-15_precios_rr.csv", "otro hash")) #el fichero ha cambiado
+        self.assertFalse(self.catalogo.is_processed("2024-10-16_precios_rr.csv"))
+
+    def test_lotes_persistentes(self):
+        self.catalogo.registrar("I90DIA_20240613.zip", "i90", 2024)
+        self.catalogo.registrar("I90DIA_20240614.zip", "i90", 2024)
+        #aun no se ha escrito el lote, pero la consulta ya los ve
+        self.assertTrue(self.catalogo.is_processed("I90DIA_20240613.zip"))
+        otro = CatalogoProcesados(self.catalogo_path)
+        self.assertIsNone(otro.get("I90DIA_20240613.zip"))
+
+        self.catalogo.registrar("I90DIA_20240615.zip", "i90", 2024) #tamano_lote=3 -> se escribe el lote
+        self.assertEqual(otro.ficheros("i90", 2024), ["I90DIA_20240613.zip", "I90DIA_20240614.zip", "I90DIA_20240615.zip"])
+
+        with self.catalogo.lote():
+            self.catalogo.registrar("2024-06-13_precios_diario.csv", "diario", 2024)
+        self.assertEqual(otro.ficheros("diario"), ["2024-06-13_precios_diario.csv"])
+        otro.cerrar()
+
+    def test_registros_desde_varios_hilos(self):
+        def registrar(inicio):
+            for i in range(inicio, inicio + 50):
+                self.catalogo.registrar(f"fichero_{i:03d}.csv", "rr", 2024)
+
+        hilos = [threading.Thread(target=registrar, args=(i * 50,)) for i in range(4)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(len(self.catalogo.ficheros("rr", 2024)), 200)
+
+    def test_migrar_json(self):
+        json_path = os.path.join(self.tmp.name, "processed_files.json")
+        with open(json_path, "w") as f:
+            json.dump({
+                "i90": {"2024": ["I90DIA_20240613.zip"]},
+                "diario": {"2023": ["2023-12-31_precios_diario.csv"], "2024": ["2024-01-01_precios_diario.csv"]},
+                "rr": {},
+            }, f)
+        path = self.fichero_raw("2024-01-01_precios_diario.csv", "FECHA;PERIODO;PRECIO\n")
+        self.catalogo.registrar_fichero(path, "diario", 2024, rows=24)
+
+        self.assertEqual(self.catalogo.migrar_json(json_path), 2)
+        self.assertEqual(self.catalogo.migrar_json(json_path), 0) #idempotente
+
+        self.assertEqual(self.catalogo.ficheros("diario"), ["2023-12-31_precios_diario.csv", "2024-01-01_precios_diario.csv"])
+        self.assertEqual(self.catalogo.get("2024-01-01_precios_diario.csv")["rows"], 24) #se mantiene el registro del catalogo
+        #los ficheros migrados no tienen hash, se comprueban solo por nombre
+        self.assertTrue(self.catalogo.is_processed("I90DIA_20240613.zip", "cualquier hash"))
+
+
+
+class TestProcessRawFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.carpeta_raw = os.path.join(self.tmp.name, "raw", "OMIE", "Rr")
+        os.makedirs(os.path.join(self.carpeta_raw, "2024"))
+        self.catalogo = CatalogoProcesados(os.path.join(self.tmp.name, "logs", "processed_files.sqlite"))
+        self.fechas = ["2024-10-13", "2024-10-14", "2024-10-15"]
+        for fecha in self.fechas:
+            self.escribir_precios(fecha, 10.0)
+
+    def tearDown(self):
+        self.catalogo.cerrar()
+        self.tmp.cleanup()
+
+    def escribir_precios(self, fecha, precio):
+        pd.DataFrame({"FECHA": [fecha] * 2, "PERIODO": [1, 2], "PRECIO": [precio, precio + 1]}).to_csv(
+            os.path.join(self.carpeta_raw, "2024", f"{fecha}_precios_rr.csv"), index=False)
+
+    def procesar(self, max_workers=1):
+        return funciones_daemon.process_raw_files(None, [self.carpeta_raw], None, None, self.fechas, catalogo=self.catalogo, max_workers=max_workers)
+
+    def test_reejecucion_omite_ficheros_procesados(self):
+        self.assertEqual(self.procesar(), {"procesados": 3, "omitidos": 0, "errores": 0})
+        self.assertEqual(self.procesar(), {"procesados": 0, "omitidos": 3, "errores": 0})
+        self.assertEqual(self.catalogo.ficheros("rr", 2024), [f"{fecha}_precios_rr.csv" for fecha in self.fechas])
+
+        #un fichero que cambia (i.e. precios revisados) se vuelve a procesar
+        self.escribir_precios("2024-10-14", 50.0)
+        self.assertEqual(self.procesar(), {"procesados": 1, "omitidos": 2, "errores": 0})
+
+        dataset_path = os.path.join(self.tmp.name, "curated", "OMIE", "Rr", "2024", "precios_rr")
+        precios = parquet_dataset.read_dataset(dataset_path)
+        self.assertEqual(len(precios), 6)
+        self.assertEqual(sorted(precios.loc[precios["FECHA"].astype(str) == "2024-10-14", "PRECIO"].tolist()), [50.0, 51.0])
+
+    def test_indice_ficheros_raw(self):
+        carpeta_i90 = os.path.join(self.tmp.name, "raw", "ESIOS", "i90")
+        os.makedirs(os.path.join(carpeta_i90, "2024"))
+        #ficheros que no se procesan: metadatos de descarga, descargas a medias, temporales de los i90
+        for filename in ["I90DIA_20241015.zip", "I90DIA_20241016.zip.part", "I90DIA_20241015.zip_PROG_PBF_temp.parquet", "_descargas.json"]:
+            open(os.path.join(carpeta_i90, "2024", filename), "w").close()
+        open(os.path.join(self.carpeta_raw, "2024", "2024-10-15_precios_rr.csv.123.tmp"), "w").close()
+
+        indice = funciones_daemon.indexar_ficheros_raw([carpeta_i90, self.carpeta_raw, os.path.join(self.tmp.name, "raw", "OMIE", "Diario")], ["2024", 2023])
+
+        self.assertEqual(sorted(indice), [("i90", "2024-10-15"), ("rr", "2024-10-13"), ("rr", "2024-10-14"), ("rr", "2024-10-15")])
+        self.assertEqual(indice[("i90", "2024-10-15")], [os.path.join(carpeta_i90, "2024", "I90DIA_20241015.zip")])
+        self.assertEqual(indice[("rr", "2024-10-15")], [os.path.join(self.carpeta_raw, "2024", "2024-10-15_precios_rr.csv")])
+
+    def test_destinos_en_paralelo(self):
+        carpeta_diario = os.path.join(self.tmp.name, "raw", "OMIE", "Diario")
+        os.makedirs(os.path.join(carpeta_diario, "2024"))
+        for fecha in self.fechas:
+            pd.DataFrame({"FECHA": [fecha], "PERIODO": [1], "PRECIO": [70.0]}).to_csv(os.path.join(carpeta_diario, "2024", f"{fecha}_precios_diario.csv"), index=False)
+
+        escrituras = {}
+        en_curso = set()
+        save_csv_to_parquet = funciones_daemon.save_csv_to_parquet
+
+        def save_csv_registrado(dataset_path, raw_csv_filepath):
+            self.assertNotIn(dataset_path, en_curso) #nunca dos hilos escribiendo el mismo dataset
+            en_curso.add(dataset_path)
+            try:
+                escrituras.setdefault(os.path.basename(dataset_path), []).append(os.path.basename(raw_csv_filepath))
+                return save_csv_to_parquet(dataset_path, raw_csv_filepath)
+            finally:
+                en_curso.discard(dataset_path)
+
+        with mock.patch.object(funciones_daemon, "save_csv_to_parquet", save_csv_registrado):
+            resumen = funciones_daemon.process_raw_files(None, [carpeta_diario, self.carpeta_raw], None, None, self.fechas, catalogo=self.catalogo, max_workers=4)
+
+        self.assertEqual(resumen, {"procesados": 6, "omitidos": 0, "errores": 0})
+        #dentro de cada destino los ficheros se procesan en el orden de las fechas
+        self.assertEqual(escrituras["precios_rr"], [f"{fecha}_precios_rr.csv" for fecha in self.fechas])
+        self.assertEqual(escrituras["precios_diario"], [f"{fecha}_precios_diario.csv" for fecha in self.fechas])
+        self.assertEqual(len(parquet_dataset.read_dataset(os.path.join(self.tmp.name, "curated", "OMIE", "Diario", "2024", "precios_diario"))), 3)
+
+    def test_n_procesos_i90(self):
+        carpeta_i90 = os.path.join(self.tmp.name, "raw", "ESIOS", "i90")
+        os.makedirs(os.path.join(carpeta_i90, "2024"))
+        open(os.path.join(carpeta_i90, "2024", "I90DIA_20241015.zip"), "w").close()
+
+        with mock.patch.object(funciones_daemon, "i90ZIP") as i90zip_mock:
+            resumen = funciones_daemon.process_raw_files(None, [carpeta_i90], None, None, ["2024-10-15"], catalogo=self.catalogo, n_procesos_i90=3)
+
+        self.assertEqual(resumen, {"procesados": 1, "omitidos": 0, "errores": 0})
+        self.assertEqual(i90zip_mock.call_args.kwargs["n_procesos"], 3) #procesos de config.procesado_curated hasta el i90ZIP
+        i90zip_mock.return_value.generar_ficheros.assert_called_once()
+
+    def test_i90_borra_temporales_de_carpeta_salida(self):
+        carpeta_salida = os.path.join(self.tmp.name, "curated", "ESIOS", "i90", "2024")
+        os.makedirs(carpeta_salida)
+        otro_temporal = os.path.join(carpeta_salida, "I90DIA_20240614.zip_PROG_PBF_temp.parquet") #de otro zip, no se borra
+        open(otro_temporal, "w").close()
+
+        def extraer_datos(filename, carpeta_salida, carpeta_ficheros_zip, lista_uprog=None):
+            open(os.path.join(carpeta_salida, f"{filename}_PROG_PBF_temp.parquet"), "w").close()
+
+        obj = i90ZIP(os.path.join(os.path.dirname(funciones_daemon.__file__), "..", "utilidades", "config.yml"), self.tmp.name)
+        with mock.patch.object(obj, "extraer_datos", extraer_datos), mock.patch.object(obj, "unir_datos"):
+            obj.generar_ficheros(["I90DIA_20240613.zip"], carpeta_salida, os.path.join(self.tmp.name, "raw", "ESIOS", "i90", "2024"))
+
+        self.assertEqual(os.listdir(carpeta_salida), [os.path.basename(otro_temporal)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import os
+import sys
+import time
+import tempfile
+import threading
+import unittest
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "negocio"))
+import conexion_duckdb
+from conexion_duckdb import PoolDuckDB
+from negocio.funciones_consultas import Indicador
+
+
+class TestPoolDuckDB(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pool = PoolDuckDB(max_cursores=2)
+
+    def tearDown(self):
+        self.pool.cerrar()
+        conexion_duckdb.cerrar_pool()
+        self.tmp.cleanup()
+
+    def test_cursores_reutilizados_en_paralelo(self):
+        cursores, en_uso, max_en_uso, errores = set(), [0], [0], []
+        lock = threading.Lock()
+
+        def consultar(i):
+            try:
+                for j in range(20):
+                    with self.pool.cursor() as cur:
+                        with lock:
+                            cursores.add(id(cur))
+                            en_uso[0] += 1
+                            max_en_uso[0] = max(max_en_uso[0], en_uso[0])
+                        resultado = cur.execute("SELECT $a + $b AS suma", {"a": i, "b": j}).fetchone()[0]
+                        time.sleep(0.001)
+                        with lock:
+                            en_uso[0] -= 1
+                    if resultado != i + j:
+                        errores.append((i, j, resultado))
+            except Exception as e:
+                errores.append(e)
+
+        hilos = [threading.Thread(target=consultar, args=(i,)) for i in range(8)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(errores, [])
+        self.assertLessEqual(max_en_uso[0], 2)
+        self.assertLessEqual(len(cursores), 2) #8 hilos x 20 consultas con los mismos 2 cursores
+        self.assertEqual(self.pool.consultar("SELECT 42 AS x")["x"].tolist(), [42])
+
+    def test_max_cursores_bloquea(self):
+        pool = PoolDuckDB(max_cursores=1)
+        obtenido = threading.Event()
+
+        def esperar_cursor():
+            with pool.cursor():
+                obtenido.set()
+
+        with pool.cursor() as cur:
+            hilo = threading.Thread(target=esperar_cursor)
+            hilo.start()
+            self.assertFalse(obtenido.wait(0.2)) #el unico cursor esta en uso
+            cur.execute("SELECT 1")
+        self.assertTrue(obtenido.wait(5))
+        hilo.join()
+        pool.cerrar()
+
+    def test_parametros_con_comillas(self):
+        path = os.path.join(self.tmp.name, "PROGRAMAS.parquet")
+        ups = ["ABA1", "O'DONNELL", 'UP"2', "X') OR ('1'='1"]
+        pd.DataFrame({"UPROG": ups, "ENERGIA": [1.0, 2.0, 3.0, 4.0]}).to_parquet(path)
+
+        placeholders, params = Indicador.bind_list("uprog", ["O'DONNELL", 'UP"2'])
+        params["path"] = path
+        result = self.pool.consultar(f"SELECT UPROG, ENERGIA FROM read_parquet($path) WHERE UPROG IN ({placeholders}) ORDER BY ENERGIA", params)
+        self.assertEqual(result["UPROG"].tolist(), ["O'DONNELL", 'UP"2'])
+
+        #el valor se compara tal cual, no se interpreta como SQL
+        result = self.pool.consultar("SELECT UPROG FROM read_parquet($path) WHERE UPROG = $uprog_0", {"path": path, "uprog_0": "X') OR ('1'='1"})
+        self.assertEqual(result["UPROG"].tolist(), ["X') OR ('1'='1"])
+
+    def test_cerrar_pool(self):
+        pool = conexion_duckdb.get_pool()
+        self.assertIs(conexion_duckdb.get_pool(), pool)
+
+        conexion_duckdb.cerrar_pool()
+        self.assertIsNone(conexion_duckdb._pool)
+        self.assertEqual(conexion_duckdb.consultar("SELECT 1 AS x")["x"].tolist(), [1]) #se crea un pool nuevo
+        self.assertIsNot(conexion_duckdb.get_pool(), pool)
+
+        #un pool cerrado directamente tambien se sustituye
+        conexion_duckdb.get_pool().cerrar()
+        self.assertEqual(conexion_duckdb.consultar("SELECT 2 AS x")["x"].tolist(), [2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+import os
+import sys
+import tempfile
+import unittest
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "negocio"))
+import config_consultas as configc
+from negocio.funciones_consultas import Indicador, PBF, Secundaria, Restricciones, Diario
+from utilidades import parquet_dataset
+
+
+class TestConsultasBase(unittest.TestCase):
+    """
+    Curated datasets in a temporary folder, with the paths of config_consultas pointing to them.
+    """
+
+    INDICADORES = ["pbf", "diario", "afrr", "restricciones"]
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.paths_originales = {indicador: configc.test_local_paths.get(indicador) for indicador in self.INDICADORES}
+        self.ganancias_sql = Indicador.ganancias_sql
+        configc.test_local_paths["pbf"] = {"path_prog": os.path.join(self.tmp.name, "year", "PROGRAMAS", "*.parquet")}
+        configc.test_local_paths["diario"] = {"path_prc": os.path.join(self.tmp.name, "year", "precios_diario", "*.parquet")}
+        configc.test_local_paths["afrr"] = {
+            "path_prog": os.path.join(self.tmp.name, "year", "PROG_SEC", "*.parquet"),
+            "path_prc": os.path.join(self.tmp.name, "year", "precios_secundaria", "*.parquet"),
+        }
+        configc.test_local_paths["restricciones"] = {
+            "path_prog": os.path.join(self.tmp.name, "year", "RESULT_RES", "*.parquet"),
+            "path_prc": os.path.join(self.tmp.name, "year", "PRE_RES_MD", "*.parquet"),
+        }
+
+    def tearDown(self):
+        for indicador, paths in self.paths_originales.items():
+            configc.test_local_paths[indicador] = paths
+        Indicador.ganancias_sql = self.ganancias_sql
+        self.tmp.cleanup()
+
+    def escribir(self, dataset, df):
+        parquet_dataset.write_fragments(df, os.path.join(self.tmp.name, str(df["FECHA"].iloc[0])[:4], dataset))
+
+    def ganancias(self, indicador, sql, *args):
+        Indicador.ganancias_sql = sql
+        return indicador.get_ganancias(*args)
+
+
+class TestProgramasPreciosYears(TestConsultasBase):
+
+    def setUp(self):
+        super().setUp()
+        fechas_2023, fechas_2024 = ["2023-12-29", "2023-12-30", "2023-12-31"], ["2024-01-01", "2024-01-02"]
+        #2024 con una columna mas (OFERTA) y sin PRECIO_MAX en los precios: los años tienen columnas distintas
+        for fecha in fechas_2023:
+            self.escribir("PROGRAMAS", pd.DataFrame({"UPROG": ["ABA1", "ACE3"], "FECHA": fecha, "HORA": 1, "PROGRAMA": "PBF", "ENERGIA": [1.0, 2.0]}))
+            self.escribir("precios_diario", pd.DataFrame({"FECHA": fecha, "PERIODO": [1], "PRECIO": [50.0], "PRECIO_MAX": [60.0]}))
+        for fecha in fechas_2024:
+            self.escribir("PROGRAMAS", pd.DataFrame({"UPROG": ["ABA1", "ACE3"], "FECHA": fecha, "HORA": 1, "PROGRAMA": "PBF", "OFERTA": "1", "ENERGIA": [3.0, 4.0]}))
+            self.escribir("precios_diario", pd.DataFrame({"FECHA": fecha, "PERIODO": [1], "PRECIO": [70.0]}))
+
+    def test_programas_dos_years(self):
+        df = PBF().get_programas("2023-12-30", "2024-01-01", ["ABA1"])
+
+        self.assertEqual(sorted(df["FECHA"].astype(str)), ["2023-12-30", "2023-12-31", "2024-01-01"])
+        self.assertEqual(set(df["UPROG"]), {"ABA1"})
+        self.assertIn("OFERTA", df.columns)
+        df = df.sort_values("FECHA")
+        self.assertEqual(df["ENERGIA"].tolist(), [1.0, 1.0, 3.0])
+        self.assertEqual(df["OFERTA"].isna().tolist(), [True, True, False]) #la columna no existe en 2023
+
+    def test_precios_dos_years(self):
+        df = Diario().get_precios("2023-12-31", "2024-01-02").sort_values("FECHA")
+
+        self.assertEqual(df["FECHA"].astype(str).tolist(), ["2023-12-31", "2024-01-01", "2024-01-02"])
+        self.assertEqual(df["PRECIO"].tolist(), [50.0, 70.0, 70.0])
+        self.assertEqual(df["PRECIO_MAX"].isna().tolist(), [False, True, True]) #la columna no existe en 2024
+
+        self.assertTrue(Diario().get_precios("2022-01-01", "2022-12-31").empty) #ningun año con datos
+
+
+class TestPathsSinMigrar(TestConsultasBase):
+
+    def test_year_sin_migrar(self):
+        #2023 sigue en el fichero anual (PROGRAMAS.parquet), 2024 ya es un dataset
+        os.makedirs(os.path.join(self.tmp.name, "2023"))
+        pd.DataFrame({"UPROG": ["ABA1"], "FECHA": pd.to_datetime(["2023-12-31"]), "HORA": [1], "PROGRAMA": "PBF", "ENERGIA": [1.0]}).to_parquet(
+            os.path.join(self.tmp.name, "2023", "PROGRAMAS.parquet"))
+        self.escribir("PROGRAMAS", pd.DataFrame({"UPROG": ["ABA1"], "FECHA": "2024-01-01", "HORA": 1, "PROGRAMA": "PBF", "ENERGIA": [3.0]}))
+
+        self.assertEqual(PBF().get_paths_years("path_prog", ["2023", "2024"]), {
+            "2023": os.path.join(self.tmp.name, "2023", "PROGRAMAS.parquet"),
+            "2024": os.path.join(self.tmp.name, "2024", "PROGRAMAS", "*.parquet"),
+        })
+        df = PBF().get_programas("2023-12-31", "2024-01-01", ["ABA1"]).sort_values("FECHA")
+        self.assertEqual(df["ENERGIA"].tolist(), [1.0, 3.0])
+
+        #una vez migrado se lee el dataset
+        parquet_dataset.migrate_monolithic_files(self.tmp.name)
+        self.assertEqual(PBF().get_paths_years("path_prog", ["2023"]), {"2023": os.path.join(self.tmp.name, "2023", "PROGRAMAS", "*.parquet")})
+        self.assertEqual(PBF().get_programas("2023-12-31", "2023-12-31", ["ABA1"])["ENERGIA"].tolist(), [1.0])
+
+
+class TestGananciasDST(TestConsultasBase):
+
+    def test_restricciones_dia_25_horas(self):
+        horas = ["1", "2", "3a", "3b", "4"]
+        self.escribir("RESULT_RES", pd.DataFrame({"UPROG": "ABA1", "FECHA": "2023-10-29", "HORA": horas, "SENTIDO": "Subir", "ENERGIA": [1.0, 1.0, 1.0, 2.0, 1.0]}))
+        self.escribir("PRE_RES_MD", pd.DataFrame({"UPROG": "ABA1", "FECHA": "2023-10-29", "HORA": horas, "SENTIDO": "Subir", "PRECIO": [10.0, 10.0, 10.0, 20.0, 10.0]}))
+
+        for sql in [True, False]:
+            with self.subTest(sql=sql):
+                total, detalle = self.ganancias(Restricciones(), sql, "2023-10-29", "2023-10-29", ["ABA1"], None)
+                #3a y 3b se cruzan solo consigo mismas: 10 + 10 + 1*10 + 2*20 + 10
+                self.assertEqual(total["GANANCIA"].tolist(), [80.0])
+                self.assertEqual(len(detalle), 5)
+                self.assertEqual(sorted(detalle.loc[detalle["HORA"] == 3, "GANANCIA"].tolist()), [10.0, 40.0])
+
+
+class TestGananciasSqlPandas(TestConsultasBase):
+
+    FECHAS = [("2023-03-26", ["1", "2", "4", "5"]), ("2023-06-14", ["1", "2", "3", "4"]), ("2023-10-29", ["1", "2", "3a", "3b", "4"])]
+    UPS = ["ABA1", "ACE3"]
+
+    def setUp(self):
+        super().setUp()
+        for fecha, horas in self.FECHAS:
+            periodos = list(range(1, len(horas) + 1))
+            filas = [(up, hora, sentido, 1.5 * (i + 1) + j + (k == 1)) for i, up in enumerate(self.UPS) for j, hora in enumerate(horas) for k, sentido in enumerate(["Subir", "Bajar"])]
+            prog = pd.DataFrame(filas, columns=["UPROG", "HORA", "SENTIDO", "ENERGIA"]).assign(FECHA=fecha)
+            self.escribir("PROGRAMAS", prog.drop(columns="SENTIDO").drop_duplicates(["UPROG", "HORA"]).assign(PROGRAMA="PBF"))
+            self.escribir("PROG_SEC", prog.assign(HORA=prog["HORA"].str.rstrip("ab").astype(int) * 4 + prog["HORA"].str.endswith("b"))) #cuartohoraria
+            self.escribir("RESULT_RES", prog)
+            self.escribir("precios_diario", pd.DataFrame({"FECHA": fecha, "PERIODO": periodos, "PRECIO": [50.0 + p for p in periodos]}))
+            self.escribir("precios_secundaria", pd.DataFrame({"FECHA": fecha, "PERIODO": periodos, "SENTIDO": "Subir", "PRECIO": [70.0 + p for p in periodos]}))
+            self.escribir("PRE_RES_MD", prog.drop(columns="ENERGIA").assign(PRECIO=[100.0 + 3 * i for i in range(len(prog))]))
+
+    def comparar(self, indicador, *args):
+        total_sql, detalle_sql = self.ganancias(indicador, True, *args)
+        total_pandas, detalle_pandas = self.ganancias(indicador, False, *args)
+        self.assertFalse(detalle_pandas.empty)
+        pd.testing.assert_frame_equal(total_sql, total_pandas)
+
+        #el orden de las filas del join no esta definido
+        columnas = list(detalle_pandas.columns)
+        self.assertEqual(list(detalle_sql.columns), columnas)
+        ordenar = lambda df: df.astype({col: str for col in columnas if isinstance(df[col].dtype, pd.CategoricalDtype)}).sort_values(columnas).reset_index(drop=True)
+        pd.testing.assert_frame_equal(ordenar(detalle_sql), ordenar(detalle_pandas))
+        return detalle_pandas
+
+    def test_pbf(self):
+        detalle = self.comparar(PBF(), "2023-01-01", "2023-12-31", self.UPS)
+        self.assertEqual(len(detalle), 2 * (3 + 4 + 3)) #sin las horas 3a y 3b, y sin la hora 5 del dia de 23 horas (4 periodos)
+        self.assertIn("DST", detalle.columns)
+
+    def test_secundaria(self):
+        detalle = self.comparar(Secundaria(), "2023-03-26", "2023-10-29", self.UPS, ["Subir"])
+        self.assertIn("SENTIDO_x", detalle.columns)
+        self.assertIn("SENTIDO_y", detalle.columns)
+
+    def test_restricciones(self):
+        for sentido in [None, ["Bajar"]]:
+            with self.subTest(sentido=sentido):
+                detalle = self.comparar(Restricciones(), "2023-03-26", "2023-10-29", ["ACE3"], sentido)
+                self.assertEqual(len(detalle), (4 + 4 + 5) * (1 if sentido else 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
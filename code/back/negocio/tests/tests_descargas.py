@@ -0,0 +1,480 @@
+import io
+import os
+import re
+import glob
+import contextlib
+import json
+import time
+import tempfile
+import threading
+import zipfile
+import unittest
+import pandas as pd
+from unittest import mock
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from utilidades.esios import ESIOS
+from utilidades.omie import OMIE
+from utilidades import descargas, parquet_dataset
+from utilidades.i90zip import i90ZIP
+
+PATRON_SESION = re.compile(r"PIB_EV_H_1_(\d)_")
+from negocio import funciones_daemon
+from negocio.catalogo_procesados import CatalogoProcesados
+
+
+class ServidorPrueba:
+    """
+    Local stand-in of api.esios.ree.es or omie.es that records the maximum number of simultaneous requests.
+    """
+
+    def __init__(self, responder, retardo=0.05):
+        self.responder = responder
+        self.retardo = retardo
+        self.en_curso = 0
+        self.max_en_curso = 0
+        self.peticiones = 0
+        self._lock = threading.Lock()
+
+        servidor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with servidor._lock:
+                    servidor.en_curso += 1
+                    servidor.peticiones += 1
+                    servidor.max_en_curso = max(servidor.max_en_curso, servidor.en_curso)
+                try:
+                    time.sleep(servidor.retardo)
+                    respuesta = servidor.responder(self.path, self.headers)
+                    estado, cabeceras, cuerpo = respuesta if isinstance(respuesta, tuple) else (200 if respuesta is not None else 404, {}, respuesta)
+                    self.send_response(estado)
+                    for cabecera, valor in cabeceras.items():
+                        self.send_header(cabecera, valor)
+                    if "Content-Length" not in cabeceras: #una Content-Length mayor que el cuerpo simula una descarga interrumpida
+                        self.send_header("Content-Length", str(len(cuerpo or b"")))
+                    self.end_headers()
+                    self.wfile.write(cuerpo or b"")
+                finally:
+                    with servidor._lock:
+                        servidor.en_curso -= 1
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self.hilo = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.hilo.start()
+
+    def cerrar(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def respuesta_esios(path, headers=None):
+    """JSON of an indicator with one value per hour from start_date to end_date, both included (as ESIOS, days in Madrid time and datetimes in UTC)."""
+    url = urlparse(path)
+    query = parse_qs(url.query)
+    madrid = ZoneInfo("Europe/Madrid")
+    inicio = datetime.strptime(query["start_date"][0], "%Y-%m-%d").replace(tzinfo=madrid).astimezone(timezone.utc)
+    fin = (datetime.strptime(query["end_date"][0], "%Y-%m-%d") + timedelta(days=1)).replace(tzinfo=madrid).astimezone(timezone.utc)
+    valores = []
+    while inicio < fin:
+        valores.append({"value": 50.0 + inicio.hour, "datetime_utc": inicio.strftime("%Y-%m-%dT%H:%M:%SZ"), "geo_id": 3})
+        inicio += timedelta(hours=1)
+    return json.dumps({"indicator": {"id": int(url.path.split("/")[-1]), "values": valores}}).encode()
+
+
+def respuesta_omie(path, headers=None):
+    """TXT of the diario (25 columns) or of a session of the intradiario after 2024-07-14 (24 columns)."""
+    if "INT_PBC_EV_H_1" in path:
+        cabecera, precios = ";".join(str(h) for h in range(1, 26)), ";".join(f"{50 + h},5" for h in range(24)) + ";"
+    elif "INT_IDA_PIB_EV_H_1" in path:
+        cabecera, precios = ";".join(str(h) for h in range(1, 25)) + ";", ";".join(f"{60 + h},25" for h in range(24)) + ";"
+    else:
+        return None
+    return f"OMIE - Mercado de electricidad;\nPrecios;\nFecha;{cabecera}\nPrecio marginal (EUR/MWh);{precios}\n".encode("latin1")
+
+
+class TestDescargasConcurrentes(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.esios = ServidorPrueba(respuesta_esios)
+        self.omie = ServidorPrueba(respuesta_omie)
+        self.patches = [mock.patch.object(ESIOS, "url_base", self.esios.url), mock.patch.object(OMIE, "url_base", self.omie.url)]
+        for patch in self.patches:
+            patch.start()
+        self.fechas = ["2024-10-01", "2024-10-02", "2024-10-03"]
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        self.esios.cerrar()
+        self.omie.cerrar()
+        self.tmp.cleanup()
+
+    def ficheros(self, carpeta):
+        ficheros = {}
+        for root, _, files in os.walk(carpeta):
+            for file in files:
+                with open(os.path.join(root, file)) as f:
+                    ficheros[os.path.relpath(os.path.join(root, file), carpeta)] = f.read()
+        return ficheros
+
+    def test_same_files_as_sequential(self):
+        carpeta_secuencial = os.path.join(self.tmp.name, "secuencial")
+        carpeta_concurrente = os.path.join(self.tmp.name, "concurrente")
+
+        funciones_daemon.descargador_precios(carpeta_secuencial, None, None, list(self.fechas))
+        funciones_daemon.descargador_precios(carpeta_concurrente, None, None, list(self.fechas), concurrente=True, max_workers=6)
+
+        secuencial = self.ficheros(carpeta_secuencial)
+        self.assertEqual(len(secuencial), 5 * len(self.fechas))
+        self.assertIn(os.path.join("OMIE", "Mfrr", "2024", "2024-10-02_precios_terciaria.csv"), secuencial)
+        self.assertEqual(self.ficheros(carpeta_concurrente), secuencial)
+
+    def test_max_descargas_host(self):
+        limites = {urlparse(self.esios.url).netloc: 2, urlparse(self.omie.url).netloc: 1}
+        funciones_daemon.descargador_precios(self.tmp.name, None, None, list(self.fechas), concurrente=True, max_workers=6,
+                                             max_descargas_host=limites)
+
+        self.assertEqual(self.esios.max_en_curso, 2) #3 tareas de ESIOS (una ventana de rr, afrr y mfrr) con 6 hilos
+        self.assertEqual(self.omie.max_en_curso, 1)
+        self.assertEqual(self.esios.peticiones, 4) #una peticion por indicador para toda la ventana: rr y afrr un indicador, mfrr dos
+        self.assertEqual(self.omie.peticiones, 3 * 4) #diario un fichero, intradiario tres sesiones
+        self.assertEqual(len(self.ficheros(self.tmp.name)), 5 * len(self.fechas))
+
+    def test_ventanas_descarga(self):
+        fechas = ["2024-10-05", "2024-10-01", "2024-10-02", "2024-10-03", "2024-10-02"]
+        self.assertEqual(funciones_daemon.ventanas_descarga("rr", fechas, max_dias=2), [["2024-10-01", "2024-10-02"], ["2024-10-03"], ["2024-10-05"]])
+        self.assertEqual(funciones_daemon.ventanas_descarga("diario", fechas), [["2024-10-01"], ["2024-10-02"], ["2024-10-03"], ["2024-10-05"]])
+
+    def test_esios_window_same_as_per_day(self):
+        fechas = [(datetime(2024, 10, 20) + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(10)] #incluye el cambio de hora del 27/10
+        esios = ESIOS()
+        for market_key, download_function in [("rr", esios.download_precios_balance_rr), ("mfrr", esios.download_precios_terciaria_media_ponderada)]:
+            carpeta_dia = os.path.join(self.tmp.name, "dia")
+            carpeta_ventana = os.path.join(self.tmp.name, "ventana")
+            inicio = self.esios.peticiones
+            for fecha in fechas:
+                funciones_daemon.download_prices_date(market_key, download_function, carpeta_dia, fecha)
+            peticiones = self.esios.peticiones - inicio
+            inicio = self.esios.peticiones
+
+            self.assertEqual(funciones_daemon.download_prices_window(market_key, download_function, carpeta_ventana, fechas), len(fechas))
+            self.assertEqual(self.esios.peticiones - inicio, peticiones // len(fechas)) #una peticion por indicador
+            self.assertEqual(self.ficheros(carpeta_ventana), self.ficheros(carpeta_dia))
+
+    def test_concurrent_faster_than_sequential(self):
+        inicio = time.perf_counter()
+        funciones_daemon.descargador_precios(os.path.join(self.tmp.name, "secuencial"), None, None, list(self.fechas))
+        secuencial = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        funciones_daemon.descargador_precios(os.path.join(self.tmp.name, "concurrente"), None, None, list(self.fechas), concurrente=True)
+        concurrente = time.perf_counter() - inicio
+
+        self.assertLess(concurrente, secuencial)
+
+    def test_direct_curated_same_as_raw_csv(self):
+        catalogo = CatalogoProcesados(os.path.join(self.tmp.name, "logs", "processed_files.sqlite"))
+        self.addCleanup(catalogo.cerrar)
+        mercados = [os.path.join("OMIE", mercado) for mercado in ["Diario", "Intradiario", "Rr", "Afrr", "Mfrr"]]
+
+        #CSV raw + process_raw_files
+        carpeta_csv = os.path.join(self.tmp.name, "csv")
+        with contextlib.redirect_stdout(io.StringIO()):
+            funciones_daemon.descargador_precios(os.path.join(carpeta_csv, "raw"), None, None, list(self.fechas))
+            funciones_daemon.process_raw_files(None, [os.path.join(carpeta_csv, "raw", mercado) for mercado in mercados], None, None, list(self.fechas),
+                                               catalogo=CatalogoProcesados(os.path.join(carpeta_csv, "processed_files.sqlite")))
+
+        #modo directo
+        carpeta_directo = os.path.join(self.tmp.name, "directo")
+        with mock.patch.object(funciones_daemon, "load_catalogo_procesados", return_value=catalogo), contextlib.redirect_stdout(io.StringIO()):
+            funciones_daemon.descargador_precios(os.path.join(carpeta_directo, "raw"), None, None, list(self.fechas), concurrente=True, directo=True,
+                                                 carpeta_curated=os.path.join(carpeta_directo, "curated"))
+
+        for market_key, (_, stem) in funciones_daemon.PRICE_MARKETS.items():
+            directo = parquet_dataset.read_dataset(funciones_daemon.curated_price_dataset_path(os.path.join(carpeta_directo, "curated"), market_key, "2024"))
+            desde_csv = parquet_dataset.read_dataset(funciones_daemon.curated_price_dataset_path(os.path.join(carpeta_csv, "curated"), market_key, "2024"))
+            pd.testing.assert_frame_equal(directo, desde_csv)
+
+            #el raw se archiva comprimido en vez del CSV
+            raw = sorted(os.listdir(os.path.join(carpeta_directo, "raw", "OMIE", market_key.capitalize(), "2024")))
+            self.assertEqual(raw, [f"{fecha}_{stem}.csv.gz" for fecha in self.fechas])
+            self.assertEqual(catalogo.get(raw[0])["rows"], len(directo) // len(self.fechas))
+
+        #precios sin cambios: no se reescriben y process_raw_files omite los archivos
+        fragmentos = {path: os.stat(path).st_mtime_ns for path in glob.glob(os.path.join(carpeta_directo, "curated", "**", "*.parquet"), recursive=True)}
+        with mock.patch.object(funciones_daemon, "load_catalogo_procesados", return_value=catalogo), contextlib.redirect_stdout(io.StringIO()):
+            funciones_daemon.descargador_precios(os.path.join(carpeta_directo, "raw"), None, None, list(self.fechas), directo=True,
+                                                 carpeta_curated=os.path.join(carpeta_directo, "curated"))
+            resumen = funciones_daemon.process_raw_files(None, [os.path.join(carpeta_directo, "raw", mercado) for mercado in mercados], None, None,
+                                                         list(self.fechas), catalogo=catalogo)
+        self.assertEqual({path: os.stat(path).st_mtime_ns for path in fragmentos}, fragmentos)
+        self.assertEqual(resumen, {"procesados": 0, "omitidos": 5 * len(self.fechas), "errores": 0})
+
+
+class TestDescargas(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.contenido = b"PK zip de prueba"
+        self.errores = 0 #respuestas 503 antes de responder
+
+        def responder(path, headers):
+            if self.errores > 0:
+                self.errores -= 1
+                return 503, {}, b""
+            if headers.get("If-None-Match") == '"v1"' and self.contenido == b"PK zip de prueba":
+                return 304, {}, b""
+            return 200, {"ETag": '"v1"' if self.contenido == b"PK zip de prueba" else '"v2"'}, self.contenido
+
+        self.servidor = ServidorPrueba(responder, retardo=0)
+        self.url = self.servidor.url + "/archives/34/download"
+        self.ruta = os.path.join(self.tmp.name, "I90DIA_20240601.zip")
+
+    def tearDown(self):
+        self.servidor.cerrar()
+        self.tmp.cleanup()
+
+    def test_retry_on_5xx(self):
+        self.errores = 2
+        r = descargas.get(self.url)
+        self.assertEqual(r.content, self.contenido)
+        self.assertEqual(self.servidor.peticiones, 3)
+
+    def test_session_per_thread(self):
+        sesiones = []
+        hilo = threading.Thread(target=lambda: sesiones.append(descargas.get_session()))
+        hilo.start()
+        hilo.join()
+        self.assertIs(descargas.get_session(), descargas.get_session())
+        self.assertIsNot(sesiones[0], descargas.get_session())
+
+    def test_conditional_download(self):
+        self.assertTrue(descargas.download_file(self.url, self.ruta))
+        mtime = os.stat(self.ruta).st_mtime_ns
+        self.assertEqual(descargas.read_metadata(self.tmp.name)["I90DIA_20240601.zip"]["etag"], '"v1"')
+
+        self.assertFalse(descargas.download_file(self.url, self.ruta)) #304 Not Modified
+        self.assertEqual(os.stat(self.ruta).st_mtime_ns, mtime)
+
+        self.contenido = b"PK zip de prueba v2"
+        self.assertTrue(descargas.download_file(self.url, self.ruta))
+        with open(self.ruta, "rb") as f:
+            self.assertEqual(f.read(), self.contenido)
+
+    def test_unchanged_content_not_rewritten(self):
+        self.assertTrue(descargas.download_file(self.url, self.ruta, conditional=False))
+        mtime = os.stat(self.ruta).st_mtime_ns
+        self.assertFalse(descargas.download_file(self.url, self.ruta, conditional=False)) #200 con el mismo contenido
+        self.assertEqual(os.stat(self.ruta).st_mtime_ns, mtime)
+        self.assertEqual(sorted(os.listdir(self.tmp.name)), sorted([descargas.METADATA_FILENAME, "I90DIA_20240601.zip"]))
+
+
+class TestEsiosValores(unittest.TestCase):
+
+    def datos(self, freq):
+        fechas = pd.date_range(pd.Timestamp("2024-10-26", tz="Europe/Madrid"), pd.Timestamp("2024-10-28", tz="Europe/Madrid"), freq=freq, inclusive="left")
+        return {"indicator": {"values": [{"value": float(i), "datetime_utc": f.tz_convert("UTC").strftime("%Y-%m-%dT%H:%M:%SZ"), "geo_id": 3}
+                                         for i, f in enumerate(fechas)]}}
+
+    def test_local_dates_dst(self):
+        valores = ESIOS().valores_a_dataframe(self.datos("h"))
+        self.assertEqual(valores.groupby("FECHA").size().to_dict(), {"2024-10-26": 24, "2024-10-27": 25}) #dia de 25 horas
+        self.assertEqual(valores["HORA_LOCAL"].iloc[:3].tolist(), [0, 1, 2])
+        dia_25 = valores[valores["FECHA"] == "2024-10-27"]
+        self.assertEqual(list(zip(dia_25["HORA_LOCAL"], dia_25["DST"]))[1:5], [(1, 0), (2, 1), (2, 2), (3, 0)]) #la hora 2 dos veces
+        self.assertEqual(valores.loc[valores["FECHA"] == "2024-10-26", "DST"].unique().tolist(), [0])
+
+    def test_precios_dia_25_horas(self):
+        #los dos PERIODO 3 de los precios horarios del dia de 25 horas se guardan los dos en el dataset
+        esios = ESIOS()
+        with mock.patch.object(esios, "descargar_indicador", return_value=self.datos("h")):
+            df = esios.download_precios_secundaria("2024-10-26", "2024-10-27")
+        with tempfile.TemporaryDirectory() as tmp:
+            parquet_dataset.write_fragments(df, tmp, parquet_dataset.PRICE_DEDUP_KEY)
+            result = parquet_dataset.read_dataset(tmp)
+        dia_25 = result[result["FECHA"].astype(str) == "2024-10-27"]
+        self.assertEqual(len(dia_25), 25)
+        self.assertEqual(dia_25.loc[dia_25["PERIODO"] == 3, "PRECIO"].tolist(), [26.0, 27.0])
+
+    def test_periodos(self):
+        esios = ESIOS()
+        valores = esios.valores_a_dataframe(self.datos("15min"))
+        periodos = esios.periodos(valores, esios.es_cuartohorario(valores))
+        self.assertEqual(periodos[:5].tolist(), [1, 2, 3, 4, 5])
+        self.assertEqual(periodos[95], 96)
+
+        valores = esios.valores_a_dataframe(self.datos("h"))
+        self.assertEqual(esios.periodos(valores, esios.es_cuartohorario(valores))[:24].tolist(), list(range(1, 25)))
+        self.assertEqual(esios.periodos(valores, esios.es_cuartohorario(valores, "2024-10-27"))[24:26].tolist(), [1, 5]) #cuartohorario desde fecha_inicio_qh
+
+
+def fichero_omie(nombre, sesion=None):
+    """TXT of OMIE: diario and INT_IDA_PIB with 24 columns, INT_PIB (7 sessions) with 28 (hours 21-24 of the previous day first)."""
+    n_columnas = 28 if "INT_PIB" in nombre else 24
+    semilla = sum(ord(c) for c in nombre)
+    precios = [f"{(semilla * (h + 7)) % 30000 / 100:.2f}".replace(".", ",") for h in range(n_columnas)]
+    if sesion is not None and sesion >= 3 and n_columnas == 28: #las sesiones 3-6 no cubren las primeras horas
+        precios[:4 * (sesion - 1)] = [""] * 4 * (sesion - 1)
+    cabecera = ";".join(str(h) for h in range(1, n_columnas + 1))
+    return f"OMIE - Mercado de electricidad;Fecha Emisión;\n;\nFecha;{cabecera};\nPrecio marginal en el sistema español (EUR/MWh);{';'.join(precios)};\n".encode("latin1")
+
+
+class TestOmieFicheros(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.carpeta = os.path.join(self.tmp.name, "txt")
+        os.makedirs(self.carpeta)
+        omie = OMIE()
+        for fecha in pd.date_range("2024-07-12", "2024-07-15"):
+            urls = [omie.url_precio_diario(fecha)]
+            urls += [omie.url_precio_intradiario(fecha, sesion, ida=False) for sesion in range(1, 7) if fecha <= datetime(2024, 7, 14)]
+            urls += [omie.url_precio_intradiario(fecha, sesion, ida=True) for sesion in range(1, 4) if fecha >= datetime(2024, 7, 14)]
+            for url in urls:
+                nombre = url.split("/")[-1]
+                sesion = PATRON_SESION.search(nombre)
+                with open(os.path.join(self.carpeta, nombre), "wb") as f:
+                    f.write(fichero_omie(nombre, int(sesion.group(1)) if sesion else None))
+
+        def responder(path, headers):
+            ruta = os.path.join(self.carpeta, path.split("/")[-1])
+            if not os.path.exists(ruta):
+                return None
+            with open(ruta, "rb") as f:
+                return f.read()
+
+        self.servidor = ServidorPrueba(responder, retardo=0)
+        self.patch = mock.patch.object(OMIE, "url_base", self.servidor.url)
+        self.patch.start()
+
+    def tearDown(self):
+        self.patch.stop()
+        self.servidor.cerrar()
+        self.tmp.cleanup()
+
+    def test_parse_formats(self):
+        omie = OMIE()
+        texto = fichero_omie("INT_PIB_EV_H_1_3_12_07_2024_12_07_2024.txt", 3).decode("latin1")
+        df = omie.parse_precio_intradiario(texto, datetime(2024, 7, 12), 3)
+        self.assertEqual(df["PERIODO"].tolist(), list(range(5, 25))) #sesion 3: sin las horas 1-4
+        self.assertEqual(omie.parse_precio_intradiario(texto, datetime(2024, 7, 11), 7)["PERIODO"].tolist(), [])
+
+        texto = fichero_omie("INT_PIB_EV_H_1_2_13_07_2024_13_07_2024.txt", 2).decode("latin1")
+        df = omie.parse_precio_intradiario(texto, datetime(2024, 7, 12), 7)
+        self.assertEqual(df["PERIODO"].tolist(), [21, 22, 23, 24])
+        self.assertEqual(df["PRECIO"].tolist(), omie.leer_precios(texto)[:4].tolist())
+
+        df = omie.parse_precio_diario(fichero_omie("INT_PBC_EV_H_1_12_07_2024_12_07_2024.txt").decode("latin1"), datetime(2024, 7, 12))
+        self.assertEqual(df["PERIODO"].tolist(), list(range(1, 25)))
+        self.assertEqual(df["PRECIO"].dtype, float)
+
+    def test_directory_same_as_download(self):
+        omie = OMIE()
+        descargado_diario = omie.download_precio_diario("2024-07-12", "2024-07-15")
+        descargado_intradiario = omie.download_precio_intradiario("2024-07-12", "2024-07-15")
+
+        directorio = omie.parse_directorio(self.carpeta)
+        intradiario = directorio["intradiario"]
+        self.assertEqual(intradiario["FECHA"].min(), "2024-07-11") #sesion 7 del 11/07 en el fichero de la sesion 2 del 12/07
+        intradiario = intradiario[intradiario["FECHA"] >= "2024-07-12"]
+        self.assertEqual(directorio["diario"].to_csv(index=False), descargado_diario.to_csv(index=False))
+        self.assertEqual(intradiario.to_csv(index=False), descargado_intradiario.to_csv(index=False))
+        self.assertEqual(intradiario.groupby("FECHA")["SESION"].max().tolist(), [7, 7, 3, 3])
+
+    def test_ingest_zip_same_as_raw_csv(self):
+        #archivo anual con un zip por mes con los TXT de cada dia
+        ruta_zip = os.path.join(self.tmp.name, "omie_2024.zip")
+        with zipfile.ZipFile(ruta_zip, "w") as anual:
+            buffer = io.BytesIO()
+            with zipfile.ZipFile(buffer, "w") as mensual:
+                for nombre in os.listdir(self.carpeta):
+                    mensual.write(os.path.join(self.carpeta, nombre), nombre)
+            anual.writestr("MES_07.zip", buffer.getvalue())
+
+        carpeta_curated = os.path.join(self.tmp.name, "curated")
+        n_rows = funciones_daemon.ingest_omie_bulk(ruta_zip, carpeta_curated)
+        self.assertEqual(n_rows, {"diario": 4 * 24, "intradiario": len(OMIE().parse_directorio(self.carpeta)["intradiario"])})
+
+        #mismo resultado que los CSV raw de cada dia procesados con save_csv_to_parquet
+        carpeta_raw = os.path.join(self.tmp.name, "raw")
+        fechas = {market_key: ["2024-07-12", "2024-07-13", "2024-07-14", "2024-07-15"] for market_key in ["diario", "intradiario"]}
+        omie = OMIE()
+        for market_key in ["diario", "intradiario"]:
+            with contextlib.redirect_stdout(io.StringIO()):
+                funciones_daemon.download_prices(market_key, getattr(omie, funciones_daemon.PRICE_MARKETS[market_key][0]), carpeta_raw, fechas)
+            dataset_csv = os.path.join(self.tmp.name, "curated_csv", f"precios_{market_key}")
+            for csv in sorted(glob.glob(os.path.join(carpeta_raw, "OMIE", market_key.capitalize(), "2024", "*.csv"))):
+                funciones_daemon.save_csv_to_parquet(dataset_csv, csv)
+
+            directo = parquet_dataset.read_dataset(os.path.join(carpeta_curated, "OMIE", market_key.capitalize(), "2024", f"precios_{market_key}"))
+            directo = directo[directo["FECHA"] >= datetime(2024, 7, 12).date()].reset_index(drop=True) #el 11/07 solo tiene la sesion 7 en el zip
+            desde_csv = parquet_dataset.read_dataset(dataset_csv)
+            pd.testing.assert_frame_equal(directo, desde_csv)
+
+
+class TestDescargaStreaming(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        zip_buffer = io.BytesIO()
+        with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_STORED) as z:
+            z.writestr("I90DIA_20240601.xls", os.urandom(64 * 1024))
+        self.contenido = zip_buffer.getvalue()
+        self.cortar = True #la primera respuesta se corta a la mitad
+        self.rangos = []
+
+        def responder(path, headers):
+            rango = headers.get("Range")
+            self.rangos.append(rango)
+            if self.cortar:
+                self.cortar = False
+                return 200, {"Content-Length": str(len(self.contenido))}, self.contenido[:len(self.contenido) // 2]
+            if rango:
+                inicio = int(rango.replace("bytes=", "").split("-")[0])
+                return 206, {"Content-Range": f"bytes {inicio}-{len(self.contenido) - 1}/{len(self.contenido)}"}, self.contenido[inicio:]
+            return 200, {}, self.contenido
+
+        self.servidor = ServidorPrueba(responder, retardo=0)
+        self.patch = mock.patch.object(i90ZIP, "url_base", self.servidor.url)
+        self.patch.start()
+
+    def tearDown(self):
+        self.patch.stop()
+        self.servidor.cerrar()
+        self.tmp.cleanup()
+
+    def test_resume_interrupted_download(self):
+        ruta = os.path.join(self.tmp.name, "I90DIA_20240601.zip")
+        self.assertTrue(descargas.download_file(self.servidor.url + "/archives/34/download", ruta, validate=zipfile.is_zipfile, chunk_size=1024))
+
+        with open(ruta, "rb") as f:
+            self.assertEqual(f.read(), self.contenido)
+        self.assertEqual(self.rangos[0], None)
+        self.assertGreater(int(self.rangos[1].replace("bytes=", "").rstrip("-")), 0) #se reanuda desde lo ya escrito
+        self.assertFalse(os.path.exists(ruta + ".part"))
+
+    def test_invalid_file_not_renamed(self):
+        self.cortar = False
+        self.contenido = b"<html>Error</html>"
+        ruta = os.path.join(self.tmp.name, "I90DIA_20240601.zip")
+        with self.assertRaises(ValueError):
+            descargas.download_file(self.servidor.url + "/archives/34/download", ruta, validate=zipfile.is_zipfile)
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+    def test_i90_default_year_folder(self):
+        obj = i90ZIP(os.path.join(os.path.dirname(descargas.__file__), "config.yml"), self.tmp.name)
+        self.assertTrue(obj.descargar_fichero(datetime(2024, 6, 1)))
+        self.assertTrue(zipfile.is_zipfile(os.path.join(self.tmp.name, "2024", "I90DIA_20240601.zip")))
+        self.assertFalse(obj.descargar_fichero(datetime(2024, 6, 1))) #mismo contenido, no se reescribe
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,199 @@
+import io
+import os
+import glob
+import tempfile
+import zipfile
+import unittest
+import yaml
+import xlwt
+import pandas as pd
+from utilidades import i90zip, parquet_dataset
+from utilidades.i90zip import i90ZIP
+
+FICHERO_CONFIG = os.path.join(os.path.dirname(i90zip.__file__), "config.yml")
+HOJAS_PRUEBA = ["I90DIA26", "I90DIA02"] #PBF horario y P48 cuartohorario
+
+
+def valor_celda(i, k, factor=1.0):
+    """
+    Value of the cell of the UP i and the hour (or period) k of the test workbooks: integral, decimal, number stored
+    as text or empty. The second hour has no values in any UP.
+    """
+    if k == 1 or (i + k) % 4 == 3:
+        return None
+    if (i + k) % 4 == 0:
+        return (k + 1) * factor
+    if (i + k) % 4 == 1:
+        return round((k + 1) * 1.25 * factor, 3)
+    return str((k + 1) * factor)
+
+
+def libro_i90(fecha, n_hours, ups, qh_p48=True, factor=1.0):
+    """
+    I90 workbook with the PBF (hourly) and P48 (quarter hourly) sheets of some UPs: 3 title rows, the header row
+    and one row per UP with the fixed columns of config.yml before the hour columns.
+    """
+    horas = i90zip.obtener_lista_horas(n_hours)
+    periodos = i90zip.obtener_lista_horas(n_hours, cuartohorario=True) if qh_p48 else horas
+    libro = xlwt.Workbook()
+    for nombre, fijas, columnas in [("I90DIA26", ["UPROG", "OFERTA", "TRANSACCION", "HORA", "TOTAL"], horas),
+                                    ("I90DIA02", ["UPROG", "TIPO_OFERTA", "", ""], periodos)]:
+        hoja = libro.add_sheet(nombre)
+        hoja.write(0, 0, f"Resultado {nombre} {fecha}")
+        hoja.write(2, 0, "Fecha")
+        hoja.write(2, 1, fecha)
+        for j, cabecera in enumerate(fijas + columnas):
+            hoja.write(3, j, cabecera)
+        for i, up in enumerate(ups):
+            fila = 4 + i
+            hoja.write(fila, 0, up)
+            hoja.write(fila, 1, 1 if nombre == "I90DIA26" else "PROG")
+            if nombre == "I90DIA26":
+                hoja.write(fila, 2, "T1")
+            for k in range(len(columnas)):
+                valor = valor_celda(i, k, factor)
+                if valor is not None:
+                    hoja.write(fila, len(fijas) + k, valor)
+    buffer = io.BytesIO()
+    libro.save(buffer)
+    return buffer.getvalue()
+
+
+def escribir_zip(carpeta, fecha, n_hours, ups, **kwargs):
+    """
+    Write the I90DIA_YYYYMMDD.zip of a date (with the I90DIA_YYYYMMDD.xls workbook) and return its name.
+    """
+    nombre = f"I90DIA_{fecha.replace('-', '')}"
+    with zipfile.ZipFile(os.path.join(carpeta, f"{nombre}.zip"), "w") as z:
+        z.writestr(f"{nombre}.xls", libro_i90(fecha, n_hours, ups, **kwargs))
+    return f"{nombre}.zip"
+
+
+class TestI90Base(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        #config.yml con solo las hojas de los libros de prueba
+        with open(FICHERO_CONFIG, "r") as f:
+            params = yaml.load(f, Loader=yaml.FullLoader)
+        params["HOJAS"] = [hoja for hoja in params["HOJAS"] if hoja["NOMBRE"] in HOJAS_PRUEBA]
+        self.fichero_config = os.path.join(self.tmp.name, "config.yml")
+        with open(self.fichero_config, "w") as f:
+            yaml.dump(params, f)
+        self.carpeta_raw = os.path.join(self.tmp.name, "raw")
+        self.carpeta_salida = os.path.join(self.tmp.name, "curated")
+        os.makedirs(self.carpeta_raw)
+        os.makedirs(self.carpeta_salida)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def fragmentos(self, dataset):
+        fragmentos = {}
+        for path in sorted(glob.glob(os.path.join(self.carpeta_salida, dataset, "*.parquet"))):
+            with open(path, "rb") as f:
+                fragmentos[os.path.basename(path)] = (os.stat(path).st_mtime_ns, f.read())
+        return fragmentos
+
+
+class TestLectorRapido(TestI90Base):
+
+    UPS = ["ABA1", "ACE3", "BES5", "CTN4"]
+
+    def leer(self, fecha, n_hours, lector_rapido, lista_uprog=None):
+        obj = i90ZIP(self.fichero_config, self.carpeta_raw, lector_rapido=lector_rapido)
+        filename = f"I90DIA_{fecha.replace('-', '')}.xls"
+        hojas = obj.leer_fichero_zip(obj.HOJAS, filename, libro_i90(fecha, n_hours, self.UPS), lista_uprog=lista_uprog)
+        return {hoja["NOMBRE"]: pd.concat(hoja["DATA"], ignore_index=True) for hoja in hojas}
+
+    def comprobar_valores(self, df, n_hours, cuartohorario, ups):
+        """
+        The non empty rows are the cells of the workbook, and every hour (also the empty one) is in the output.
+        """
+        horas = i90zip.obtener_lista_horas(n_hours, cuartohorario=cuartohorario)
+        esperado = sorted((up, horas[k], float(valor_celda(self.UPS.index(up), k)))
+                          for up in ups for k in range(len(horas)) if valor_celda(self.UPS.index(up), k) is not None)
+        con_valor = df.dropna(subset=["ENERGIA"])
+        self.assertEqual(sorted(zip(con_valor["UPROG"].astype(str), con_valor["HORA"].astype(str), con_valor["ENERGIA"])), esperado)
+        self.assertEqual(list(df["HORA"].astype(str).unique()), horas)
+        self.assertEqual(df["ENERGIA"].dtype, "float64")
+
+    def test_mismo_resultado_que_pandas(self):
+        for fecha, n_hours in [("2023-03-26", 23), ("2023-06-14", 24), ("2023-10-29", 25)]:
+            for lista_uprog in [None, ["ACE3", "CTN4"], ["NOEXISTE"]]:
+                with self.subTest(fecha=fecha, lista_uprog=lista_uprog):
+                    rapido = self.leer(fecha, n_hours, True, lista_uprog)
+                    pandas = self.leer(fecha, n_hours, False, lista_uprog)
+                    for nombre in HOJAS_PRUEBA:
+                        pd.testing.assert_frame_equal(rapido[nombre], pandas[nombre])
+                        if lista_uprog != ["NOEXISTE"]:
+                            self.comprobar_valores(rapido[nombre], n_hours, nombre == "I90DIA02", lista_uprog or self.UPS)
+                        else: #sin coincidencias: una fila vacia por hora
+                            self.assertEqual(len(rapido[nombre]), len(i90zip.obtener_lista_horas(n_hours, cuartohorario=nombre == "I90DIA02")))
+                            self.assertTrue(rapido[nombre]["ENERGIA"].isna().all())
+
+
+class TestUnirDatosIncremental(TestI90Base):
+
+    def test_reingest_replaces_only_that_day(self):
+        ups = ["ABA1", "ACE3", "BES5"]
+        obj = i90ZIP(self.fichero_config, self.carpeta_raw)
+        zips = [escribir_zip(self.carpeta_raw, fecha, 24, ups) for fecha in ["2024-06-13", "2024-06-14", "2024-06-15"]]
+        obj.generar_ficheros(zips, self.carpeta_salida, self.carpeta_raw)
+        antes = {dataset: self.fragmentos(dataset) for dataset in ["PROGRAMAS", "P48"]}
+        self.assertEqual(sorted(antes["PROGRAMAS"]), ["2024-06-13.parquet", "2024-06-14.parquet", "2024-06-15.parquet"])
+
+        #nueva version del 14/06 con otros valores
+        escribir_zip(self.carpeta_raw, "2024-06-14", 24, ups, factor=2.0)
+        i90ZIP(self.fichero_config, self.carpeta_raw).generar_ficheros([zips[1]], self.carpeta_salida, self.carpeta_raw)
+
+        for dataset in ["PROGRAMAS", "P48"]:
+            despues = self.fragmentos(dataset)
+            self.assertEqual(despues["2024-06-13.parquet"], antes[dataset]["2024-06-13.parquet"]) #ni se reescriben
+            self.assertEqual(despues["2024-06-15.parquet"], antes[dataset]["2024-06-15.parquet"])
+            self.assertNotEqual(despues["2024-06-14.parquet"], antes[dataset]["2024-06-14.parquet"])
+
+            #el fragmento del 14/06 tiene solo los datos nuevos: mismas filas, energias x2
+            nuevo = parquet_dataset.restore_float32(pd.read_parquet(os.path.join(self.carpeta_salida, dataset, "2024-06-14.parquet")))
+            anterior = parquet_dataset.restore_float32(pd.read_parquet(os.path.join(self.carpeta_salida, dataset, "2024-06-13.parquet")))
+            self.assertEqual(len(nuevo), len(anterior))
+            self.assertAlmostEqual(nuevo["ENERGIA"].sum(), 2 * anterior["ENERGIA"].sum(), places=3)
+
+        self.assertEqual(glob.glob(os.path.join(self.carpeta_salida, "*_temp.parquet")), [])
+
+
+class TestGenerarFicherosProcesos(TestI90Base):
+
+    FECHAS = [("2023-03-26", 23), ("2023-06-14", 24), ("2023-10-29", 25)]
+
+    def generar(self, n_procesos, carpeta_salida):
+        os.makedirs(carpeta_salida, exist_ok=True)
+        zips = [escribir_zip(self.carpeta_raw, fecha, n_hours, ["ABA1", "ACE3", "BES5"]) for fecha, n_hours in self.FECHAS]
+        i90ZIP(self.fichero_config, self.carpeta_raw, n_procesos=n_procesos).generar_ficheros(zips, carpeta_salida, self.carpeta_raw)
+        return {dataset: parquet_dataset.read_dataset(os.path.join(carpeta_salida, dataset)) for dataset in ["PROGRAMAS", "P48"]}
+
+    def test_procesos_mismo_resultado_que_serie(self):
+        serie = self.generar(1, os.path.join(self.tmp.name, "serie"))
+        procesos = self.generar(2, os.path.join(self.tmp.name, "procesos"))
+        for dataset in ["PROGRAMAS", "P48"]:
+            self.assertEqual(sorted(serie[dataset]["FECHA"].astype(str).unique()), [fecha for fecha, _ in self.FECHAS])
+            pd.testing.assert_frame_equal(procesos[dataset], serie[dataset])
+        self.assertEqual(glob.glob(os.path.join(self.tmp.name, "procesos", "*_temp.parquet")), [])
+
+    def test_borra_temporales_si_falla_un_proceso(self):
+        zips = [escribir_zip(self.carpeta_raw, "2024-06-13", 24, ["ABA1"]), "I90DIA_20240614.zip"]
+        with open(os.path.join(self.carpeta_raw, zips[1]), "wb") as f:
+            f.write(b"no es un zip") #descarga corrupta
+        otro_temporal = os.path.join(self.carpeta_salida, "I90DIA_20240615.zip_PROG_PBF_temp.parquet") #de otro zip, no se borra
+        open(otro_temporal, "w").close()
+
+        obj = i90ZIP(self.fichero_config, self.carpeta_raw, n_procesos=2)
+        with self.assertRaises(zipfile.BadZipFile):
+            obj.generar_ficheros(zips, self.carpeta_salida, self.carpeta_raw)
+
+        self.assertEqual(glob.glob(os.path.join(self.carpeta_salida, "*_temp.parquet")), [otro_temporal])
+        self.assertFalse(os.path.exists(os.path.join(self.carpeta_salida, "PROGRAMAS"))) #no se consolida un backfill incompleto
+
+
+if __name__ == '__main__':
+    unittest.main()
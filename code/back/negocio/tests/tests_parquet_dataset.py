@@ -0,0 +1,193 @@
+import os
+import glob
+import time
+import tempfile
+import unittest
+import pandas as pd
+from utilidades import parquet_dataset
+
+
+class TestParquetDataset(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dataset_path = os.path.join(self.tmp.name, "precios_rr")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_one_fragment_per_date(self):
+        df = pd.DataFrame({"FECHA": ["2024-01-01", "2024-01-01", "2024-01-02"], "PERIODO": [1, 2, 1], "PRECIO": [10.0, 11.0, 12.0]})
+        parquet_dataset.write_fragments(df, self.dataset_path, parquet_dataset.PRICE_DEDUP_KEY)
+
+        self.assertEqual(sorted(os.listdir(self.dataset_path)), ["2024-01-01.parquet", "2024-01-02.parquet"])
+        self.assertEqual(len(parquet_dataset.read_dataset(self.dataset_path)), 3)
+
+    def test_reingest_replaces_rows_with_same_key(self):
+        df = pd.DataFrame({"FECHA": ["2024-01-01", "2024-01-01"], "PERIODO": [1, 2], "PRECIO": [10.0, 11.0]})
+        parquet_dataset.write_fragments(df, self.dataset_path, parquet_dataset.PRICE_DEDUP_KEY)
+
+        df_revisado = pd.DataFrame({"FECHA": ["2024-01-01"], "PERIODO": [2], "PRECIO": [99.0]})
+        parquet_dataset.write_fragments(df_revisado, self.dataset_path, parquet_dataset.PRICE_DEDUP_KEY)
+
+        result = parquet_dataset.read_dataset(self.dataset_path).sort_values("PERIODO")
+        self.assertEqual(result["PRECIO"].tolist(), [10.0, 99.0])
+
+    def test_rows_written_after_dedup(self):
+        df = pd.DataFrame({"FECHA": ["2024-01-01"] * 3 + ["2024-01-02"], "PERIODO": [1, 2, 2, 1], "PRECIO": [10.0, 11.0, 12.0, 13.0]})
+        self.assertEqual(parquet_dataset.write_fragments(df, self.dataset_path, parquet_dataset.PRICE_DEDUP_KEY), 3) #PERIODO 2 repetido
+
+        #las filas que reemplazan a otras existentes cuentan como escritas, las existentes no
+        df_revisado = pd.DataFrame({"FECHA": ["2024-01-01", "2024-01-01"], "PERIODO": [2, 3], "PRECIO": [99.0, 14.0]})
+        self.assertEqual(parquet_dataset.write_fragments(df_revisado, self.dataset_path, parquet_dataset.PRICE_DEDUP_KEY), 2)
+        self.assertEqual(len(parquet_dataset.read_dataset(self.dataset_path)), 4)
+
+    def test_dedup_keeps_dst_hours(self):
+        #precios horarios del dia de 25 horas: 3a y 3b son HORA 3 con DST 1 y 2, no se deduplican entre si
+        df = pd.DataFrame({"FECHA": ["2023-10-29"] * 4, "HORA": ["2", "3a", "3b", "4"], "SENTIDO": "Subir", "PRECIO": [10.0, 11.0, 12.0, 13.0]})
+        self.assertEqual(parquet_dataset.write_fragments(df, self.dataset_path, parquet_dataset.PRICE_DEDUP_KEY), 4)
+
+        df_revisado = pd.DataFrame({"FECHA": ["2023-10-29"], "HORA": ["3b"], "SENTIDO": "Subir", "PRECIO": [99.0]})
+        parquet_dataset.write_fragments(df_revisado, self.dataset_path, parquet_dataset.PRICE_DEDUP_KEY)
+
+        result = parquet_dataset.read_dataset(self.dataset_path).sort_values(["HORA", "DST"])
+        self.assertEqual(list(zip(result["HORA"], result["DST"], result["PRECIO"])), [(2, 0, 10.0), (3, 1, 11.0), (3, 2, 99.0), (4, 0, 13.0)])
+
+    def test_dedup_keeps_repeated_periodo(self):
+        #precios horarios de ESIOS del dia de 25 horas: PERIODO 3 dos veces, separados solo por DST
+        df = pd.DataFrame({"FECHA": ["2024-10-27"] * 4, "PERIODO": [2, 3, 3, 4], "DST": [0, 1, 2, 0], "PRECIO": [10.0, 20.0, 30.0, 40.0]})
+        self.assertEqual(parquet_dataset.write_fragments(df, self.dataset_path, parquet_dataset.PRICE_DEDUP_KEY), 4)
+
+        result = parquet_dataset.read_dataset(self.dataset_path).sort_values(["PERIODO", "DST"])
+        self.assertEqual(list(zip(result["PERIODO"], result["DST"], result["PRECIO"])), [(2, 0, 10.0), (3, 1, 20.0), (3, 2, 30.0), (4, 0, 40.0)])
+
+        #fragmento escrito antes de tener DST: sus filas quedan con DST 0
+        pd.DataFrame({"FECHA": ["2024-10-28"], "PERIODO": [1], "PRECIO": [50.0]}).to_parquet(parquet_dataset.fragment_path(self.dataset_path, "2024-10-28"))
+        parquet_dataset.write_fragments(df.assign(FECHA="2024-10-28"), self.dataset_path, parquet_dataset.PRICE_DEDUP_KEY)
+        result = parquet_dataset.read_dataset(self.dataset_path)
+        self.assertEqual(result.loc[result["FECHA"].astype(str) == "2024-10-28", "DST"].tolist(), [0, 0, 1, 2, 0])
+
+    def test_split_parquet_to_dataset(self):
+        parquet_filepath = os.path.join(self.tmp.name, "precios_diario.parquet")
+        pd.DataFrame({"FECHA": ["2024-01-01", "2024-01-02"], "PERIODO": [1, 1], "PRECIO": [1.0, 2.0]}).to_parquet(parquet_filepath)
+
+        dataset_path = parquet_dataset.split_parquet_to_dataset(parquet_filepath, parquet_dataset.PRICE_DEDUP_KEY)
+
+        self.assertEqual(dataset_path, os.path.join(self.tmp.name, "precios_diario"))
+        self.assertEqual(len(parquet_dataset.read_dataset(dataset_path)), 2)
+
+    def test_migrate_monolithic_files(self):
+        carpeta_year = os.path.join(self.tmp.name, "2024")
+        os.makedirs(carpeta_year)
+        programas = os.path.join(carpeta_year, "PROGRAMAS.parquet")
+        pd.DataFrame({"UPROG": ["ABA1", "ACE3", "ACE3"], "FECHA": ["2024-01-01", "2024-01-02", "2024-01-02"], "HORA": [1, 1, 1],
+                      "PROGRAMA": "PBF", "ENERGIA": [1.0, 2.0, 2.0]}).to_parquet(programas)
+        pd.DataFrame({"UPROG": ["ABA1"]}).to_parquet(os.path.join(carpeta_year, "lista_up.parquet")) #sin FECHA, no es un fichero anual
+        #el 02/01 ya tiene fragmento (escrito por el daemon despues de pasar a datasets): se mantiene
+        parquet_dataset.write_fragments(pd.DataFrame({"UPROG": ["ACE3"], "FECHA": ["2024-01-02"], "HORA": [1], "PROGRAMA": "PBF", "ENERGIA": [5.0]}),
+                                        os.path.join(carpeta_year, "PROGRAMAS"))
+
+        self.assertEqual(parquet_dataset.migrate_monolithic_files(self.tmp.name), 1)
+
+        result = parquet_dataset.read_dataset(os.path.join(carpeta_year, "PROGRAMAS")).sort_values("FECHA")
+        self.assertEqual(list(zip(result["FECHA"].astype(str), result["UPROG"], result["ENERGIA"])), [("2024-01-01", "ABA1", 1.0), ("2024-01-02", "ACE3", 5.0)])
+        self.assertEqual(parquet_dataset.up_list(os.path.join(carpeta_year, "PROGRAMAS"), "2024-01-01", "2024-01-31"), ["ABA1", "ACE3"])
+        self.assertEqual(sorted(os.listdir(carpeta_year)), ["PROGRAMAS", "PROGRAMAS.parquet.migrado", "lista_up.parquet"])
+        self.assertEqual(parquet_dataset.migrate_monolithic_files(self.tmp.name), 0) #solo una vez
+
+    def test_curated_schema(self):
+        df = pd.DataFrame({"HORA": ["2", "3a", "3b"], "FECHA": ["2023-10-29"] * 3, "UPROG": ["ABA1", "ABA1", None], "OFERTA": [1, "2", 1], "ENERGIA": [1.5, 2.25, 3.0]})
+
+        result = parquet_dataset.apply_curated_schema(df)
+
+        self.assertEqual(result["HORA"].tolist(), [2, 3, 3])
+        self.assertEqual(result["DST"].tolist(), [0, 1, 2])
+        self.assertEqual(str(result["HORA"].dtype), "int16")
+        self.assertEqual(str(result["ENERGIA"].dtype), "float32")
+        self.assertEqual(str(result["FECHA"].iloc[0]), "2023-10-29")
+        self.assertIsInstance(result["UPROG"].dtype, pd.CategoricalDtype)
+        self.assertEqual(result["OFERTA"].tolist(), ["1", "2", "1"])
+        self.assertTrue(pd.isna(result["UPROG"].iloc[2]))
+
+        #idempotente: se vuelve a aplicar al fusionar con fragmentos existentes
+        pd.testing.assert_frame_equal(parquet_dataset.apply_curated_schema(result), result)
+
+    def test_up_index(self):
+        dataset_path = os.path.join(self.tmp.name, "PROGRAMAS")
+        df = pd.DataFrame({"FECHA": ["2024-01-01", "2024-01-02", "2024-01-02"], "HORA": [1, 1, 1], "UPROG": ["ABA1", "ABA1", "ACE3"], "PROGRAMA": ["PBF", "PBF", "PVP"], "ENERGIA": [1.0, 2.0, 3.0]})
+        parquet_dataset.write_fragments(df, dataset_path)
+        parquet_dataset.write_fragments(df.assign(FECHA="2024-01-05").iloc[[2]], dataset_path) #actualizacion incremental
+
+        self.assertNotIn(parquet_dataset.UP_INDEX_FILENAME, [os.path.basename(f) for f in glob.glob(parquet_dataset.dataset_glob(dataset_path))])
+        index = parquet_dataset.read_up_index(dataset_path)
+        self.assertEqual(index, {"PBF": {"ABA1": ["2024-01-01", "2024-01-02"]}, "PVP": {"ACE3": ["2024-01-02", "2024-01-05"]}})
+        self.assertEqual(index, parquet_dataset.build_up_index(dataset_path, write=False))
+
+        self.assertEqual(parquet_dataset.up_list(dataset_path, "2024-01-01", "2024-01-31"), ["ABA1", "ACE3"])
+        self.assertEqual(parquet_dataset.up_list(dataset_path, "2024-01-03", "2024-01-31"), ["ACE3"])
+        self.assertEqual(parquet_dataset.up_list(dataset_path, "2024-01-01", "2024-01-31", ["PBF"]), ["ABA1"])
+
+    def test_up_set_new_version(self):
+        dataset_path = os.path.join(self.tmp.name, "PROGRAMAS")
+        df = pd.DataFrame({"FECHA": ["2024-01-01"], "HORA": [1], "UPROG": ["ABA1"], "PROGRAMA": ["PBF"], "ENERGIA": [1.0]})
+        parquet_dataset.write_fragments(df, dataset_path)
+        self.assertEqual(parquet_dataset.up_set(parquet_dataset.dataset_glob(dataset_path)).tolist(), ["ABA1"])
+
+        time.sleep(0.01)
+        parquet_dataset.write_fragments(df.assign(UPROG="ACE3", FECHA="2024-01-02"), dataset_path) #nueva version del dataset
+        self.assertEqual(parquet_dataset.up_set(parquet_dataset.dataset_glob(dataset_path)).tolist(), ["ABA1", "ACE3"])
+
+
+class TestClusterRowGroups(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dataset_path = os.path.join(self.tmp.name, "PROGRAMAS")
+        #50 UPs x 24 horas x 14 programas = 16800 filas, mas de un row group (ROW_GROUP_SIZE = 16384)
+        ups = [f"UP{i:03d}" for i in range(50)]
+        programas = [f"PRG{i:02d}" for i in range(14)]
+        self.df = pd.DataFrame([(up, "2024-01-01", hora, programa, float(i)) for i, (up, hora, programa) in enumerate(
+            (up, hora, programa) for programa in programas for hora in range(24, 0, -1) for up in reversed(ups))],
+            columns=["UPROG", "FECHA", "HORA", "PROGRAMA", "ENERGIA"])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_cluster_rows(self):
+        df = pd.DataFrame({"PERIODO": [2, 1, 1, 1], "HORA": [1, 2, 1, 1], "FECHA": ["2024-01-02", "2024-01-01", "2024-01-01", "2024-01-01"],
+                           "UPROG": ["ABA1", "ABA1", "ABA1", "ACE3"], "PRECIO": [1.0, 2.0, 3.0, 4.0]})
+        result = parquet_dataset.cluster_rows(df)
+
+        #UPROG, FECHA, HORA, PERIODO (orden de CLUSTER_KEY, no el de las columnas)
+        self.assertEqual(result["PRECIO"].tolist(), [3.0, 2.0, 1.0, 4.0])
+        self.assertEqual(result.index.tolist(), [0, 1, 2, 3])
+        #solo las columnas de la clave que existen, y estable para las filas con la misma clave
+        self.assertEqual(parquet_dataset.cluster_rows(df[["FECHA", "PRECIO"]])["PRECIO"].tolist(), [2.0, 3.0, 4.0, 1.0])
+        precios = pd.DataFrame({"PRECIO": [2.0, 1.0]})
+        self.assertIs(parquet_dataset.cluster_rows(precios), precios)
+
+    def test_row_groups(self):
+        parquet_dataset.write_fragments(self.df, self.dataset_path)
+        path_glob = parquet_dataset.dataset_glob(self.dataset_path)
+
+        self.assertEqual(parquet_dataset.count_row_groups(path_glob, {}), {"files": 1, "row_groups": 2, "row_groups_read": 2})
+        #cada UP queda en un solo row group salvo la que cae en el corte (16384 / 336 filas por UP)
+        self.assertEqual(parquet_dataset.count_row_groups(path_glob, {"UPROG": ["UP000"]})["row_groups_read"], 1)
+        self.assertEqual(parquet_dataset.count_row_groups(path_glob, {"UPROG": ["UP049"]})["row_groups_read"], 1)
+        self.assertEqual(parquet_dataset.count_row_groups(path_glob, {"UPROG": ["UP048"]})["row_groups_read"], 2)
+        self.assertEqual(parquet_dataset.count_row_groups(path_glob, {"UPROG": ["UP000"], "FECHA": ("2024-01-02", "2024-01-31")})["row_groups_read"], 0)
+        self.assertEqual(parquet_dataset.count_row_groups(path_glob, {"UPROG": ["UP000", "UP049"], "FECHA": ("2024-01-01", "2024-01-01")})["row_groups_read"], 2)
+
+    def test_round_trip(self):
+        parquet_dataset.write_fragments(self.df, self.dataset_path)
+        result = parquet_dataset.restore_float32(parquet_dataset.read_dataset(self.dataset_path))
+
+        self.assertEqual(len(result), len(self.df))
+        self.assertTrue(result.equals(parquet_dataset.cluster_rows(result))) #escrito ya ordenado
+        ordenar = lambda df: df.assign(UPROG=df["UPROG"].astype(str), FECHA=df["FECHA"].astype(str), HORA=df["HORA"].astype(int),
+                                       PROGRAMA=df["PROGRAMA"].astype(str), ENERGIA=df["ENERGIA"].astype(float)).sort_values("ENERGIA", ignore_index=True)
+        pd.testing.assert_frame_equal(ordenar(result)[list(self.df.columns)], ordenar(self.df))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,259 @@
+import os
+import json
+import hashlib
+import threading
+from typing import Callable, Optional
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+TIMEOUT = (10, 120) #(conexion, lectura) en segundos
+POOL_MAXSIZE = 8 #conexiones keep-alive por host en cada sesion
+CHUNK_SIZE = 1024 * 1024 #bytes escritos a disco por bloque en las descargas de ficheros
+METADATA_FILENAME = "_descargas.json" #ETag, Last-Modified y hash de los ficheros descargados en cada carpeta (sin fecha en el nombre, el daemon no lo procesa)
+
+_local = threading.local()
+_metadata_lock = threading.Lock()
+
+
+def build_retry() -> Retry:
+    """
+    Retry policy of the sessions: exponential backoff on connection errors, 429 and 5xx responses,
+    honouring the Retry-After header of ESIOS/OMIE.
+
+    Returns:
+        Retry: The urllib3 retry configuration.
+    """
+    return Retry(
+        total=5,
+        backoff_factor=1, #0s, 2s, 4s, 8s... entre reintentos
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        respect_retry_after_header=True,
+        raise_on_status=False, #la ultima respuesta se devuelve y get() llama a raise_for_status
+    )
+
+
+def build_session() -> requests.Session:
+    """
+    Create a session with a pool of keep-alive connections and the retry policy of build_retry.
+
+    Returns:
+        requests.Session: The new session.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_MAXSIZE, max_retries=build_retry())
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    """
+    Get the session of the current thread (created on first use). Sessions are not shared between threads,
+    so the concurrent downloads of the daemon reuse their connections without locking.
+
+    Returns:
+        requests.Session: The session of the thread.
+    """
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = build_session()
+        _local.session = session
+    return session
+
+
+def get(url: str, headers: Optional[dict] = None, timeout=TIMEOUT, **kwargs) -> requests.Response:
+    """
+    GET request with the session of the thread, the default timeout and the retry policy.
+
+    Args:
+        url (str): The URL.
+        headers (dict): Optional. The headers of the request. i.e. {"x-api-key": token}
+        timeout: Optional. The (connect, read) timeout in seconds. Defaults to TIMEOUT.
+        **kwargs: Other arguments of requests.Session.get (i.e. stream=True).
+
+    Returns:
+        requests.Response: The response (304 Not Modified included).
+
+    Raises:
+        requests.HTTPError: If the response is a 4xx/5xx error after the retries.
+    """
+    r = get_session().get(url, headers=headers, timeout=timeout, **kwargs)
+    r.raise_for_status()
+    return r
+
+
+def sha256_bytes(data: bytes) -> str:
+    """
+    Hex SHA-256 of some content.
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+def sha256_file(path: str) -> Optional[str]:
+    """
+    Hex SHA-256 of a file, read in chunks.
+
+    Returns:
+        str: The hash, or None if the file does not exist.
+    """
+    if not os.path.exists(path):
+        return None
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def write_if_changed(path: str, data: bytes) -> bool:
+    """
+    Write a file only if its content changes, so unchanged files keep their modification time
+    and are not processed again. The file is written to a temporary file and renamed.
+
+    Args:
+        path (str): The path of the file.
+        data (bytes): The new content.
+
+    Returns:
+        bool: True if the file was written, False if it already had that content.
+    """
+    if sha256_file(path) == sha256_bytes(data):
+        return False
+
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return True
+
+
+def read_metadata(folder: str) -> dict:
+    """
+    Read the download metadata of a folder.
+
+    Args:
+        folder (str): The folder of the downloaded files.
+
+    Returns:
+        dict: {filename: {"url", "etag", "last_modified", "sha256"}}, empty if there is no metadata.
+    """
+    path = os.path.join(folder, METADATA_FILENAME)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def update_metadata(folder: str, filename: str, metadata: dict) -> None:
+    """
+    Store the download metadata of a file (read, update and atomic rewrite under a lock, the downloads run in threads).
+
+    Args:
+        folder (str): The folder of the file.
+        filename (str): The name of the file.
+        metadata (dict): The metadata of the file. i.e. {"url": ..., "etag": ..., "last_modified": ..., "sha256": ...}
+    """
+    with _metadata_lock:
+        metadatos = read_metadata(folder)
+        metadatos[filename] = metadata
+        tmp_path = os.path.join(folder, f"{METADATA_FILENAME}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(metadatos, f, indent=2)
+        os.replace(tmp_path, os.path.join(folder, METADATA_FILENAME))
+
+
+def download_file(url: str, path: str, headers: Optional[dict] = None, conditional: bool = True, validate: Optional[Callable[[str], bool]] = None,
+                  chunk_size: int = CHUNK_SIZE, max_reanudaciones: int = 3) -> bool:
+    """
+    Download a file streaming it to disk, skipping it if it has not changed.
+
+    The response is written in chunks to "<path>.part" (the memory used does not depend on the size of the file). If the
+    transfer is interrupted, it is resumed from the size of the .part file with a Range request (also by the next call,
+    i.e. the next run of the daemon). The complete file is checked with validate and atomically renamed to path.
+
+    If the file already exists, the ETag/Last-Modified of the previous download are sent (If-None-Match/If-Modified-Since)
+    and a 304 response is not downloaded again. If the server does not support conditional requests, the file is only
+    replaced when the hash of the content changes.
+
+    Args:
+        url (str): The URL of the file.
+        path (str): The path where the file is saved.
+        headers (dict): Optional. Other headers of the request.
+        conditional (bool): If True, send the conditional headers of the previous download. Defaults to True.
+        validate (callable): Optional. Check of the downloaded file (i.e. zipfile.is_zipfile), it receives the path of the .part file.
+        chunk_size (int): The size of the chunks written to disk. Defaults to CHUNK_SIZE.
+        max_reanudaciones (int): The maximum number of times an interrupted transfer is resumed. Defaults to 3.
+
+    Returns:
+        bool: True if the file was written, False if it has not changed.
+
+    Raises:
+        ValueError: If the downloaded file is not valid (the .part file is removed).
+        requests.RequestException: If the transfer fails more than max_reanudaciones times (the .part file is kept).
+    """
+    folder, filename = os.path.split(path)
+    part_path = f"{path}.part"
+    anterior = read_metadata(folder).get(filename, {}) if os.path.exists(path) else {}
+
+    headers = dict(headers or {})
+    if conditional and anterior.get("etag"):
+        headers["If-None-Match"] = anterior["etag"]
+    if conditional and anterior.get("last_modified"):
+        headers["If-Modified-Since"] = anterior["last_modified"]
+
+    reanudaciones = 0
+    reiniciado = False
+    respuesta_headers = {}
+    while True:
+        descargado = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers_peticion = dict(headers, Range=f"bytes={descargado}-") if descargado else headers
+
+        try:
+            with get_session().get(url, headers=headers_peticion, timeout=TIMEOUT, stream=True) as r:
+                if r.status_code == 304:
+                    if descargado:
+                        os.remove(part_path) #descarga interrumpida de una version que ya no es la del servidor
+                    return False
+                if not (r.status_code == 416 and descargado): #416: el .part ya tiene el fichero completo
+                    r.raise_for_status()
+                    #206: se continua el .part, 200: el servidor no admite Range y se empieza de cero
+                    with open(part_path, "ab" if r.status_code == 206 else "wb") as f:
+                        for chunk in r.iter_content(chunk_size=chunk_size):
+                            f.write(chunk)
+                    respuesta_headers = r.headers
+
+        except (requests.exceptions.ChunkedEncodingError, requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            reanudaciones += 1
+            if reanudaciones > max_reanudaciones:
+                raise
+            continue
+
+        if validate is not None and not validate(part_path):
+            os.remove(part_path)
+            if descargado and not reiniciado: #el .part de una descarga anterior no corresponde al fichero actual, se descarga entero
+                reiniciado = True
+                continue
+            raise ValueError(f"The downloaded file is not valid: {url}")
+        break
+
+    sha256 = sha256_file(part_path)
+    if sha256 == sha256_file(path):
+        os.remove(part_path)
+        escrito = False
+    else:
+        os.replace(part_path, path)
+        escrito = True
+
+    update_metadata(folder, filename, {
+        "url": url,
+        "etag": respuesta_headers.get("ETag") or anterior.get("etag"),
+        "last_modified": respuesta_headers.get("Last-Modified") or anterior.get("last_modified"),
+        "sha256": sha256,
+    })
+    return escrito
@@ -5,6 +5,7 @@ from dateutil import tz
 from datetime import timedelta
 import pytz
 import pandas as pd
+import numpy as np
 from sqlalchemy import create_engine
 import pymysql
 pymysql.install_as_MySQLdb()
@@ -26,21 +27,296 @@ import os
 import pretty_errors
 import io
 from openpyxl import load_workbook
+import xlrd
+from concurrent.futures import ProcessPoolExecutor
+import utilidades.parquet_dataset as parquet_dataset
+import utilidades.descargas as descargas
+
+
+def abrir_libro(filename, data, lector_rapido = False):
+    """
+    Opens the Excel file contained in an I90 ZIP file.
+
+    For .xls files the workbook is opened with xlrd on_demand, so each sheet is only loaded when it is parsed.
+
+    Parameters:
+    - filename (str): The name of the Excel file inside the ZIP file (i.e. "I90DIA_20240614.xls").
+    - data (bytes): The byte content of the Excel file.
+    - lector_rapido (bool): If True, .xls files are returned as a raw xlrd Book to be read with leer_hoja_xlrd.
+
+    Returns:
+    - pd.ExcelFile | xlrd.book.Book: The workbook ready to be parsed.
+    """
+    if filename.endswith('.xls'):
+        # For .xls files
+        libro = xlrd.open_workbook(file_contents=data, on_demand=True)
+        if lector_rapido:
+            return libro
+        return pd.ExcelFile(libro, engine='xlrd')
+    elif filename.endswith('.xlsx'):
+        # For .xlsx files
+        return pd.ExcelFile(io.BytesIO(data), engine='openpyxl')
+    else:
+        raise ValueError(f"Unsupported file format: {filename}")
+
+
+def obtener_lista_horas(n_hours, cuartohorario = False):
+    """
+    Gets the labels of the hour columns of an I90 sheet.
+
+    Parameters:
+    - n_hours (int): The number of hours of the date (23, 24 or 25).
+    - cuartohorario (bool): If True, returns the quarter hourly periods instead of the hours.
+
+    Returns:
+    - list: The hour labels as strings (i.e. ['1', '2', '3a', '3b', '4', ...] for a 25 hour day).
+    """
+    #depending on the number of hours of the given date, we are gonna create a list of quarter hourly periods
+    if n_hours == 24:
+        list_hours = list(map(str, range(1, 25))) #full set of hours 
+        list_hours_qh = list(map(str, range(1, 97)))
+    elif n_hours == 23:
+        list_hours = list(map(str, [1, 2] + list(range(4, 25)))) #we are skipping hour number "3"
+        list_hours_qh = list(map(str, range(1, 93)))
+    else:
+        list_hours = list(map(str, [1, 2] + ['3a', '3b'] + list(range(4, 25)))) #here, hour 3 is subdivided into "3a" and "3b"
+        list_hours_qh = list(map(str, range(1, 101)))  #converting quarter hourly string list to integer lsit using map function (same for every n-hours case)
+
+    return list_hours_qh if cuartohorario else list_hours
+
+
+def apilar_bloque(columnas_indice, bloque, list_hours, date, columnas_apiladas):
+    """
+    Reshapes a wide I90 sheet (one column per hour) to long format in a single vectorised pass.
+
+    The hour block is raveled hour by hour and the index columns are repeated to match, so the rows come out
+    ordered by HORA and then by the original row order. Empty cells are dropped, and hours without any value
+    keep a single row with only HORA and FECHA (same output as the left merge against the list of hours).
+    HORA and UPROG are returned as categoricals to keep the memory of the workbook low. The value column is
+    always float (the old stack kept the integral cells as int in an object column); it is cast to float32 by
+    apply_curated_schema before being written, so the curated files do not change.
+
+    Parameters:
+    - columnas_indice (dict): The index columns of the sheet {name: np.ndarray of length n_rows}.
+    - bloque (np.ndarray): The float values of the hour columns, shape (n_rows, len(list_hours)).
+    - list_hours (list): The hour labels of the columns of bloque.
+    - date (str): The date of the file in the format 'YYYY-MM-DD'.
+    - columnas_apiladas (list): The names of the hour and value columns (i.e. ['HORA', 'ENERGIA']).
+
+    Returns:
+    - pd.DataFrame: The long format table with columns HORA, FECHA, index columns and value column.
+    """
+    n_rows, n_horas = bloque.shape
+    if n_rows == 0: #sin filas (i.e. filtro de UPROG sin coincidencias): una fila vacia por hora
+        columnas_indice = {col: np.array([np.nan], dtype=object) for col in columnas_indice}
+        bloque = np.full((1, n_horas), np.nan)
+        n_rows = 1
+
+    valores = bloque.T.ravel() #orden hora a hora, igual que el merge con la lista de horas
+    mascara = ~np.isnan(valores)
+
+    #horas sin ningun valor: se conserva su primera fila, vaciada, para que la hora siga apareciendo
+    horas_vacias = np.flatnonzero(~mascara.reshape(n_horas, n_rows).any(axis=1))
+    marcadores = np.zeros(len(valores), dtype=bool)
+    marcadores[horas_vacias * n_rows] = True
+    mascara |= marcadores
+    marcadores = marcadores[mascara]
+
+    #posicion (fila, hora) de cada valor conservado, sin copiar las columnas indice por cada hora
+    filas = np.tile(np.arange(n_rows), n_horas)[mascara]
+    horas = np.repeat(np.arange(n_horas), n_rows)[mascara]
+
+    data = {columnas_apiladas[0]: pd.Categorical.from_codes(horas, categories=list_hours, ordered=True), 'FECHA': date}
+    for col, valores_col in columnas_indice.items():
+        if col == 'UPROG':
+            codigos, categorias = pd.factorize(np.asarray(valores_col, dtype=object))
+            codigos = codigos[filas]
+            codigos[marcadores] = -1
+            data[col] = pd.Categorical.from_codes(codigos, categories=categorias)
+        else:
+            valores_col = np.asarray(valores_col, dtype=object)[filas]
+            valores_col[marcadores] = np.nan
+            data[col] = valores_col
+    data[columnas_apiladas[1]] = valores[mascara]
+
+    return pd.DataFrame(data)
+
+
+def _valores_columna(sheet, colx, start_rowx):
+    """
+    Reads one column of an xlrd sheet as an object array, with the same cell conversion as pandas
+    (integral numbers as int, empty cells as NaN).
+    """
+    valores = sheet.col_values(colx, start_rowx)
+    tipos = sheet.col_types(colx, start_rowx)
+    salida = np.empty(len(valores), dtype=object)
+    for i, (valor, tipo) in enumerate(zip(valores, tipos)):
+        if tipo == xlrd.XL_CELL_NUMBER:
+            salida[i] = int(valor) if valor == int(valor) else valor
+        elif tipo in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK):
+            salida[i] = np.nan
+        else:
+            salida[i] = valor
+    return salida
+
+
+def _valores_horas(sheet, colx, start_rowx):
+    """
+    Reads one hour column of an xlrd sheet as a float array (non numeric cells as NaN).
+    """
+    valores = np.asarray(sheet.col_values(colx, start_rowx), dtype=object)
+    tipos = np.asarray(sheet.col_types(colx, start_rowx))
+    salida = np.full(len(valores), np.nan)
+    numericos = tipos == xlrd.XL_CELL_NUMBER
+    salida[numericos] = valores[numericos].astype(float)
+    textos = tipos == xlrd.XL_CELL_TEXT
+    if textos.any(): #numeros guardados como texto
+        salida[textos] = pd.to_numeric(pd.Series(valores[textos]), errors='coerce').to_numpy(dtype=float)
+    return salida
+
+
+def leer_hoja_xlrd(sheet, hoja, date, n_hours, lista_uprog = None):
+    """
+    Fast reader of one I90 sheet that goes straight from the xlrd cells to the long format table.
+
+    Only the valid_columns and the hour columns are read (no DataFrame of the whole sheet, no header
+    reassignment and no stack), the header rows are skipped by position.
+
+    Parameters:
+    - sheet (xlrd.sheet.Sheet): The sheet to be read.
+    - hoja (dict): The sheet configuration (START_HEADER, total_columns, valid_columns, COLUMNAS_APILADAS).
+    - date (str): The date of the file in the format 'YYYY-MM-DD'.
+    - n_hours (int): The number of hours of the date (23, 24 or 25).
+    - lista_uprog (list): Optional. A list of UPROG values to filter the data.
+
+    Returns:
+    - pd.DataFrame: The processed sheet (same columns as procesar_hoja), or None if the sheet is empty.
+    """
+    if sheet.nrows == 0:
+        return None
+
+    #el pandas parse usa la primera fila como cabecera y START_HEADER cuenta desde ahi (la columna 'X' de total_columns es el indice)
+    fila_inicio = hoja['START_HEADER'] + 1
+    columnas_hoja = len(hoja['total_columns']) - 1
+    list_hours = obtener_lista_horas(n_hours, cuartohorario = sheet.ncols + 1 > 90)
+
+    columnas_indice = {}
+    for col in hoja['valid_columns']:
+        columnas_indice[col] = _valores_columna(sheet, hoja['total_columns'].index(col) - 1, fila_inicio)
+
+    bloque = np.column_stack([_valores_horas(sheet, columnas_hoja + k, fila_inicio) for k in range(len(list_hours))]) if sheet.nrows > fila_inicio else np.empty((0, len(list_hours)))
+
+    if lista_uprog != None and len(lista_uprog)>0 : #if lista uprog is passed and is not empty
+        filas = np.isin(columnas_indice['UPROG'], lista_uprog)
+        columnas_indice = {col: valores[filas] for col, valores in columnas_indice.items()}
+        bloque = bloque[filas]
+
+    return apilar_bloque(columnas_indice, bloque, list_hours, date, hoja['COLUMNAS_APILADAS'])
+
+
+def procesar_hoja(xl, hoja, date, n_hours, lista_uprog = None):
+    """
+    Parses one sheet of an I90 workbook and reshapes it to long format (one row per UPROG and HORA) with apilar_bloque.
+
+    Parameters:
+    - xl (pd.ExcelFile | xlrd.book.Book): The workbook returned by abrir_libro (an xlrd Book uses leer_hoja_xlrd).
+    - hoja (dict): The sheet configuration (NOMBRE, START_HEADER, total_columns, valid_columns, COLUMNAS_APILADAS).
+    - date (str): The date of the file in the format 'YYYY-MM-DD'.
+    - n_hours (int): The number of hours of the date (23, 24 or 25).
+    - lista_uprog (list): Optional. A list of UPROG values to filter the data.
+
+    Returns:
+    - pd.DataFrame: The processed sheet, or None if the sheet is empty.
+    """
+    if isinstance(xl, xlrd.book.Book): #lector rapido
+        return leer_hoja_xlrd(xl.sheet_by_name(hoja['NOMBRE']), hoja, date, n_hours, lista_uprog)
+
+    #parse the sheet with name matching "hoja['NOMBRE']" in the excel file we created from the zip file contents and create a df
+    df = xl.parse(hoja['NOMBRE']).reset_index()     
+
+    if len(df) == 0: #proceed with wrangling only if data frame is not empty 
+        return None
+
+    df.columns = df.iloc[hoja['START_HEADER']-1]
+    df = df.iloc[hoja['START_HEADER']:]         
+    num_columnas = len(list(df.columns))
+    
+    list_hours = obtener_lista_horas(n_hours, cuartohorario = num_columnas > 90)
+    
+    df.columns = hoja['total_columns'] + list_hours                                                        
+    df = df[hoja['valid_columns'] + list_hours]
+    
+    if lista_uprog != None and len(lista_uprog)>0 : #if lista uprog is passed and is not empty
+        df = df[df['UPROG'].isin(lista_uprog)==True]
+
+    columnas_indice = {col: df[col].to_numpy(dtype=object) for col in hoja['valid_columns']}
+    try:
+        bloque = df[list_hours].to_numpy(dtype=float)
+    except (ValueError, TypeError): #celdas no numericas (i.e. texto) en el bloque de horas
+        bloque = df[list_hours].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+
+    return apilar_bloque(columnas_indice, bloque, list_hours, date, hoja['COLUMNAS_APILADAS'])
+
+
+#libro abierto en cada proceso del pool de leer_fichero_zip (se abre una sola vez por proceso en el initializer)
+_libro_proceso = None
+
+def _iniciar_libro_proceso(filename, data, lector_rapido):
+    global _libro_proceso
+    _libro_proceso = abrir_libro(filename, data, lector_rapido)
+
+def _procesar_hoja_proceso(hoja, date, n_hours, lista_uprog):
+    return procesar_hoja(_libro_proceso, hoja, date, n_hours, lista_uprog)
+
+def _extraer_datos_proceso(fichero_config, carpeta_ficheros_zip_i90, lector_rapido, filename, carpeta_salida, carpeta_ficheros_zip, lista_uprog):
+    #cada proceso del pool de generar_ficheros extrae un zip completo con su propio objeto (secuencial por hojas)
+    obj = i90ZIP(fichero_config, carpeta_ficheros_zip_i90, lector_rapido = lector_rapido)
+    obj.extraer_datos(filename, carpeta_salida, carpeta_ficheros_zip, lista_uprog)
+    return filename
+
+
+def zip_valido(path):
+    """
+    Checks that a downloaded file is a complete zip (central directory and CRC of every member).
+
+    Parameters:
+    - path (str): The path of the file.
+
+    Returns:
+    - bool: True if the file is a valid zip.
+    """
+    try:
+        with zipfile.ZipFile(path) as z:
+            return z.testzip() is None
+    except (zipfile.BadZipFile, OSError):
+        return False
+
 
 class i90ZIP:
 
-    def __init__(self,fichero_config, carpeta_ficheros_zip_i90):
+    url_base = "https://api.esios.ree.es" #URL base de la descarga de los zip (i.e. un servidor local en los tests)
+
+    def __init__(self,fichero_config, carpeta_ficheros_zip_i90, incremental = True, n_procesos = 1, lector_rapido = True):
         """
         Initializes the i90ZIP class.
 
         Parameters:
         - fichero_config (str): Path to the YAML configuration file.
         - carpeta_ficheros_zip_i90 (str): Path to the directory containing ZIP files.
+        - incremental (bool): If True (default), unir_datos appends the new data as one parquet fragment per FECHA
+          (i.e. PROGRAMAS/2024-06-14.parquet) instead of rewriting the consolidated PROGRAMAS.parquet file.
+        - n_procesos (int): Number of worker processes used to parse the sheets of a workbook (leer_fichero_zip) and
+          the ZIP files of a backfill (generar_ficheros). Defaults to 1 (sequential).
+        - lector_rapido (bool): If True (default), .xls sheets are read cell by cell with xlrd straight into the long
+          format table (leer_hoja_xlrd) instead of pandas.ExcelFile.parse + stack.
 
         Reads the configuration file and stores the parameters.
         """ 
         self.fichero_config = fichero_config #ruta  de entrada del fichero yml 
         self.carpeta_ficheros_zip_i90 = carpeta_ficheros_zip_i90 #ruta donde se guardan las descargas zip
+        self.incremental = incremental #modo de consolidacion de unir_datos
+        self.n_procesos = n_procesos #procesos para parsear hojas y ficheros en paralelo
+        self.lector_rapido = lector_rapido #lector xlrd directo a formato largo para los .xls
 
         with open(self.fichero_config, 'r') as cfile:
             #abrir y leer yml file y renombrar como cfile 
@@ -79,64 +355,76 @@ class i90ZIP:
 
         Parameters:
         - fecha (datetime): The date for which the ZIP file is to be downloaded.
-        - ruta_destino (str): The destination path where the ZIP file will be saved.
+        - ruta_destino (str): The destination path where the ZIP file will be saved. Defaults to the folder of the
+          year of the date in carpeta_ficheros_zip_i90 (i.e. raw/ESIOS/i90/2024).
+
+        Constructs the URL based on the date and streams the file to disk in chunks ("I90DIA_YYYYMMDD.zip.part"),
+        resuming an interrupted download with a Range request. The file is checked to be a valid zip and atomically
+        renamed to its final name, so a partial zip is never processed. It is not downloaded again if the server
+        reports it has not changed (ETag/Last-Modified of the previous download) and not replaced if its content is the same.
 
-        Constructs the URL based on the date, downloads the file, and saves it with a name
-        based on the date.
+        Returns:
+        - bool: True if the file was written, False if it has not changed or the download failed.
         """
         try: 
-            zip_file_url = "https://api.esios.ree.es/archives/34/download?date_type=datos&end_date={fecha}T23%3A59%3A59%2B00%3A00&locale=es&start_date={fecha}T00%3A00%3A00%2B00%3A00"
+            zip_file_url = self.url_base + "/archives/34/download?date_type=datos&end_date={fecha}T23%3A59%3A59%2B00%3A00&locale=es&start_date={fecha}T00%3A00%3A00%2B00%3A00"
             zip_file_url = zip_file_url.replace("{fecha}",fecha.strftime("%Y-%m-%d")) #replacing fecha in the zip url
             print(zip_file_url)
-            r = requests.get(zip_file_url, stream=True) #retreiving zip file url contents
-            #z = zipfile.ZipFile(BytesIO(r.content))
-
-            if ruta_destino != None:  #si una ruta de salida particular se especifica
-                file_name = 'I90DIA_' + fecha.strftime("%Y%m%d") + ".zip" # EJ:"I90DIA_20240601.zip"
-                # Construct the full file path
-                file_path = os.path.join(ruta_destino, file_name)
-                with open(file_path,"wb") as file: #opening a new file to save the zip file url contents 
-                    file.write(r.content) #writing the content of the retrieved zip file
-                    
-            else: #si no, solo regresar datos S
-               return r 
+
+            if ruta_destino == None:  #si no se especifica, carpeta del año dentro de la carpeta de los zip
+                year = str(fecha.year)
+                carpeta = self.carpeta_ficheros_zip_i90
+                ruta_destino = carpeta if os.path.basename(os.path.normpath(carpeta)) == year else os.path.join(carpeta, year)
+            os.makedirs(ruta_destino, exist_ok=True)
+
+            file_name = 'I90DIA_' + fecha.strftime("%Y%m%d") + ".zip" # EJ:"I90DIA_20240601.zip"
+            # Construct the full file path
+            file_path = os.path.join(ruta_destino, file_name)
+            escrito = descargas.download_file(zip_file_url, file_path, validate=zip_valido) #peticion condicional, .part + rename si el zip es valido
+            if not escrito:
+                print(f"{file_name} has not changed, skipping")
+            return escrito
         
         except requests.exceptions.RequestException as e:
             print(f"An error occurred while making the HTTP request: {e}")
+        except ValueError as e:
+            print(f"An error occurred while validating the file: {e}")
         except IOError as e:
             print(f"An error occurred while writing the file: {e}")
         except Exception as e:
             print(f"An unexpected error occurred: {e}")
+        return False
 
 
     def descargar_ficheros(self,  fecha_ini, fecha_fin):
         """
-        Downloads ZIP files for each day within a specified date range and saves them to the specified destination.
+        Downloads ZIP files for each day within a specified date range and saves them to the folder of their year
+        in carpeta_ficheros_zip_i90 (see descargar_fichero).
 
         Parameters:
-        - fecha_ini (datetime): The initial date of the range.
-        - fecha_fin (datetime): The final date of the range.
-        - ruta_destino (str): The destination path where the ZIP files will be saved.
+        - fecha_ini (datetime | str): The initial date of the range ("YYYY-MM-DD" or datetime), or "Most recent" for 90 days ago.
+        - fecha_fin (datetime | str): The final date of the range ("YYYY-MM-DD" or datetime).
+
+        Returns:
+        - int: The number of files written.
         """
 
         # Definir la fecha inicial y la fecha final, if fecha inical is most recent
         if fecha_ini == "Most recent":
-            fecha_actual =  datetime.now()
-            fecha_inicial = fecha_actual -  timedelta(days=90)
-            fecha_inicial.strftime("%Y-%m-%d") #converting object to string
+            fecha_actual = datetime.now() - timedelta(days=90)
         else: 
-            fecha_inicial = datetime.strftime(fecha_ini, "%Y-%m-%d") 
+            fecha_actual = datetime.strptime(fecha_ini, "%Y-%m-%d") if isinstance(fecha_ini, str) else fecha_ini
 
+        fecha_final = datetime.strptime(fecha_fin, "%Y-%m-%d") if isinstance(fecha_fin, str) else fecha_fin #has to be at least 90 days in the past
 
-        fecha_final = datetime.strftime(fecha_fin, "%Y-%m-%d") #has to be at least 90 days in the past
-
-
-        while fecha_inicial <= fecha_final:
+        escritos = 0
+        while fecha_actual.date() <= fecha_final.date():
             print(fecha_actual) 
             #descargar cada fichero con la fecha defiida por el bucle usando la fucnión descargar fichero anterior  
-            self.descargar_fichero(fecha_inicial)
+            escritos += bool(self.descargar_fichero(fecha_actual))
             #al final de cada descarga se le suma un día a la fecha de descarga
             fecha_actual += timedelta(days=1) 
+        return escritos
 
     def leer_fichero_zip(self, hojas, filename, data, lista_uprog = None,):
             """
@@ -180,72 +468,21 @@ class i90ZIP:
 
             #obtain number of hours in the given date (this is useful for dates in which daylight saving kicks in)
             n_hours = self.obtener_numero_periodos(date)
-            
-            # Determine the file format and read accordingly
-            if filename.endswith('.xls'):
-                # For .xls files
-                xl = pd.ExcelFile(io.BytesIO(data), engine='xlrd')
-            elif filename.endswith('.xlsx'):
-                # For .xlsx files
-                xl = pd.ExcelFile(io.BytesIO(data), engine='openpyxl')
-            else:                
-                raise ValueError(f"Unsupported file format: {filename}")
-                    
-            index = 0 #begin index at 0 
-            for hoja in hojas: #iterate though every hoja of the hojas variable passed (hojas will have the yml file structure)
-
-                #depending on the number of hours of the given date, we are gonna create a list of quarter hourly periods
-                if n_hours == 24:
-                    list_hours = list(map(str, range(1, 25))) #full set of hours 
-                    list_hours_qh = list(map(str, range(1, 97)))
-                elif n_hours == 23:
-                    list_hours = list(map(str, [1, 2] + list(range(4, 25)))) #we are skipping hour number "3"
-                    list_hours_qh = list(map(str, range(1, 93)))
-                else:
-                    list_hours = list(map(str, [1, 2] + ['3a', '3b'] + list(range(4, 25)))) #here, hour 3 is subdivided into "3a" and "3b"
-                    list_hours_qh = list(map(str, range(1, 101)))  #converting quarter hourly string list to integer lsit using map function (same for every n-hours case)
-                    
-                #parse the sheet with name matching "hoja['NOMBRE']" in the excel file we created from the zip file contents and create a df
-                df = xl.parse(hoja['NOMBRE']).reset_index()     
-
-                if len(df) > 0: #proceed with wrangling only if data frame is not empty 
 
-                    #print(len(df))
-                    df.columns = df.iloc[hoja['START_HEADER']-1]
-                    df = df.iloc[hoja['START_HEADER']:]         
-                    #print(str(len(list(df.columns))))
-                    num_columnas = len(list(df.columns))
-                    
-                    if num_columnas > 90:
-                        list_hours = list_hours_qh
-                    
-                    df.columns = hoja['total_columns'] + list_hours                                                        
-                    df = df[hoja['valid_columns'] + list_hours]
-                    
-                    if lista_uprog != None and len(lista_uprog)>0 : #if lista uprog is passed and is not empty
-                        df = df[df['UPROG'].isin(lista_uprog)==True]
-
-                    df = df.set_index(hoja['valid_columns'])                
-                    df = df.stack().reset_index()
-                    df.columns = hoja['valid_columns'] + hoja['COLUMNAS_APILADAS']
-                    df['FECHA'] = date
-                        
-                    data = {'HORA': list_hours}
-                    df_left = pd.DataFrame.from_dict(data)
-                    df_left['FECHA'] = date
-                    
-                
-                    df = pd.merge(df_left, df, how='left', on=['FECHA', 'HORA'])
+            if self.n_procesos > 1:
+                #cada proceso abre el libro una vez (xlrd on_demand) y parsea las hojas que le tocan
+                #se envia la config de la hoja sin 'DATA' para no serializar los datos acumulados
+                hojas_config = [{k: v for k, v in hoja.items() if k != 'DATA'} for hoja in hojas]
+                with ProcessPoolExecutor(max_workers=self.n_procesos, initializer=_iniciar_libro_proceso, initargs=(filename, data, self.lector_rapido)) as executor:
+                    resultados = list(executor.map(_procesar_hoja_proceso, hojas_config, [date]*len(hojas), [n_hours]*len(hojas), [lista_uprog]*len(hojas)))
+            else:
+                xl = abrir_libro(filename, data, self.lector_rapido)
+                resultados = [procesar_hoja(xl, hoja, date, n_hours, lista_uprog) for hoja in hojas]
 
+            for index, df in enumerate(resultados):
+                if df is not None:
                     hojas[index]['DATA'].append(df)
 
-                index = index + 1
-
-                #except Exception as e:
-                #    print("ERROR: " + str(hoja['NOMBRE']))
-                #    print(e)
-
-                
             return hojas
 
     def extraer_datos(self, filename, carpeta_salida, carpeta_ficheros_zip, lista_uprog = None):
@@ -295,7 +532,7 @@ class i90ZIP:
                     
         for hoja in self.HOJAS:
             if hoja['DATA']:
-                df_final = pd.concat(hoja['DATA'])   
+                df_final = parquet_dataset.apply_curated_schema(pd.concat(hoja['DATA'])) #FECHA DATE, HORA int16 + DST, categoricas
                 ruta = os.path.join(carpeta_salida, f"{filename}_{hoja['CONCEPTO']}_temp.parquet")         
                 #df_final.to_csv(carpeta_salida + str(annio) + "_" + hoja['CONCEPTO'] + ".csv", index=False, sep=";")
                 #df_final.to_parquet(carpeta_salida + filename + "_" + hoja['CONCEPTO'] + "_temp.parquet", index=False,compression='gzip')
@@ -303,6 +540,37 @@ class i90ZIP:
             else: 
                 print(f"No data found for {hoja['CONCEPTO']}")
 
+    def escribir_consolidado(self, frames, ruta_final):
+        """
+        Writes the new data of a consolidated file (i.e. PROGRAMAS.parquet).
+
+        In incremental mode the new data is written to one fragment per FECHA inside a dataset directory
+        (i.e. PROGRAMAS/2024-06-14.parquet). Every zip holds a whole day, so the fragments of the new dates are
+        replaced (a re-ingested day does not keep its old values) and the other dates are not touched.
+        Otherwise the whole consolidated file is reloaded, deduplicated and rewritten.
+
+        Parameters:
+        - frames (list): A list of DataFrames with the new data.
+        - ruta_final (str): The path of the consolidated parquet file.
+
+        Returns:
+        - None
+        """
+        if self.incremental:
+            df_nuevo = pd.concat(frames, ignore_index=True)
+            parquet_dataset.write_fragments(df_nuevo, parquet_dataset.dataset_path_from_parquet(ruta_final), replace=True)
+        else:
+            # Check if the final parquet file already exists
+            if os.path.exists(ruta_final):
+                existing_df = pd.read_parquet(ruta_final)
+                frames = [existing_df] + frames
+
+            df_fichero = parquet_dataset.apply_curated_schema(pd.concat(frames, ignore_index=True))
+            df_fichero = df_fichero.drop_duplicates()  # Remove any potential duplicates
+            parquet_dataset.write_parquet(df_fichero, ruta_final, compression='gzip') #ordenado por UPROG, FECHA, HORA con estadisticas por row group
+            if "UPROG" in df_fichero.columns:
+                parquet_dataset.write_up_index(ruta_final, parquet_dataset.up_ranges(df_fichero)) #el fichero se reescribe entero, el indice tambien
+
     def unir_datos(self, files, carpeta_salida):
         """
         Combines and consolidates processed data from multiple years into single PARQUET files.
@@ -310,7 +578,7 @@ class i90ZIP:
         This function performs the following steps:
         1. Defines a list of specific files to be combined.
         2. For each file, iterates over the list of years, reads the corresponding parquet files, and appends the data to a list.
-        3. Concatenates the data for each file type and saves the result as a consolidated parquet file.
+        3. Concatenates the data for each file type and saves the result with escribir_consolidado (incremental or full rewrite).
         4. Specifically handles program files by adding a 'PROGRAMA' column and consolidating them into a single parquet file.
 
         Parameters:
@@ -327,11 +595,6 @@ class i90ZIP:
             frames = []
             ruta_final = os.path.join(carpeta_salida, f"{str(fichero)}.parquet")
             
-            # Check if the final parquet file already exists
-            if os.path.exists(ruta_final):
-                existing_df = pd.read_parquet(ruta_final)
-                frames.append(existing_df)
-            
             for filename in files:
                 ruta_temp = os.path.join(carpeta_salida, f"{filename}_{str(fichero)}_temp.parquet")
                 if os.path.exists(ruta_temp):
@@ -341,9 +604,7 @@ class i90ZIP:
                     print(f"File not found: {ruta_temp}")
             
             if frames:
-                df_fichero = pd.concat(frames, ignore_index=True)
-                df_fichero = df_fichero.drop_duplicates()  # Remove any potential duplicates
-                df_fichero.to_parquet(ruta_final, index=False, compression='gzip')
+                self.escribir_consolidado(frames, ruta_final)
             else:
                 print(f"No data to combine for {fichero}")
 
@@ -351,11 +612,6 @@ class i90ZIP:
         frames = []
         ruta_final = os.path.join(carpeta_salida, "PROGRAMAS.parquet")
         
-        # Check if the PROGRAMAS.parquet file already exists
-        if os.path.exists(ruta_final):
-            existing_df = pd.read_parquet(ruta_final)
-            frames.append(existing_df)
-        
         for fichero in FICHEROS:
             for filename in files:
                 ruta_temp = os.path.join(carpeta_salida, f"{filename}_{str(fichero)}_temp.parquet")
@@ -367,9 +623,7 @@ class i90ZIP:
                     print(f"File not found: {ruta_temp}")
         
         if frames:
-            df_fichero = pd.concat(frames, ignore_index=True)
-            df_fichero = df_fichero.drop_duplicates()  # Remove any potential duplicates
-            df_fichero.to_parquet(ruta_final, index=False, compression='gzip')
+            self.escribir_consolidado(frames, ruta_final)
         else:
             print("No data to combine for PROGRAMAS")
 
@@ -377,11 +631,6 @@ class i90ZIP:
         frames = []
         ruta_final = os.path.join(carpeta_salida, "P48.parquet")
         
-        # Check if the P48.parquet file already exists
-        if os.path.exists(ruta_final):
-            existing_df = pd.read_parquet(ruta_final)
-            frames.append(existing_df)
-        
         for fichero in FICHEROS:
             #print(fichero)
             for filename in files:
@@ -394,30 +643,50 @@ class i90ZIP:
                     print(f"File not found: {ruta_temp}")
         
         if frames:
-            df_fichero = pd.concat(frames, ignore_index=True)
-            df_fichero = df_fichero.drop_duplicates()  # Remove any potential duplicates
-            df_fichero.to_parquet(ruta_final, index=False, compression='gzip')
+            self.escribir_consolidado(frames, ruta_final)
         else:
             print("No data to combine for P48")
 
-    def borrar_ficheros_temporales(self, carpeta_salida): 
+    def borrar_ficheros_temporales(self, carpeta_salida, files = None): 
+        """
+        Removes the _temp.parquet files written by extraer_datos.
+
+        Parameters:
+        - carpeta_salida (str): The output directory of the temporary files.
+        - files (list): Optional. The zip files whose temporary files are removed (i.e. ["I90DIA_20240613.zip"]), so other
+          zips of the same folder being processed are not affected. Defaults to every temporary file of the folder.
+
+        Returns:
+        - None
+        """
+        prefijos = tuple(f"{os.path.basename(filename)}_" for filename in files) if files else ("",)
         file_lst = os.listdir(carpeta_salida)
         for file in file_lst:
-            if file.endswith("_temp.parquet"):
+            if file.endswith("_temp.parquet") and file.startswith(prefijos):
                  # Construct the full path to the file
                 file_path = os.path.join(carpeta_salida, os.path.basename(file))
                 # Remove the file
                 os.remove(file_path)
 
     def generar_ficheros(self, files, carpeta_salida, carpeta_ficheros_zip, lista_uprog = None): #lista de UPs opcional 
-        for filename in files:
-            if lista_uprog == None:
-                self.extraer_datos(filename, carpeta_salida, carpeta_ficheros_zip)
-            else: 
-                self.extraer_datos(filename, carpeta_salida, carpeta_ficheros_zip, lista_uprog)
-
-        self.unir_datos(files,carpeta_salida)
-        self.borrar_ficheros_temporales(carpeta_ficheros_zip) #(carpeta_salida)
+        try:
+            if self.n_procesos > 1 and len(files) > 1:
+                #backfill: un zip por proceso, cada uno escribe sus _temp.parquet y la consolidacion se hace despues en este proceso
+                #(si un zip falla, el pool espera al resto antes de propagar el error)
+                with ProcessPoolExecutor(max_workers=self.n_procesos) as executor:
+                    futuros = [executor.submit(_extraer_datos_proceso, self.fichero_config, self.carpeta_ficheros_zip_i90, self.lector_rapido, filename, carpeta_salida, carpeta_ficheros_zip, lista_uprog) for filename in files]
+                    for futuro in futuros:
+                        print(f"Extraido: {futuro.result()}")
+            else:
+                for filename in files:
+                    if lista_uprog == None:
+                        self.extraer_datos(filename, carpeta_salida, carpeta_ficheros_zip)
+                    else: 
+                        self.extraer_datos(filename, carpeta_salida, carpeta_ficheros_zip, lista_uprog)
+
+            self.unir_datos(files,carpeta_salida)
+        finally:
+            self.borrar_ficheros_temporales(carpeta_salida, files) #extraer_datos escribe los _temp.parquet en carpeta_salida, tambien si algun zip falla
 
 
 if __name__ == '__main__':
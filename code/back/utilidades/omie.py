@@ -13,13 +13,26 @@ from lxml import objectify
 from lxml import etree
 from lxml import objectify, etree
 import io
+import os
+import zipfile
+import re
 import ssl
+import numpy as np
+import utilidades.descargas as descargas
 
 ssl._create_default_https_context = ssl._create_unverified_context
 
+FECHA_CORTE_INTRADIARIO = datetime(2024, 7, 14) #ultimo dia  de 7 sesiones intradiarias
+
+#nombres de los ficheros de precios de OMIE: INT_PBC_EV_H_1_dd_mm_yyyy_dd_mm_yyyy.txt (diario),
+#INT_PIB_EV_H_1_{sesion}_dd_mm_yyyy_... y INT_IDA_PIB_EV_H_1_{sesion}_dd_mm_yyyy_... (intradiario)
+PATRON_FICHERO_PRECIOS = re.compile(r"INT_(?P<ida>IDA_)?(?P<tipo>PBC|PIB)_EV_H_1_(?:(?P<sesion>\d)_)?(?P<dd>\d{2})_(?P<mm>\d{2})_(?P<yyyy>\d{4})_\d{2}_\d{2}_\d{4}\.(?:txt|TXT|\d+)$")
+
 
 
 class OMIE:
+    url_base = "https://www.omie.es" #URL base de los ficheros de OMIE (i.e. un servidor local en los tests)
+
     def __init__(self):
         pass
 
@@ -28,6 +41,102 @@ class OMIE:
         local_dt = utc_dt.replace(tzinfo=pytz.utc).astimezone(local_tz)
         return local_tz.normalize(local_dt)
 
+    def leer_precios(self, texto):
+        """
+        Reads the first price row of an OMIE TXT file (the Spanish marginal price) straight into a float array.
+
+        The file has two title lines, a header line with the hours and one line per price, i.e.
+        "Precio marginal en el sistema español (EUR/MWh);66,50;61,20;...;" with decimal comma.
+
+        Args:
+        texto (str): The content of the file.
+
+        Returns:
+        np.ndarray: The prices of every column after the label (NaN for the empty ones, i.e. the trailing ";").
+        """
+        df_raw = pd.read_csv(io.StringIO(texto), sep=";", skiprows=2, nrows=1, decimal=",", thousands=".", header=0)
+        return pd.to_numeric(df_raw.iloc[0, 1:], errors="coerce").to_numpy(dtype=float)
+
+    def precios_a_dataframe(self, precios, fecha, primer_periodo = 1, sesion = None):
+        """
+        Builds the PRECIO/FECHA/PERIODO(/SESION) frame of the prices of a file, numbering the columns from
+        primer_periodo and dropping the empty ones.
+
+        Args:
+        precios (np.ndarray): The prices of the file (see leer_precios).
+        fecha (datetime): The date of the prices.
+        primer_periodo (int): The period of the first column. Defaults to 1.
+        sesion (int): Optional. The intraday session.
+
+        Returns:
+        pd.DataFrame: The prices.
+        """
+        df = pd.DataFrame({'PRECIO': precios})
+        df['FECHA'] = fecha.strftime("%Y-%m-%d")
+        df['PERIODO'] = np.arange(primer_periodo, primer_periodo + len(precios))
+        if sesion is not None:
+            df['SESION'] = sesion
+        return df.dropna().reset_index(drop=True)
+
+    def parse_precio_diario(self, texto, fecha):
+        """
+        Parses an OMIE day-ahead price file (INT_PBC_EV_H_1_dd_mm_yyyy_dd_mm_yyyy.txt).
+
+        Args:
+        texto (str): The content of the file.
+        fecha (datetime): The date of the file.
+
+        Returns:
+        pd.DataFrame: PRECIO, FECHA and PERIODO columns.
+        """
+        return self.precios_a_dataframe(self.leer_precios(texto), fecha)
+
+    def parse_precio_intradiario(self, texto, fecha, sesion, ida = None):
+        """
+        Parses an OMIE intraday price file.
+
+        Before FECHA_CORTE_INTRADIARIO (7 sessions, INT_PIB_EV_H_1_{sesion}_...) the first 4 columns are the hours 21-24
+        of the previous day, so sessions 1-6 start at the 5th column and session 7 is read from the session 2 file of the
+        next day (its first 4 columns, periods 21-24). From FECHA_CORTE_INTRADIARIO (3 sessions, INT_IDA_PIB_EV_H_1_{sesion}_...)
+        the columns are the periods of the day.
+
+        Args:
+        texto (str): The content of the file (for session 7, the session 2 file of the next day).
+        fecha (datetime): The date of the prices.
+        sesion (int): The session.
+        ida (bool): Optional. Whether the file has the INT_IDA_PIB format. Defaults to fecha >= FECHA_CORTE_INTRADIARIO.
+
+        Returns:
+        pd.DataFrame: PRECIO, FECHA, PERIODO and SESION columns.
+        """
+        precios = self.leer_precios(texto)
+        if ida is None:
+            ida = fecha >= FECHA_CORTE_INTRADIARIO
+        if ida:
+            return self.precios_a_dataframe(precios, fecha, sesion = sesion)
+        if sesion < 7:
+            return self.precios_a_dataframe(precios[4:], fecha, sesion = sesion) #horas del dia actual
+        return self.precios_a_dataframe(precios[:4], fecha, primer_periodo = 21, sesion = sesion) #horas del dia anterior si la sesion es 7
+
+    def url_precio_diario(self, fecha):
+        """URL of the day-ahead price file of a date."""
+        dd, mm, yyyy = fecha.strftime("%d"), fecha.strftime("%m"), fecha.strftime("%Y")
+        return self.url_base + "/informes_mercado/AGNO_" + yyyy + "/MES_" + mm + "/TXT/INT_PBC_EV_H_1_" + dd + "_" + mm + "_" + yyyy + "_" + dd + "_" + mm + "_" + yyyy + ".txt"
+
+    def url_precio_intradiario(self, fecha, sesion, ida = None):
+        """URL of the intraday price file of a date and session (INT_IDA_PIB from FECHA_CORTE_INTRADIARIO unless ida is given)."""
+        dd, mm, yyyy = fecha.strftime("%d"), fecha.strftime("%m"), fecha.strftime("%Y")
+        if ida is None:
+            ida = fecha >= FECHA_CORTE_INTRADIARIO
+        if not ida:
+            return self.url_base + "//informes_mercado/AGNO_" + yyyy + "/MES_" + mm + "/TXT/INT_PIB_EV_H_1_" + str(sesion) + "_" + dd + "_" + mm + "_" + yyyy + "_" + dd + "_" + mm + "_" + yyyy + ".txt"
+        return self.url_base + "/sites/default/files/dados/AGNO_" + yyyy + "/MES_" + mm + "/TXT/INT_IDA_PIB_EV_H_1_" + str(sesion) + "_" + dd + "_" + mm + "_" + yyyy + "_" + dd + "_" + mm + "_" + yyyy + ".txt"
+
+    def descargar_texto(self, url):
+        """Downloads an OMIE TXT file (latin1)."""
+        resp = descargas.get(url) #sesion keep-alive del hilo, timeout y reintentos en 429/5xx
+        return resp.content.decode("latin1")
+
     def download_precio_diario(self, start_date, end_date):
 
         frames = []
@@ -40,34 +149,9 @@ class OMIE:
         while fecha <= end_date_d:
 
             try:
-
-                yyyy = fecha.year
-                mm = fecha.month
-                dd = fecha.day
-
-                if mm < 10 : mm = "0" + str(mm)
-                if dd < 10 : dd = "0" + str(dd)
-
-                url = "https://www.omie.es/informes_mercado/AGNO_" + str(yyyy) + "/MES_" + str(mm) + "/TXT/INT_PBC_EV_H_1_" + str(dd) + "_" + str(mm) + "_" + str(yyyy) + "_" + str(dd) + "_" + str(mm) + "_" + str(yyyy) + ".txt"
-
+                url = self.url_precio_diario(fecha)
                 print(url)
-
-                #df = pd.read_csv(url, sep=";", encoding="latin1", skiprows=2)
-                resp = requests.get(url)
-                csv = resp.content.decode("latin1")
-                df_raw = pd.read_csv(io.StringIO(csv), sep=";",skiprows=2)
-
-                df = pd.DataFrame(df_raw.iloc[0])
-                df.columns = ['PRECIO']
-                df = df.iloc[1:]
-
-                df['FECHA'] = fecha.strftime("%Y-%m-%d")
-                df['PERIODO'] = range(1,26)
-
-                df['PRECIO'] = df['PRECIO'].apply(lambda x: float(str(x).replace(",",".")))
-                df = df.dropna()
-
-                frames.append(df)
+                frames.append(self.parse_precio_diario(self.descargar_texto(url), fecha))
 
             except Exception as e:
                 print(str(e))
@@ -89,7 +173,6 @@ class OMIE:
 
 
         frames = []
-        fecha_corte = datetime(2024, 7, 14) #ultimo dia  de 7 sesiones intradiarias
 
         delta = timedelta(days=1)
         fecha = datetime.strptime(start_date, "%Y-%m-%d")
@@ -99,98 +182,137 @@ class OMIE:
 
 
         while fecha <= end_date_d:
-            if fecha < fecha_corte: 
-                for sesion_input in [1,2,3,4,5,6,7]:
-
+            #7 sesiones hasta FECHA_CORTE_INTRADIARIO, la 7 es el fichero de la sesion 2 del dia siguiente; 3 sesiones despues
+            sesiones = [1,2,3,4,5,6,7] if fecha < FECHA_CORTE_INTRADIARIO else [1,2,3]
+            for sesion_input in sesiones:
+                try:
                     if sesion_input == 7:
-                        yyyy = (fecha + timedelta(days=1)).year
-                        mm = (fecha + timedelta(days=1)).month
-                        dd = (fecha + timedelta(days=1)).day
-                        sesion = 2
+                        url = self.url_precio_intradiario(fecha + timedelta(days=1), 2, ida = False) #formato de 7 sesiones aunque el dia siguiente sea el corte
                     else:
-                        sesion = sesion_input
-                        yyyy = fecha.year
-                        mm = fecha.month
-                        dd = fecha.day
-
-                    if mm < 10 : mm = "0" + str(mm)
-                    if dd < 10 : dd = "0" + str(dd)
-
-                    try:
-                        url = "https://www.omie.es//informes_mercado/AGNO_" + str(yyyy) + "/MES_" + str(mm) + "/TXT/INT_PIB_EV_H_1_" + str(sesion) + "_" + str(dd) + "_" + str(mm) + "_" + str(yyyy) + "_" + str(dd) + "_" + str(mm) + "_" + str(yyyy) + ".txt"
-
-                        #df = pd.read_csv(url, sep=";", encoding="latin1", skiprows=2)
-                        resp = requests.get(url)
-                        csv = resp.content.decode("latin1")
-                        df_raw = pd.read_csv(io.StringIO(csv), sep=";",skiprows=2)
-
-                        df = pd.DataFrame(df_raw.iloc[0])
-                        df.columns = ['PRECIO']
-                        if sesion_input < 7: #if session is not 7 
-                            df = df.iloc[5:] #horas del dia actual 
-                            df['FECHA'] = fecha.strftime("%Y-%m-%d")
-                            df['PERIODO'] = range(1,26)
-                            df['PRECIO'] = df['PRECIO'].apply(lambda x: float(str(x).replace(",",".")))
-                            df['SESION'] = sesion_input
-                        else:
-                            df = df.iloc[1:5] #horas del dia anterior si la sesion es 7 
-                            df['FECHA'] = fecha.strftime("%Y-%m-%d")
-                            df['PERIODO'] = range(21,25)
-                            df['PRECIO'] = df['PRECIO'].apply(lambda x: float(str(x).replace(",",".")))
-                            df['SESION'] = sesion_input
+                        url = self.url_precio_intradiario(fecha, sesion_input)
+                        if fecha >= FECHA_CORTE_INTRADIARIO:
+                            print(url)
 
-                        df = df.dropna()
+                    frames.append(self.parse_precio_intradiario(self.descargar_texto(url), fecha, sesion_input, ida = fecha >= FECHA_CORTE_INTRADIARIO))
+                except Exception as e:
+                    print(str(e))
 
-                        frames.append(df)
-                    except Exception as e:
-                        print(str(e))
-
-                fecha = fecha + delta
-
-            else: 
-
-                for sesion_input in [1,2,3]: 
-
-                    sesion = sesion_input
-                    yyyy = fecha.year
-                    mm = fecha.month
-                    dd = fecha.day
-
-                    if mm < 10 : mm = "0" + str(mm)
-                    if dd < 10 : dd = "0" + str(dd)
-
-                    try:
-                        url = "https://www.omie.es/sites/default/files/dados/AGNO_" + str(yyyy) + "/MES_" + str(mm) + "/TXT/INT_IDA_PIB_EV_H_1_" + str(sesion) + "_" + str(dd) + "_" + str(mm) + "_" + str(yyyy) + "_" + str(dd) + "_" + str(mm) + "_" + str(yyyy) + ".txt"
-
-                        print(url)
-                        #df = pd.read_csv(url, sep=";", encoding="latin1", skiprows=2)
-                        resp = requests.get(url)
-                        csv = resp.content.decode("latin1")
-                        df_raw = pd.read_csv(io.StringIO(csv), sep=";",skiprows=2)
-
-                        #data wrangling
+            fecha = fecha + delta
+        
+        df = pd.concat(frames)
 
-                        df = df_raw.drop(columns=[df_raw.columns[0], df_raw.columns[-1]]) #dropping first and last column
-                        df = pd.DataFrame(df.iloc[0]) #primera fila, serie de horas 1-24, que luego se trasnforma a df
-                        df.columns = ['PRECIO'] #crear nueva columna de precio que está vacía 
-                        df['FECHA'] = fecha.strftime("%Y-%m-%d") #fecha a string
-                        df['PERIODO'] = range(1,25) #añadir columna de periodo
-                        df['PRECIO'] = df['PRECIO'].apply(lambda x: float(str(x).replace(",","."))) #añadir precio
-                        df['SESION'] = sesion_input #populate sesion input
 
-                        df = df.dropna()
+        return df
 
-                        frames.append(df)
+    def identificar_fichero(self, nombre):
+        """
+        Identifies an OMIE price file by its name (see PATRON_FICHERO_PRECIOS).
+
+        Args:
+        nombre (str): The name of the file. i.e. "INT_PIB_EV_H_1_2_13_07_2024_13_07_2024.txt"
+
+        Returns:
+        tuple: (mercado, fecha, sesion, ida), mercado is "diario" or "intradiario", sesion None for the diario and
+               ida True for the INT_IDA_PIB files. None if it is not a price file.
+        """
+        match = PATRON_FICHERO_PRECIOS.search(os.path.basename(nombre))
+        if match is None:
+            return None
+        fecha = datetime(int(match.group("yyyy")), int(match.group("mm")), int(match.group("dd")))
+        mercado = "diario" if match.group("tipo") == "PBC" else "intradiario"
+        sesion = int(match.group("sesion")) if match.group("sesion") else None
+        if mercado == "intradiario" and sesion is None:
+            return None
+        return mercado, fecha, sesion, match.group("ida") is not None
+
+    def parse_ficheros(self, ficheros):
+        """
+        Parses OMIE price files, reading each file once (i.e. the members of an archive as they are iterated).
+
+        The files are recognised by their name: INT_PBC_EV_H_1_* (diario), INT_PIB_EV_H_1_{sesion}_* (intradiario before
+        FECHA_CORTE_INTRADIARIO, the session 2 file of a date also gives the session 7 of the previous date, even for the
+        first date of FECHA_CORTE_INTRADIARIO) and INT_IDA_PIB_EV_H_1_{sesion}_* (intradiario from FECHA_CORTE_INTRADIARIO).
+        Other files and files that can not be parsed are skipped.
+
+        Args:
+        ficheros (iterable): (nombre, leer) of every file, leer() returns the content of the file in bytes.
+
+        Returns:
+        dict: {"diario": pd.DataFrame, "intradiario": pd.DataFrame} with the same columns as download_precio_diario and
+              download_precio_intradiario, sorted by FECHA (and SESION).
+        """
+        frames = {"diario": [], "intradiario": []}
+        for nombre, leer in ficheros:
+            identificado = self.identificar_fichero(nombre)
+            if identificado is None:
+                continue
+            mercado, fecha, sesion, ida = identificado
 
-                    except Exception as e:
-                        print(str(e))
+            try:
+                texto = leer().decode("latin1")
 
-                fecha = fecha + delta
-        
-        df = pd.concat(frames)
+                if mercado == "diario":
+                    frames["diario"].append(((fecha, 0), self.parse_precio_diario(texto, fecha)))
+                    continue
 
+                if ida or fecha < FECHA_CORTE_INTRADIARIO:
+                    frames["intradiario"].append(((fecha, sesion), self.parse_precio_intradiario(texto, fecha, sesion, ida)))
+                fecha_anterior = fecha - timedelta(days=1)
+                if not ida and sesion == 2 and fecha_anterior < FECHA_CORTE_INTRADIARIO: #sesion 7 del dia anterior
+                    frames["intradiario"].append(((fecha_anterior, 7), self.parse_precio_intradiario(texto, fecha_anterior, 7, ida)))
 
-        return df
+            except Exception as e:
+                print(f"Error parsing {nombre}: {e}")
+
+        resultado = {}
+        for mercado, lista in frames.items():
+            lista = [df for _, df in sorted(lista, key=lambda x: x[0])]
+            resultado[mercado] = pd.concat(lista, ignore_index=True) if lista else pd.DataFrame()
+        return resultado
+
+    def parse_directorio(self, carpeta):
+        """
+        Parses every OMIE price file of a folder (i.e. a backfill of TXT files already downloaded), without downloading anything.
+        See parse_ficheros.
+
+        Args:
+        carpeta (str): The folder with the TXT files (subfolders included).
+
+        Returns:
+        dict: {"diario": pd.DataFrame, "intradiario": pd.DataFrame}
+        """
+        def leer_fichero(ruta):
+            with open(ruta, "rb") as f:
+                return f.read()
+
+        ficheros = ((nombre, lambda ruta=os.path.join(raiz, nombre): leer_fichero(ruta))
+                    for raiz, _, nombres in os.walk(carpeta) for nombre in nombres)
+        return self.parse_ficheros(ficheros)
+
+    def parse_zip(self, ruta_zip):
+        """
+        Parses every OMIE price file of a zip archive (i.e. a monthly or annual archive of daily TXT files), reading the
+        members one by one without extracting them. Zip files inside the archive (i.e. the months of a year) are read too.
+        See parse_ficheros.
+
+        Args:
+        ruta_zip (str): The path of the archive.
+
+        Returns:
+        dict: {"diario": pd.DataFrame, "intradiario": pd.DataFrame}
+        """
+        def miembros(z):
+            for info in z.infolist():
+                if info.is_dir():
+                    continue
+                if info.filename.lower().endswith(".zip"):
+                    with zipfile.ZipFile(io.BytesIO(z.read(info))) as interior:
+                        yield from miembros(interior)
+                else:
+                    yield info.filename, lambda info=info: z.read(info)
+
+        with zipfile.ZipFile(ruta_zip) as z:
+            return self.parse_ficheros(miembros(z))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,653 @@
+import os
+import re
+import glob
+import json
+import threading
+import logging
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pyarrow.dataset as ds
+from datetime import date
+from typing import List, Optional
+
+
+#claves de deduplicacion a nivel de dataset para los ficheros de precios (solo se usan las que existan en el df)
+#HORA se incluye porque los precios de terciaria media ponderada usan HORA en lugar de PERIODO, y DST para no juntar las horas 3a y 3b
+#(o los dos PERIODO 3 de los precios horarios de ESIOS del dia de 25 horas, ver ESIOS.valores_a_dataframe)
+PRICE_DEDUP_KEY = ["FECHA", "PERIODO", "HORA", "DST", "SENTIDO", "SESION"]
+
+#esquema curated comun a los ficheros de i90 y de precios (se aplica en cada escritura)
+#FECHA como DATE, HORA/PERIODO como int16 con la hora del cambio de hora en DST, ENERGIA como float32
+#y el resto de columnas de texto como categoricas (dictionary encoding en parquet)
+DATE_COLUMNS = ["FECHA"]
+INT16_COLUMNS = ["HORA", "PERIODO"]
+#las energias de las UPs (MWh por hora o cuarto de hora) con 3 decimales se conservan en float32 por debajo de 8192 MWh,
+#los precios se mantienen en float64
+FLOAT32_COLUMNS = ["ENERGIA"]
+#0 = hora normal, 1 = "3a", 2 = "3b" (las dos horas 3 del dia de 25 horas)
+DST_COLUMN = "DST"
+DST_CODES = {"a": 1, "b": 2}
+
+#orden de las filas dentro de cada fichero curated: las filas de cada UP quedan juntas para que DuckDB
+#pueda saltarse los row groups con las estadisticas min/max de UPROG y FECHA
+CLUSTER_KEY = ["UPROG", "FECHA", "HORA", "PERIODO"]
+#un fragmento diario de PROGRAMAS (~1000 UPs x 24 horas x 9 programas) queda en ~13 row groups de ~75 UPs
+ROW_GROUP_SIZE = 16384
+
+#indice de UPs de cada dataset (o fichero) curated con UPROG: primera y ultima FECHA de cada UP por PROGRAMA,
+#se actualiza en cada escritura. Es un .json para que el glob "*.parquet" del dataset no lo lea
+UP_INDEX_FILENAME = "_indice_up.json"
+#clave del indice para los ficheros sin columna PROGRAMA (i.e. PROG_RR, RESULT_RES)
+ALL_PROGRAMAS = "*"
+#conjuntos ordenados de UPs por dataset (ver up_set): path -> (version, np.ndarray)
+_up_sets = {}
+_up_sets_lock = threading.Lock()
+#nombre de los fragmentos de un dataset particionado por FECHA (i.e. 2024-06-14.parquet)
+FRAGMENT_NAME_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}\.parquet$")
+
+
+def dataset_path_from_parquet(parquet_filepath: str) -> str:
+    """
+    Get the dataset directory that replaces a monolithic parquet file.
+
+    Args:
+        parquet_filepath (str): The path of the monolithic parquet file. i.e. "...\\2024\\precios_rr.parquet"
+
+    Returns:
+        str: The path of the dataset directory. i.e. "...\\2024\\precios_rr"
+    """
+    if parquet_filepath.endswith(".parquet"):
+        return parquet_filepath[:-len(".parquet")]
+    return parquet_filepath
+
+
+def dataset_glob(dataset_path: str) -> str:
+    """
+    Get the glob pattern used to read every fragment of a dataset (i.e. from DuckDB).
+
+    Args:
+        dataset_path (str): The path of the dataset directory.
+
+    Returns:
+        str: The glob pattern. i.e. "...\\2024\\precios_rr\\*.parquet"
+    """
+    return os.path.join(dataset_path, "*.parquet")
+
+
+def fragment_path(dataset_path: str, fecha) -> str:
+    """
+    Get the path of the daily fragment for a given date.
+
+    Args:
+        dataset_path (str): The path of the dataset directory.
+        fecha (str | date): The date of the fragment.
+
+    Returns:
+        str: The path of the fragment. i.e. "...\\2024\\precios_rr\\2024-10-15.parquet"
+    """
+    return os.path.join(dataset_path, f"{str(fecha)[:10]}.parquet")
+
+
+def _to_category(serie: pd.Series) -> pd.Series:
+    """
+    Convert a text column to a categorical of strings (numbers read from the I90 sheets as int become "1").
+    """
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        if pd.api.types.is_string_dtype(serie.cat.categories.dtype):
+            #categorias en orden alfabetico para que ordenar la columna sea ordenar por el texto (cluster_rows)
+            if not serie.cat.categories.is_monotonic_increasing:
+                serie = serie.cat.reorder_categories(serie.cat.categories.sort_values())
+            return serie
+        serie = serie.astype(object)
+    return serie.astype("string").astype("category")
+
+
+def apply_curated_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Cast a dataframe to the compact curated schema.
+
+    - FECHA as DATE (date32).
+    - HORA and PERIODO as int16. The "3a"/"3b" hours of the 25 hour day become 3 with DST = 1/2
+      (DST is added whenever there is a HORA column, 0 for every other hour).
+    - ENERGIA as float32.
+    - Every other text column (UPROG, SENTIDO, PROGRAMA, REDESPACHO...) as categorical.
+
+    The cast is idempotent, so it can be applied again after merging new data with an existing fragment.
+
+    Args:
+        df (pd.DataFrame): The dataframe to cast.
+
+    Returns:
+        pd.DataFrame: A new dataframe with the curated schema.
+    """
+    df = df.copy()
+    date32 = pd.ArrowDtype(pa.date32())
+
+    for col in DATE_COLUMNS:
+        if col in df.columns and df[col].dtype != date32:
+            df[col] = pd.to_datetime(df[col].astype(object) if isinstance(df[col].dtype, pd.CategoricalDtype) else df[col]).astype(date32)
+
+    if "HORA" in df.columns and not pd.api.types.is_numeric_dtype(df["HORA"].dtype):
+        hora = df["HORA"].astype(object).astype("string")
+        dst = np.zeros(len(df), dtype="int8")
+        for sufijo, codigo in DST_CODES.items():
+            dst[hora.str.endswith(sufijo).fillna(False).to_numpy(dtype=bool)] = codigo
+        df["HORA"] = pd.to_numeric(hora.str.rstrip("".join(DST_CODES)))
+        if DST_COLUMN not in df.columns:
+            df[DST_COLUMN] = dst
+    if "HORA" in df.columns and DST_COLUMN not in df.columns:
+        df[DST_COLUMN] = np.zeros(len(df), dtype="int8")
+    if DST_COLUMN in df.columns:
+        df[DST_COLUMN] = df[DST_COLUMN].fillna(0).astype("int8") #0 en las filas de fragmentos escritos antes de tener DST
+
+    for col in INT16_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype("int16")
+
+    for col in FLOAT32_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("float32")
+
+    for col in df.columns:
+        if col in DATE_COLUMNS or col in INT16_COLUMNS or col in FLOAT32_COLUMNS or col == DST_COLUMN:
+            continue
+        if pd.api.types.is_object_dtype(df[col].dtype) or pd.api.types.is_string_dtype(df[col].dtype) or isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = _to_category(df[col])
+
+    return df
+
+
+def restore_float32(df: pd.DataFrame, decimals: int = 3) -> pd.DataFrame:
+    """
+    Upcast the float32 columns of the curated schema to float64 for calculations and output,
+    rounding away the float32 representation error (i.e. 12.3 is read back as 12.300000190734863).
+
+    Args:
+        df (pd.DataFrame): The dataframe read from the curated files.
+        decimals (int): The number of decimals of the original data. Defaults to 3.
+
+    Returns:
+        pd.DataFrame: The same dataframe with the float32 columns as float64.
+    """
+    for col in FLOAT32_COLUMNS:
+        if col in df.columns and df[col].dtype == "float32":
+            df[col] = df[col].astype("float64").round(decimals)
+    return df
+
+
+def cluster_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Sort the rows of a curated dataframe by CLUSTER_KEY (only the columns present in the dataframe).
+
+    Args:
+        df (pd.DataFrame): The dataframe to sort.
+
+    Returns:
+        pd.DataFrame: The sorted dataframe.
+    """
+    key_columns = [col for col in CLUSTER_KEY if col in df.columns]
+    if not key_columns:
+        return df
+    return df.sort_values(key_columns, kind="stable", ignore_index=True)
+
+
+def write_parquet(df: pd.DataFrame, path: str, compression: str = "snappy") -> None:
+    """
+    Write a curated parquet file: rows sorted with cluster_rows, row groups of ROW_GROUP_SIZE rows with
+    min/max statistics, written to a temporary file first and then renamed.
+
+    Args:
+        df (pd.DataFrame): The data to write (already cast to the curated schema).
+        path (str): The path of the parquet file.
+        compression (str): The parquet compression codec. Defaults to "snappy".
+    """
+    ruta_tmp = path + ".tmp" #no termina en .parquet para que el glob del dataset lo ignore
+    cluster_rows(df).to_parquet(ruta_tmp, index=False, engine="pyarrow", compression=compression, row_group_size=ROW_GROUP_SIZE, write_statistics=True)
+    os.replace(ruta_tmp, path)
+
+
+def _row_group_matches(row_group, column_index: dict, filtros: dict) -> bool:
+    """
+    Check with the min/max statistics if a row group may contain rows that pass every filter.
+    """
+    for col, filtro in filtros.items():
+        if col not in column_index:
+            continue
+        stats = row_group.column(column_index[col]).statistics
+        if stats is None or not stats.has_min_max:
+            continue #sin estadisticas hay que leer el row group
+        minimo, maximo = stats.min, stats.max
+        if isinstance(filtro, tuple): #rango (inicio, fin), i.e. FECHA
+            inicio, fin = filtro
+            if isinstance(minimo, date):
+                inicio, fin = date.fromisoformat(str(inicio)[:10]), date.fromisoformat(str(fin)[:10])
+            if maximo < inicio or minimo > fin:
+                return False
+        elif not any(minimo <= valor <= maximo for valor in filtro): #lista de valores, i.e. UPROG IN (...)
+            return False
+    return True
+
+
+def count_row_groups(path_glob: str, filtros: dict) -> dict:
+    """
+    Count how many row groups a query has to read, using the same min/max statistics DuckDB uses to skip them.
+
+    Args:
+        path_glob (str): The parquet file or glob queried. i.e. "...\\2024\\PROGRAMAS\\*.parquet"
+        filtros (dict): The filters of the query. A list means IN (i.e. {"UPROG": ["ABA1"]}) and a
+            tuple means BETWEEN (i.e. {"FECHA": ("2024-01-01", "2024-01-31")}).
+
+    Returns:
+        dict: The number of files, total row groups and row groups read. i.e. {"files": 31, "row_groups": 403, "row_groups_read": 31}
+    """
+    filtros = {col: filtro for col, filtro in filtros.items() if filtro}
+    resultado = {"files": 0, "row_groups": 0, "row_groups_read": 0}
+    for parquet_filepath in glob.glob(path_glob):
+        metadata = pq.ParquetFile(parquet_filepath).metadata
+        column_index = {metadata.schema.column(i).name: i for i in range(metadata.num_columns)}
+        resultado["files"] += 1
+        resultado["row_groups"] += metadata.num_row_groups
+        for i in range(metadata.num_row_groups):
+            if _row_group_matches(metadata.row_group(i), column_index, filtros):
+                resultado["row_groups_read"] += 1
+    return resultado
+
+
+def _dedup_columns(df: pd.DataFrame, key_columns: Optional[List[str]]) -> Optional[List[str]]:
+    """
+    Get the subset of the dedup key present in the dataframe (None means dedup on every column).
+    """
+    if not key_columns:
+        return None
+    subset = [col for col in key_columns if col in df.columns]
+    return subset if subset else None
+
+
+def write_fragment(df: pd.DataFrame, path: str, key_columns: Optional[List[str]] = None, replace: bool = False) -> int:
+    """
+    Write (or merge into) a single fragment of a dataset.
+
+    If the fragment already exists, it is read and merged with the new data, keeping the
+    last row for each dedup key (new data replaces old data), unless replace is set. The result is cast to the curated
+    schema, sorted by CLUSTER_KEY and written to a temporary file first and then renamed, so readers
+    never see a half written file.
+
+    Args:
+        df (pd.DataFrame): The new data for the fragment.
+        path (str): The path of the fragment.
+        key_columns (List[str]): Optional. The dedup key of the dataset.
+        replace (bool): If True, df is the whole content of the fragment and the existing one is overwritten. Defaults to False.
+
+    Returns:
+        int: The number of new rows written, after the dedup (rows of df repeated on the dedup key count once).
+    """
+    n_existing = 0
+    if os.path.exists(path) and not replace:
+        existing_df = pd.read_parquet(path)
+        n_existing = len(existing_df)
+        df = pd.concat([existing_df, df], ignore_index=True)
+
+    df = apply_curated_schema(df)
+    df = df.drop_duplicates(subset=_dedup_columns(df, key_columns), keep="last")
+
+    write_parquet(df, path)
+
+    return int((df.index >= n_existing).sum()) #el indice del concat: las filas nuevas van despues de las existentes
+
+
+def write_fragments(df: pd.DataFrame, dataset_path: str, key_columns: Optional[List[str]] = None, partition_column: str = "FECHA", replace: bool = False) -> int:
+    """
+    Write a dataframe to a dataset split into one parquet fragment per date.
+
+    Only the fragments of the dates present in the dataframe are touched, so the cost of the
+    write is proportional to the new data and not to the size of the dataset.
+
+    Args:
+        df (pd.DataFrame): The data to write.
+        dataset_path (str): The path of the dataset directory. i.e. "...\\2024\\precios_rr"
+        key_columns (List[str]): Optional. The dedup key of the dataset. i.e. PRICE_DEDUP_KEY
+        partition_column (str): The column used to split the data in fragments. Defaults to "FECHA".
+        replace (bool): If True, the fragments of the dates in df are overwritten instead of merged (i.e. a re-ingested day). Defaults to False.
+
+    Returns:
+        int: The number of new rows written, after the dedup on key_columns.
+    """
+    if df.empty:
+        return 0
+
+    if partition_column not in df.columns:
+        raise KeyError(f"Partition column {partition_column} not found in dataframe")
+
+    os.makedirs(dataset_path, exist_ok=True)
+    df = apply_curated_schema(df) #mismos tipos que los fragmentos existentes para el merge y el dedup
+
+    n_rows = 0
+    for fecha, df_fecha in df.groupby(partition_column, sort=False, observed=True):
+        n_rows += write_fragment(df_fecha, fragment_path(dataset_path, fecha), key_columns, replace)
+
+    if "UPROG" in df.columns:
+        update_up_index(dataset_path, df)
+
+    return n_rows
+
+
+def read_dataset(dataset_path: str) -> pd.DataFrame:
+    """
+    Read every fragment of a dataset into a single dataframe.
+
+    Args:
+        dataset_path (str): The path of the dataset directory.
+
+    Returns:
+        pd.DataFrame: The dataset, or an empty dataframe if there are no fragments.
+    """
+    fragments = sorted(glob.glob(dataset_glob(dataset_path)))
+    if not fragments:
+        return pd.DataFrame()
+    return pd.concat([pd.read_parquet(fragment) for fragment in fragments], ignore_index=True)
+
+
+def split_parquet_to_dataset(parquet_filepath: str, key_columns: Optional[List[str]] = None, partition_column: str = "FECHA",
+                             skip_existing: bool = False) -> str:
+    """
+    One-shot migration of a monolithic yearly parquet file to a partitioned dataset.
+
+    The original file is left untouched so it can be removed once the dataset has been checked.
+
+    Args:
+        parquet_filepath (str): The path of the monolithic parquet file. i.e. "...\\2024\\precios_rr.parquet"
+        key_columns (List[str]): Optional. The dedup key of the dataset.
+        partition_column (str): The column used to split the data in fragments. Defaults to "FECHA".
+        skip_existing (bool): If True, the dates that already have a fragment keep it (i.e. written by the daemon after the switch to datasets). Defaults to False.
+
+    Returns:
+        str: The path of the dataset directory.
+    """
+    dataset_path = dataset_path_from_parquet(parquet_filepath)
+    df = pd.read_parquet(parquet_filepath)
+    if skip_existing and os.path.isdir(dataset_path):
+        fechas_existentes = {name[:10] for name in os.listdir(dataset_path) if FRAGMENT_NAME_PATTERN.match(name)}
+        df = df[~df[partition_column].astype(str).str[:10].isin(fechas_existentes)] #mismo nombre de fragmento que fragment_path
+    n_rows = write_fragments(df, dataset_path, key_columns, partition_column)
+    logging.info(f"Migrated {n_rows} rows from {parquet_filepath} to dataset {dataset_path}")
+    return dataset_path
+
+
+def migrate_monolithic_files(curated_dir: str) -> int:
+    """
+    One-shot migration of every monolithic yearly parquet file under a directory (i.e. "...\\2024\\PROGRAMAS.parquet",
+    "...\\2024\\precios_rr.parquet") to the partitioned dataset next to it, the one read by the queries.
+
+    Each file is split with split_parquet_to_dataset, deduplicated on every column as the yearly files were, keeping the
+    fragments that already exist, and renamed to <file>.parquet.migrado so it is only migrated once. The UP index of the
+    dataset is updated by the write. Files without FECHA (i.e. the UP lists) and the i90 temporary files are skipped.
+
+    Args:
+        curated_dir (str): The root of the curated data. i.e. "...\\data\\curated"
+
+    Returns:
+        int: The number of migrated files.
+    """
+    n_files = 0
+    for parquet_filepath in sorted(glob.glob(os.path.join(curated_dir, "**", "*.parquet"), recursive=True)):
+        filename = os.path.basename(parquet_filepath)
+        if FRAGMENT_NAME_PATTERN.match(filename) or filename.endswith("_temp.parquet"):
+            continue
+        if "FECHA" not in pq.read_schema(parquet_filepath).names:
+            continue
+        split_parquet_to_dataset(parquet_filepath, skip_existing=True)
+        os.replace(parquet_filepath, parquet_filepath + ".migrado")
+        n_files += 1
+
+    logging.info(f"Migrated {n_files} monolithic parquet files under {curated_dir} to datasets")
+    return n_files
+
+
+def migrate_curated_schema(curated_dir: str) -> int:
+    """
+    One-shot migration of every curated parquet file under a directory to the compact curated schema.
+
+    Each file is read, cast with apply_curated_schema, sorted by CLUSTER_KEY and replaced atomically. Files that already have
+    the curated schema are rewritten with the same content, so the migration can be run more than once.
+
+    Args:
+        curated_dir (str): The root of the curated data. i.e. "...\\data\\curated"
+
+    Returns:
+        int: The number of migrated files.
+    """
+    n_files = 0
+    for parquet_filepath in glob.glob(os.path.join(curated_dir, "**", "*.parquet"), recursive=True):
+        write_parquet(apply_curated_schema(pd.read_parquet(parquet_filepath)), parquet_filepath)
+        n_files += 1
+
+    logging.info(f"Migrated {n_files} parquet files under {curated_dir} to the curated schema")
+    return n_files
+
+
+def up_index_path(path: str) -> str:
+    """
+    Get the path of the UP index of a dataset or of a monolithic parquet file.
+
+    Args:
+        path (str): The dataset directory, its glob or a monolithic parquet file. i.e. "...\\2024\\PROGRAMAS\\*.parquet"
+
+    Returns:
+        str: The path of the index. i.e. "...\\2024\\PROGRAMAS\\_indice_up.json" or "...\\2024\\PROGRAMAS_indice_up.json"
+    """
+    if "*" in os.path.basename(path):
+        path = os.path.dirname(path)
+    if path.endswith(".parquet"):
+        return path[:-len(".parquet")] + UP_INDEX_FILENAME
+    return os.path.join(path, UP_INDEX_FILENAME)
+
+
+def up_ranges(df: pd.DataFrame) -> dict:
+    """
+    First and last FECHA of every UPROG (by PROGRAMA if the dataframe has one) of a dataframe.
+
+    Args:
+        df (pd.DataFrame): The data. Needs UPROG and FECHA columns.
+
+    Returns:
+        dict: The ranges. i.e. {"PBF": {"ABA1": ["2024-01-01", "2024-06-14"]}}, or {ALL_PROGRAMAS: {...}} without PROGRAMA column.
+    """
+    if df.empty or "UPROG" not in df.columns or "FECHA" not in df.columns:
+        return {}
+
+    group_columns = ["PROGRAMA", "UPROG"] if "PROGRAMA" in df.columns else ["UPROG"]
+    fechas = df.groupby(group_columns, observed=True)["FECHA"].agg(["min", "max"]) #las filas sin UPROG (NaN) no se agrupan
+
+    ranges = {}
+    for key, (primera, ultima) in zip(fechas.index, fechas.itertuples(index=False)):
+        programa, uprog = key if "PROGRAMA" in df.columns else (ALL_PROGRAMAS, key)
+        ranges.setdefault(str(programa), {})[str(uprog)] = [str(primera)[:10], str(ultima)[:10]]
+    return ranges
+
+
+def _merge_up_ranges(index: dict, ranges: dict) -> dict:
+    for programa, ups in ranges.items():
+        index_programa = index.setdefault(programa, {})
+        for uprog, (primera, ultima) in ups.items():
+            if uprog in index_programa:
+                index_programa[uprog] = [min(index_programa[uprog][0], primera), max(index_programa[uprog][1], ultima)]
+            else:
+                index_programa[uprog] = [primera, ultima]
+    return index
+
+
+def read_up_index(path: str) -> Optional[dict]:
+    """
+    Read the UP index of a dataset or of a monolithic parquet file.
+
+    Args:
+        path (str): The dataset directory, its glob or a monolithic parquet file.
+
+    Returns:
+        dict: The index (see up_ranges), or None if the index does not exist.
+    """
+    try:
+        with open(up_index_path(path), "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_up_index(path: str, index: dict) -> None:
+    """
+    Write the UP index of a dataset or of a monolithic parquet file (temporary file and rename, like write_parquet).
+
+    Args:
+        path (str): The dataset directory, its glob or a monolithic parquet file.
+        index (dict): The index (see up_ranges).
+    """
+    ruta_indice = up_index_path(path)
+    ruta_tmp = ruta_indice + ".tmp"
+    with open(ruta_tmp, "w") as f:
+        json.dump(index, f, sort_keys=True)
+    os.replace(ruta_tmp, ruta_indice)
+
+
+def update_up_index(path: str, df: pd.DataFrame) -> dict:
+    """
+    Update the UP index of a dataset with the new data written to it: new UPs are added and the first/last FECHA of the
+    existing ones are widened. Rows replaced by a re-ingest never shrink a range (build_up_index rebuilds it from the data).
+
+    Args:
+        path (str): The dataset directory, its glob or a monolithic parquet file.
+        df (pd.DataFrame): The new data.
+
+    Returns:
+        dict: The updated index.
+    """
+    index = _merge_up_ranges(read_up_index(path) or {}, up_ranges(df))
+    write_up_index(path, index)
+    return index
+
+
+def build_up_index(path: str, write: bool = True) -> dict:
+    """
+    Build the UP index of a dataset or of a monolithic parquet file from its data, reading only the UPROG, PROGRAMA
+    and FECHA columns.
+
+    Args:
+        path (str): The dataset directory, its glob or a monolithic parquet file.
+        write (bool): Optional. If False the index is only returned. Defaults to True.
+
+    Returns:
+        dict: The index (see up_ranges).
+    """
+    if path.endswith(".parquet") and "*" not in os.path.basename(path):
+        parquet_filepaths = [path]
+    else:
+        parquet_filepaths = sorted(glob.glob(dataset_glob(os.path.dirname(path) if "*" in os.path.basename(path) else path)))
+
+    index = {}
+    if parquet_filepaths:
+        columns = [col for col in ["UPROG", "PROGRAMA", "FECHA"] if col in pq.read_schema(parquet_filepaths[0]).names]
+        #una sola lectura de las tres columnas de todos los fragmentos (leer y agrupar fragmento a fragmento es ~50 veces mas lento)
+        index = up_ranges(ds.dataset(parquet_filepaths, format="parquet").to_table(columns=columns).to_pandas())
+
+    if write:
+        write_up_index(path, index)
+    return index
+
+
+def build_up_indexes(curated_dir: str) -> int:
+    """
+    One-shot build of the UP index of every dataset and monolithic parquet file with UPROG under a directory
+    (the daemon keeps them updated afterwards).
+
+    Args:
+        curated_dir (str): The root of the curated data. i.e. "...\\data\\curated"
+
+    Returns:
+        int: The number of indexes built.
+    """
+    paths = set()
+    for parquet_filepath in glob.glob(os.path.join(curated_dir, "**", "*.parquet"), recursive=True):
+        if "UPROG" not in pq.read_schema(parquet_filepath).names:
+            continue
+        if FRAGMENT_NAME_PATTERN.match(os.path.basename(parquet_filepath)):
+            paths.add(os.path.dirname(parquet_filepath)) #fragmento de un dataset
+        else:
+            paths.add(parquet_filepath)
+
+    for path in sorted(paths):
+        build_up_index(path)
+
+    logging.info(f"Built {len(paths)} UP indexes under {curated_dir}")
+    return len(paths)
+
+
+def up_list(path: str, start_date: str, end_date: str, programas: Optional[List[str]] = None) -> Optional[List[str]]:
+    """
+    The UPs of a dataset or monolithic parquet file with data between two dates, answered from its UP index.
+
+    Args:
+        path (str): The dataset directory, its glob or a monolithic parquet file.
+        start_date (str): The start date. i.e. "2024-01-01"
+        end_date (str): The end date. i.e. "2024-01-31"
+        programas (List[str]): Optional. Only the UPs of these programas. i.e. ["PBF"]
+
+    Returns:
+        List[str]: The sorted UPs, or None if the index does not exist.
+    """
+    index = read_up_index(path)
+    if index is None:
+        return None
+    return up_list_from_index(index, start_date, end_date, programas)
+
+
+def up_list_from_index(index: dict, start_date: str, end_date: str, programas: Optional[List[str]] = None) -> List[str]:
+    start_date, end_date = str(start_date)[:10], str(end_date)[:10]
+    ups = set()
+    for programa, ups_programa in index.items():
+        if programas and programa not in programas:
+            continue
+        ups.update(uprog for uprog, (primera, ultima) in ups_programa.items() if primera <= end_date and ultima >= start_date)
+    return sorted(ups)
+
+
+def _data_version(path: str) -> Optional[int]:
+    """
+    Version of the data of a dataset or monolithic parquet file: the mtime of its UP index if it exists, otherwise the mtime
+    of the dataset directory or file (fragments are written with a rename inside the directory).
+    """
+    for ruta in [up_index_path(path), os.path.dirname(path) if "*" in os.path.basename(path) else path]:
+        try:
+            return os.stat(ruta).st_mtime_ns
+        except OSError:
+            continue
+    return None
+
+
+def up_set(path: str) -> np.ndarray:
+    """
+    The sorted unique UPs (any PROGRAMA, any FECHA) of a dataset or monolithic parquet file.
+
+    The set is read from the UP index (or built from the data if there is no index) once per version of the data and
+    kept in memory, so repeated lookups do not scan the UPROG column again.
+
+    Args:
+        path (str): The dataset directory, its glob or a monolithic parquet file.
+
+    Returns:
+        np.ndarray: The sorted UPs.
+    """
+    version = _data_version(path)
+    with _up_sets_lock:
+        cached = _up_sets.get(path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    index = read_up_index(path)
+    if index is None:
+        index = build_up_index(path, write=False)
+    ups = np.unique(np.array([uprog for ups_programa in index.values() for uprog in ups_programa], dtype=object).astype(str))
+
+    with _up_sets_lock:
+        _up_sets[path] = (version, ups)
+    return ups